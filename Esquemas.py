@@ -1,5 +1,6 @@
 from sqlmodel import SQLModel
-from typing import Optional
+from typing import Optional, List
+from datetime import datetime
 from pydantic import Field
 
 # CATEGORÍAS
@@ -28,6 +29,7 @@ class CategoryRead(CategoryBase):
     """
     id: int
     activo: bool = True
+    actualizado_en: Optional[datetime] = None
 
     class Config:
         from_attributes = True  # Permite convertir objetos SQLModel a esquemas Pydantic
@@ -71,11 +73,34 @@ class ProductRead(ProductBase):
     Hereda los campos del modelo base.
     """
     id: int
+    actualizado_en: Optional[datetime] = None
 
     class Config:
         from_attributes = True  # Convierte automáticamente objetos SQLModel a Pydantic
 
 
+class CategorySummary(SQLModel):
+    """
+    Datos mínimos de la categoría que se incluyen dentro de un producto.
+    """
+    id: int
+    nombre: str
+
+
+class ProductReadWithCategory(ProductRead):
+    """
+    Producto junto con el nombre de su categoría.
+    """
+    categoria: CategorySummary
+
+
+class CategoryReadWithProducts(CategoryRead):
+    """
+    Categoría junto con la lista de sus productos.
+    """
+    productos: List[ProductRead]
+
+
 class ProductUpdate(SQLModel):
     """
     Se usa para actualizar un producto existente.
@@ -87,3 +112,153 @@ class ProductUpdate(SQLModel):
     cantidad: Optional[int] = None
     categoria_id: Optional[int] = None
     activo: Optional[bool] = None
+
+
+# OPERACIONES MASIVAS
+
+class BulkImportError(SQLModel):
+    """
+    Error de una fila concreta durante la importación masiva.
+    'fila' empieza en 1 y cuenta solo filas de datos (sin la cabecera CSV).
+    """
+    fila: int
+    detalle: str
+
+
+class BulkImportResult(SQLModel):
+    """
+    Resumen de la importación masiva de productos.
+    """
+    insertados: int
+    rechazados: int
+    errores: List[BulkImportError] = []
+
+
+class PurchaseItem(SQLModel):
+    """
+    Una línea de una compra por lotes.
+    """
+    producto_id: int
+    cantidad: int = Field(gt=0, description="Debe ser mayor que 0")
+
+
+# RESÚMENES DE INVENTARIO
+
+class CategoryInventorySummary(SQLModel):
+    """
+    Totales del inventario activo de una categoría.
+    'valor_inventario' es la suma de precio * cantidad.
+    """
+    categoria_id: int
+    nombre: str
+    productos: int
+    unidades: int
+    valor_inventario: float
+    stock_bajo: int
+    precio_min: Optional[float] = None
+    precio_max: Optional[float] = None
+    precio_promedio: Optional[float] = None
+
+
+class InventorySummary(SQLModel):
+    """
+    Totales de todo el inventario activo y el detalle por categoría.
+    """
+    productos: int
+    unidades: int
+    valor_inventario: float
+    stock_bajo: int
+    precio_min: Optional[float] = None
+    precio_max: Optional[float] = None
+    precio_promedio: Optional[float] = None
+    umbral_stock_bajo: int
+    categorias: List[CategoryInventorySummary]
+
+
+# FACETAS DEL LISTADO DE PRODUCTOS
+
+class CategoryFacet(SQLModel):
+    """
+    Productos de una categoría que cumplen los filtros del listado.
+    """
+    categoria_id: int
+    productos: int
+
+
+class PriceBucket(SQLModel):
+    """
+    Cubeta del histograma de precios: productos con desde <= precio < hasta.
+    La última no tiene límite superior (hasta = None).
+    """
+    desde: float
+    hasta: Optional[float] = None
+    productos: int
+
+
+class ProductFacets(SQLModel):
+    """
+    Conteos por categoría e histograma de precios de todos los productos filtrados.
+    """
+    total: int
+    categorias: List[CategoryFacet]
+    precios: List[PriceBucket]
+
+
+class ProductPageWithFacets(SQLModel):
+    """
+    Página del listado de productos con sus facetas (facets=true).
+    """
+    productos: List[ProductRead]
+    facetas: ProductFacets
+
+
+# ARCHIVO
+
+class ArchiveResult(SQLModel):
+    """
+    Filas movidas a las tablas de archivo en una ejecución.
+    """
+    productos: int = 0
+    categorias: int = 0
+
+
+class ArchivedProductRead(ProductRead):
+    """
+    Producto archivado, con la fecha en que salió de la tabla de productos.
+    """
+    archivado_en: datetime
+
+
+# PEDIDOS
+
+class OrderCreate(SQLModel):
+    """
+    Pedido de uno o varios productos. Las líneas del mismo producto se suman.
+    """
+    lineas: List[PurchaseItem] = Field(min_length=1, description="Al menos un producto")
+
+
+class OrderLineRead(SQLModel):
+    """
+    Línea de un pedido con el precio que tenía el producto al comprarlo.
+    """
+    producto_id: int
+    cantidad: int
+    precio_unitario: float
+    subtotal: float
+
+    class Config:
+        from_attributes = True
+
+
+class OrderRead(SQLModel):
+    """
+    Pedido registrado con sus líneas.
+    """
+    id: int
+    total: float
+    creado_en: datetime
+    lineas: List[OrderLineRead]
+
+    class Config:
+        from_attributes = True
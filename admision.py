@@ -0,0 +1,191 @@
+import math
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from serializacion import a_json
+
+
+# CONTROL DE ADMISIÓN
+#
+# Cada solicitud se clasifica como compra, escritura, lectura o exportación. Cada
+# clase tiene su propio cupo de solicitudes simultáneas (para que una ráfaga de
+# lecturas no ocupe todas las conexiones del pool que necesitan las compras) y un
+# límite de solicitudes por segundo para cada cliente (token bucket). Lo que no
+# entra se rechaza al instante: 503 si la clase está llena, 429 si el cliente
+# superó su tasa, ambos con Retry-After. Los límites son por proceso.
+#
+# Las exportaciones (/exportar/* y los listados con formato=ndjson) ocupan su
+# lugar durante toda la descarga: van en una clase aparte para no dejar sin
+# cupo a las lecturas cortas.
+
+COMPRA = "compra"
+ESCRITURA = "escritura"
+LECTURA = "lectura"
+EXPORTACION = "exportacion"
+
+_RUTAS_COMPRA = re.compile(r"^/(productos/\d+/comprar|compras|pedidos)$")
+_FORMATO_NDJSON = re.compile(r"(^|&)formato=ndjson(&|$)")
+# Rutas sin límite: estado de la API, métricas y el feed SSE (conexiones largas e inactivas)
+RUTAS_EXENTAS = ("/", "/metrics", "/productos/cambios")
+# Clientes con cubeta guardada; los que llevan más tiempo sin pedir se descartan
+MAXIMO_CLIENTES = 100_000
+
+
+def clase_de(metodo: str, ruta: str, consulta: str = "") -> Optional[str]:
+    """
+    Clase de admisión de la solicitud, o None si está exenta.
+    """
+    if ruta in RUTAS_EXENTAS:
+        return None
+    if metodo in ("GET", "HEAD", "OPTIONS"):
+        if ruta.startswith("/exportar/") or _FORMATO_NDJSON.search(consulta):
+            return EXPORTACION
+        return LECTURA
+    if _RUTAS_COMPRA.match(ruta):
+        return COMPRA
+    return ESCRITURA
+
+
+class Cubetas:
+    """
+    Token buckets por clave: 'tasa' fichas por segundo, hasta 'capacidad' acumuladas.
+    """
+
+    def __init__(self, tasa: float, capacidad: float):
+        self.tasa = tasa
+        self.capacidad = max(1.0, capacidad)
+        self._cubetas = OrderedDict()
+
+    def tomar(self, clave, ahora: float) -> float:
+        """
+        Toma una ficha. Devuelve 0 si se pudo, o los segundos hasta la siguiente.
+        """
+        fichas, ultima = self._cubetas.pop(clave, (self.capacidad, ahora))
+        fichas = min(self.capacidad, fichas + (ahora - ultima) * self.tasa)
+        espera = 0.0
+        if fichas >= 1:
+            fichas -= 1
+        else:
+            espera = (1 - fichas) / self.tasa
+        self._cubetas[clave] = (fichas, ahora)
+        if len(self._cubetas) > MAXIMO_CLIENTES:
+            self._cubetas.popitem(last=False)
+        return espera
+
+
+class ControlAdmision:
+    """
+    Cupos de concurrencia por clase y tasas por cliente. Con tasa 0 la clase no
+    tiene límite por cliente.
+    """
+
+    def __init__(self):
+        self.activo = False
+        self.cabecera_cliente: Optional[str] = None
+        self.cupos = {}
+        self.en_curso = {}
+        self.cubetas = {}
+        self.rechazadas = {}
+
+    def configurar(self, settings):
+        self.activo = settings.admision_activa
+        self.cabecera_cliente = (settings.admision_cabecera_cliente or "").lower() or None
+        self.cupos = {
+            COMPRA: settings.admision_concurrencia_compras,
+            ESCRITURA: settings.admision_concurrencia_escrituras,
+            LECTURA: settings.admision_concurrencia_lecturas,
+            EXPORTACION: settings.admision_concurrencia_exportaciones,
+        }
+        tasas = {
+            COMPRA: settings.admision_tasa_compras,
+            ESCRITURA: settings.admision_tasa_escrituras,
+            LECTURA: settings.admision_tasa_lecturas,
+            EXPORTACION: settings.admision_tasa_exportaciones,
+        }
+        self.cubetas = {
+            clase: Cubetas(tasa, tasa * settings.admision_rafaga_s) for clase, tasa in tasas.items() if tasa > 0
+        }
+        self.en_curso = {clase: 0 for clase in self.cupos}
+        self.rechazadas = {clase: {"429": 0, "503": 0} for clase in self.cupos}
+
+    def cliente(self, scope) -> str:
+        """
+        IP del cliente, o el primer valor de la cabecera configurada (por ejemplo
+        X-Forwarded-For detrás de un proxy de confianza).
+        """
+        if self.cabecera_cliente:
+            for nombre, valor in scope["headers"]:
+                if nombre.decode("latin-1") == self.cabecera_cliente:
+                    return valor.decode("latin-1").split(",")[0].strip()
+        cliente = scope.get("client")
+        return cliente[0] if cliente else "desconocido"
+
+    def admitir(self, clase: str, cliente: str):
+        """
+        Devuelve None si la solicitud entra (y ocupa un lugar de su clase), o
+        (código, segundos de Retry-After, detalle) si se rechaza.
+        El cupo se mira antes que la tasa: un 503 no gasta fichas del cliente.
+        """
+        if self.en_curso[clase] >= self.cupos[clase]:
+            self.rechazadas[clase]["503"] += 1
+            return 503, 1, "Servidor ocupado, reintente más tarde."
+        cubetas = self.cubetas.get(clase)
+        if cubetas is not None:
+            espera = cubetas.tomar(cliente, time.monotonic())
+            if espera:
+                self.rechazadas[clase]["429"] += 1
+                return 429, math.ceil(espera), "Demasiadas solicitudes, reintente más tarde."
+        self.en_curso[clase] += 1
+        return None
+
+    def liberar(self, clase: str):
+        self.en_curso[clase] -= 1
+
+    def estadisticas(self) -> dict:
+        return {
+            "activo": self.activo,
+            "cupos": self.cupos,
+            "en_curso": self.en_curso,
+            "rechazadas": self.rechazadas,
+        }
+
+
+# Instancia del proceso, configurada por create_app
+admision = ControlAdmision()
+
+
+class MiddlewareAdmision:
+    """
+    Middleware ASGI que aplica el control de admisión antes de llegar a la ruta.
+    Las solicitudes rechazadas no usan el pool de conexiones ni el threadpool.
+    """
+
+    def __init__(self, app, control: ControlAdmision = admision):
+        self.app = app
+        self.control = control
+
+    async def __call__(self, scope, receive, send):
+        clase = None
+        if scope["type"] == "http":
+            consulta = scope.get("query_string", b"").decode("latin-1")
+            clase = clase_de(scope.get("method", ""), scope.get("path", ""), consulta)
+        if clase is None:
+            await self.app(scope, receive, send)
+            return
+
+        rechazo = self.control.admitir(clase, self.control.cliente(scope))
+        if rechazo is not None:
+            codigo, reintentar, detalle = rechazo
+            await send({
+                "type": "http.response.start",
+                "status": codigo,
+                "headers": [(b"content-type", b"application/json"), (b"retry-after", str(reintentar).encode())],
+            })
+            await send({"type": "http.response.body", "body": a_json({"detail": detalle})})
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.control.liberar(clase)
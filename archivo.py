@@ -0,0 +1,144 @@
+import logging
+import time
+from datetime import timedelta, timezone
+from typing import Callable, Optional
+
+import anyio
+
+from sqlalchemy import delete, exists, insert, select as select_core, tuple_
+from starlette.concurrency import run_in_threadpool
+
+from cache import invalidar_categoria, invalidar_producto
+from Esquemas import ArchiveResult
+from modelos import Categoria, CategoriaArchivada, LineaPedido, Producto, ProductoArchivado, ResumenCategoria, ahora
+from reservas import reservas
+
+
+# ARCHIVO DE FILAS INACTIVAS
+#
+# Los borrados son lógicos (activo = False), así que las tablas crecen con filas
+# que ningún listado muestra. archivar() mueve los productos y categorías
+# inactivos desde hace cierto tiempo a productoarchivado y categoriaarchivada, en
+# transacciones de a ARCHIVO_LOTE filas para no bloquear la base mientras dura.
+# Lo ejecuta el mantenimiento del trabajador (ARCHIVO_DIAS) o POST /archivo;
+# rutas_archivo.py los restaura de a uno.
+#
+# No se archivan los productos con líneas de pedido (el historial conserva su
+# clave foránea) ni las categorías que todavía tienen productos en la tabla viva.
+
+log = logging.getLogger("tienda.archivo")
+
+COLUMNAS_PRODUCTO = ("id", "nombre", "descripcion", "precio", "cantidad", "activo", "categoria_id", "actualizado_en")
+COLUMNAS_CATEGORIA = ("id", "nombre", "descripcion", "activo", "actualizado_en")
+
+
+def _mover(conexion, origen, destino, columnas, ids):
+    """
+    Copia las filas a la tabla de archivo (con archivado_en) y las borra de la original.
+    """
+    seleccion = select_core(*(origen.__table__.c[columna] for columna in columnas)).where(origen.id.in_(ids))
+    # include_defaults agrega archivado_en con su valor por defecto (la hora actual)
+    conexion.execute(insert(destino).from_select(columnas, seleccion, include_defaults=True))
+    conexion.execute(delete(origen).where(origen.id.in_(ids)))
+
+
+def _a_utc(fecha):
+    # SQLite devuelve las fechas sin zona; se guardaron en UTC
+    return fecha.replace(tzinfo=timezone.utc) if fecha is not None and fecha.tzinfo is None else fecha
+
+
+def _archivar_productos(motor, limite, lote: int, invalidar: Optional[Callable]) -> int:
+    candidatos = (
+        select_core(Producto.id, Producto.actualizado_en)
+        .where(
+            Producto.activo == False,
+            Producto.actualizado_en < limite,
+            ~exists().where(LineaPedido.producto_id == Producto.id),
+            ~exists().where(ProductoArchivado.id == Producto.id),
+        )
+        # Recorre el índice parcial de inactivos por fecha
+        .order_by(Producto.actualizado_en, Producto.id)
+        .limit(lote)
+        .with_for_update()
+    )
+    archivados = 0
+    cursor = None
+    while True:
+        consulta = candidatos
+        if cursor is not None:
+            consulta = consulta.where(tuple_(Producto.actualizado_en, Producto.id) > cursor)
+        with motor.begin() as conexion:
+            filas = conexion.execute(consulta).all()
+            if not filas:
+                return archivados
+            ids = [fila.id for fila in filas]
+            _mover(conexion, Producto, ProductoArchivado, COLUMNAS_PRODUCTO, ids)
+        # Los inactivos no cuentan en el resumen: solo se descartan caché y contadores en memoria
+        if invalidar is not None:
+            invalidar(invalidar_producto, *ids)
+        reservas.olvidar(*ids)
+        archivados += len(ids)
+        if len(filas) < lote:
+            return archivados
+        cursor = (_a_utc(filas[-1].actualizado_en), filas[-1].id)
+
+
+def _archivar_categorias(motor, limite, lote: int, invalidar: Optional[Callable]) -> int:
+    candidatos = (
+        select_core(Categoria.id)
+        .where(
+            Categoria.activo == False,
+            Categoria.actualizado_en < limite,
+            ~exists().where(Producto.categoria_id == Categoria.id),
+            ~exists().where(CategoriaArchivada.id == Categoria.id),
+        )
+        .order_by(Categoria.id)
+        .limit(lote)
+        .with_for_update()
+    )
+    archivadas = 0
+    while True:
+        with motor.begin() as conexion:
+            ids = conexion.execute(candidatos).scalars().all()
+            if not ids:
+                return archivadas
+            conexion.execute(delete(ResumenCategoria).where(ResumenCategoria.categoria_id.in_(ids)))
+            _mover(conexion, Categoria, CategoriaArchivada, COLUMNAS_CATEGORIA, ids)
+        if invalidar is not None:
+            for id_categoria in ids:
+                invalidar(invalidar_categoria, id_categoria)
+        archivadas += len(ids)
+        if len(ids) < lote:
+            return archivadas
+
+
+def archivar(motor, dias: float, lote: int = 1000, invalidar: Optional[Callable] = None) -> ArchiveResult:
+    """
+    Mueve a las tablas de archivo los productos y luego las categorías que
+    llevan al menos 'dias' días inactivos, en transacciones de 'lote' filas.
+    'invalidar(funcion, *args)' ejecuta las invalidaciones asíncronas de la
+    caché después de cada lote; sin él (fuera de la app) no se invalida nada.
+    """
+    inicio = time.perf_counter()
+    limite = ahora() - timedelta(days=dias)
+    resultado = ArchiveResult(
+        productos=_archivar_productos(motor, limite, lote, invalidar),
+        categorias=_archivar_categorias(motor, limite, lote, invalidar),
+    )
+    if resultado.productos or resultado.categorias:
+        log.info(
+            "Archivados %s productos y %s categorías en %.0f ms",
+            resultado.productos, resultado.categorias, (time.perf_counter() - inicio) * 1000,
+        )
+    return resultado
+
+
+async def archivar_async(motor, dias: float, lote: int = 1000) -> ArchiveResult:
+    """
+    Igual que archivar, desde el event loop. Antes escribe las compras pendientes
+    de las reservas en memoria, que podrían ser de productos a archivar.
+    """
+    if reservas.activo:
+        await reservas.escribir_pendiente()
+    # Corre en el threadpool; la caché se invalida en el event loop con from_thread
+    return await run_in_threadpool(archivar, motor, dias, lote, anyio.from_thread.run)
@@ -0,0 +1,115 @@
+"""
+Latencia de las compras durante una avalancha de lecturas, sin y con control de
+admisión (ADMISION_ACTIVA). Muchos lectores piden GET /productos sin pausa
+mientras unos pocos compradores hacen PUT /productos/{id}/comprar a ritmo fijo.
+
+Cada cliente se identifica con la cabecera X-Cliente. Los lectores rechazados
+esperan lo que indica Retry-After: el generador de carga comparte la CPU con el
+servidor y un bucle de reintentos sin pausa mediría al generador, no a la API.
+La primera pasada, sin lectores, da la latencia de referencia de las compras.
+
+Uso: python -m benchmarks.admision [--lectores 200] [--compradores 4] [--segundos 10] [--cupo-lecturas 8]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import insert
+from sqlmodel import Session
+
+import database
+import main
+from config import Settings
+from modelos import Categoria, Producto
+
+
+def sembrar(productos: int):
+    database.init_db()
+    with Session(database.get_motor()) as session:
+        session.execute(insert(Categoria), [{"nombre": "General"}])
+        session.execute(insert(Producto), [
+            {"nombre": f"Producto {i}", "precio": 10, "cantidad": 1_000_000, "categoria_id": 1}
+            for i in range(productos)
+        ])
+        session.commit()
+
+
+def percentil(valores: list, p: float) -> float:
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))] if valores else 0.0
+
+
+async def ejecutar_modo(activa: bool, lectores: int, args) -> dict:
+    directorio = tempfile.mkdtemp()
+    app = main.create_app(Settings(
+        database_url=f"sqlite:///{os.path.join(directorio, 'admision.db')}",
+        sqlite_wal=True,
+        admision_activa=activa,
+        admision_cabecera_cliente="X-Cliente",
+        admision_concurrencia_lecturas=args.cupo_lecturas,
+        cache_backend="ninguna",
+        slow_query_ms=100000,
+    ))
+    compras, lecturas = [], {}
+    estados_compra = {}
+    async with app.router.lifespan_context(app):
+        sembrar(args.productos)
+        transporte = httpx.ASGITransport(app=app)
+        limites = httpx.Limits(max_connections=None)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=60, limits=limites) as cliente:
+            fin = time.perf_counter() + args.segundos
+
+            async def lector(numero: int):
+                cabeceras = {"X-Cliente": f"lector-{numero}"}
+                while time.perf_counter() < fin:
+                    respuesta = await cliente.get("/productos?limit=200", headers=cabeceras)
+                    lecturas[respuesta.status_code] = lecturas.get(respuesta.status_code, 0) + 1
+                    if "retry-after" in respuesta.headers:
+                        await asyncio.sleep(float(respuesta.headers["retry-after"]))
+
+            async def comprador(numero: int):
+                cabeceras = {"X-Cliente": f"comprador-{numero}"}
+                while time.perf_counter() < fin:
+                    inicio = time.perf_counter()
+                    respuesta = await cliente.put(f"/productos/{numero + 1}/comprar?cantidad=1", headers=cabeceras)
+                    compras.append((time.perf_counter() - inicio) * 1000)
+                    estados_compra[respuesta.status_code] = estados_compra.get(respuesta.status_code, 0) + 1
+                    await asyncio.sleep(1 / args.ritmo)
+
+            await asyncio.gather(
+                *(lector(i) for i in range(lectores)),
+                *(comprador(i) for i in range(args.compradores)),
+            )
+    return {
+        "compras": len(compras),
+        "p50_ms": percentil(compras, 0.5),
+        "p99_ms": percentil(compras, 0.99),
+        "estados_compra": dict(sorted(estados_compra.items())),
+        "lecturas": dict(sorted(lecturas.items())),
+    }
+
+
+async def ejecutar(args):
+    for nombre, activa, lectores in (
+        ("sin lecturas", False, 0),
+        ("sin admisión", False, args.lectores),
+        ("con admisión", True, args.lectores),
+    ):
+        r = await ejecutar_modo(activa, lectores, args)
+        print(f"{nombre:13} compras {r['compras']:5}  p50 {r['p50_ms']:8.1f} ms  p99 {r['p99_ms']:8.1f} ms  "
+              f"códigos {r['estados_compra']}  lecturas {r['lecturas']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lectores", type=int, default=200)
+    parser.add_argument("--compradores", type=int, default=4)
+    parser.add_argument("--ritmo", type=float, default=4, help="Compras por segundo de cada comprador")
+    parser.add_argument("--productos", type=int, default=2000)
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--cupo-lecturas", type=int, default=8, help="ADMISION_CONCURRENCIA_LECTURAS")
+    args = parser.parse_args()
+    asyncio.run(ejecutar(args))
@@ -0,0 +1,192 @@
+"""
+Consultas de los listados de productos con el 90% de las filas dadas de baja
+(activo = False), en tres situaciones:
+
+  1. índices completos (activo, ...), como antes de los índices parciales,
+  2. índices parciales de las filas activas, con las bajas todavía en la tabla,
+  3. después de archivar las bajas (archivo.archivar).
+
+Muestra la mediana de cada consulta, el tamaño de la tabla y de sus índices y
+cuánto tarda el archivo. Si la base entera cabe en la caché del sistema las
+latencias cambian poco; lo que se reduce es lo que tiene que estar en memoria.
+Termina con código 1 si alguna consulta devuelve otras filas después de archivar,
+o si un producto nuevo recibe el ID de uno archivado (el último sembrado está
+siempre inactivo, así que el ID más alto se archiva).
+
+Uso: python -m benchmarks.archivo [--filas 1000000] [--bajas 0.9] [--repeticiones 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+from sqlalchemy import create_engine, func, insert, select, text
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, SQLModel
+
+from archivo import archivar
+from Esquemas import ProductRead
+from facetas import consulta_facetas
+from modelos import Categoria, Producto, ProductoArchivado, ahora
+from paginacion import consulta_pagina
+from serializacion import consulta_columnas
+
+# Índices del listado antes de los parciales: incluían todas las filas
+INDICES_COMPLETOS = {
+    "ix_producto_activo_categoria_precio": "activo, categoria_id, precio",
+    "ix_producto_activo_precio": "activo, precio, id",
+    "ix_producto_activo_cantidad": "activo, cantidad, id",
+    "ix_producto_activo_nombre": "activo, nombre, id",
+}
+INDICES_PARCIALES = [indice for indice in Producto.__table__.indexes if indice.name.startswith("ix_producto_vivo_")]
+
+
+def sembrar(motor, filas: int, bajas: float, lote: int = 50000):
+    SQLModel.metadata.create_all(motor)
+    aleatorio = random.Random(42)
+    hoy = ahora()
+    hace_dos_meses = hoy - timedelta(days=60)
+    with Session(motor) as session:
+        session.execute(insert(Categoria), [{"nombre": f"Categoría {i}"} for i in range(1, 51)])
+        for inicio in range(0, filas, lote):
+            filas_lote = []
+            for i in range(inicio, min(inicio + lote, filas)):
+                activo = aleatorio.random() >= bajas and i < filas - 1
+                filas_lote.append({
+                    "nombre": f"Producto {i}",
+                    "precio": round(aleatorio.lognormvariate(3.5, 1.2), 2),
+                    "cantidad": aleatorio.randint(0, 500),
+                    "categoria_id": aleatorio.randint(1, 50),
+                    "activo": activo,
+                    "actualizado_en": hoy if activo else hace_dos_meses,
+                })
+            session.execute(insert(Producto), filas_lote)
+            session.commit()
+
+
+def casos(id_medio: int):
+    """
+    (descripción, consulta) de las consultas calientes del listado.
+    """
+    activo = Producto.activo == True
+    base = consulta_columnas(Producto, ProductRead).where(activo)
+    return [
+        ("primera página", consulta_pagina(base, Producto, 100)),
+        ("página del medio", consulta_pagina(base, Producto, 100, id_medio)),
+        ("categoría 7", consulta_pagina(base.where(Producto.categoria_id == 7), Producto, 100)),
+        ("categoría 7, precio <= 20", consulta_pagina(
+            base.where(Producto.categoria_id == 7, Producto.precio <= 20), Producto, 100,
+        )),
+        ("20 más baratos", consulta_pagina(base, Producto, 20, None, "precio")),
+        ("20 con más stock", consulta_pagina(base, Producto, 20, None, "-cantidad")),
+        ("facetas", consulta_facetas(activo)),
+    ]
+
+
+def medir(motor, id_medio: int, repeticiones: int) -> dict:
+    """
+    Mediana en ms y filas devueltas de cada consulta.
+    """
+    resultados = {}
+    with Session(motor) as session:
+        session.execute(text("ANALYZE"))
+        for descripcion, consulta in casos(id_medio):
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                filas = session.exec(consulta).all()
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            resultados[descripcion] = (statistics.median(tiempos), [tuple(fila) for fila in filas])
+    return resultados
+
+
+def tamanos(motor) -> str:
+    """
+    MB de la tabla producto y de sus índices, según la tabla virtual dbstat.
+    """
+    try:
+        with motor.connect() as conexion:
+            filas = conexion.execute(text(
+                "SELECT name, SUM(pgsize) FROM dbstat "
+                "WHERE name = 'producto' OR name IN (SELECT name FROM sqlite_master WHERE tbl_name = 'producto' AND type = 'index') "
+                "GROUP BY name"
+            )).all()
+    except OperationalError:
+        return "(SQLite sin dbstat)"
+    tabla = sum(tamano for nombre, tamano in filas if nombre == "producto")
+    indices = sum(tamano for nombre, tamano in filas if nombre != "producto")
+    return f"tabla {tabla / 2**20:6.1f} MB, índices {indices / 2**20:6.1f} MB"
+
+
+def cambiar_indices(motor, completos: bool):
+    with motor.begin() as conexion:
+        if completos:
+            for indice in INDICES_PARCIALES:
+                conexion.execute(text(f"DROP INDEX {indice.name}"))
+            for nombre, columnas in INDICES_COMPLETOS.items():
+                conexion.execute(text(f"CREATE INDEX {nombre} ON producto ({columnas})"))
+        else:
+            for nombre in INDICES_COMPLETOS:
+                conexion.execute(text(f"DROP INDEX {nombre}"))
+    if not completos:
+        for indice in INDICES_PARCIALES:
+            indice.create(motor)
+
+
+def imprimir(titulo: str, motor, resultados: dict):
+    print(f"{titulo} ({tamanos(motor)}):")
+    for descripcion, (mediana, filas) in resultados.items():
+        print(f"  {descripcion:28} {mediana:9.2f} ms  {len(filas):4} filas")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=1_000_000)
+    parser.add_argument("--bajas", type=float, default=0.9, help="Proporción de productos inactivos")
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--lote", type=int, default=1000, help="Filas por transacción al archivar")
+    args = parser.parse_args()
+
+    motor = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'archivo.db')}")
+    print(f"Sembrando {args.filas} productos, {args.bajas:.0%} inactivos hace 60 días...")
+    sembrar(motor, args.filas, args.bajas)
+    id_medio = args.filas // 2
+
+    cambiar_indices(motor, completos=True)
+    imprimir("Índices completos (activo, ...)", motor, medir(motor, id_medio, args.repeticiones))
+    cambiar_indices(motor, completos=False)
+    parciales = medir(motor, id_medio, args.repeticiones)
+    imprimir("Índices parciales, bajas en la tabla", motor, parciales)
+
+    inicio = time.perf_counter()
+    resultado = archivar(motor, dias=30, lote=args.lote)
+    segundos = time.perf_counter() - inicio
+    print(f"Archivo: {resultado.productos} productos en {segundos:.1f} s "
+          f"({resultado.productos / max(segundos, 1e-9):,.0f} filas/s, lotes de {args.lote})")
+    with motor.connect().execution_options(isolation_level="AUTOCOMMIT") as conexion:
+        conexion.execute(text("VACUUM"))
+    archivados = medir(motor, id_medio, args.repeticiones)
+    imprimir("Índices parciales, bajas archivadas", motor, archivados)
+
+    with Session(motor) as session:
+        mayor_archivado = session.execute(select(func.max(ProductoArchivado.id))).scalar()
+        nuevo = Producto(nombre="Producto nuevo", precio=1, cantidad=1, categoria_id=1)
+        session.add(nuevo)
+        session.commit()
+        if nuevo.id <= mayor_archivado:
+            print(f"El producto nuevo recibió el ID {nuevo.id}, ya usado por uno archivado ({mayor_archivado})")
+            return 1
+
+    distintas = [descripcion for descripcion in parciales if parciales[descripcion][1] != archivados[descripcion][1]]
+    if distintas:
+        print(f"Resultados distintos después de archivar: {', '.join(distintas)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
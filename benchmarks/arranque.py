@@ -0,0 +1,68 @@
+"""
+Mide el costo de arranque de la API en procesos nuevos:
+- importar main (sin abrir conexiones),
+- desde create_app hasta responder la primera solicitud, con la base vacía
+  (crea el esquema) y con una base ya creada (la versión coincide y se omite),
+- lo mismo contra SQLite en memoria, como en las pruebas.
+
+Uso: python -m benchmarks.arranque [--repeticiones 5]
+Informa la mediana de cada caso en milisegundos.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Cada caso se ejecuta en un intérprete nuevo y devuelve sus milisegundos por stdout
+IMPORTAR = """
+import time
+inicio = time.perf_counter()
+import main
+print((time.perf_counter() - inicio) * 1000)
+"""
+
+# Se mide desde después de importar: el costo de las importaciones es el caso anterior
+PRIMERA_SOLICITUD = """
+import time
+from fastapi.testclient import TestClient
+from config import Settings
+import main
+inicio = time.perf_counter()
+app = main.create_app(Settings.from_env())
+with TestClient(app) as cliente:
+    assert cliente.get("/categorias").status_code == 200
+print((time.perf_counter() - inicio) * 1000)
+"""
+
+
+def _ejecutar(codigo: str, url: str) -> float:
+    entorno = dict(os.environ, DATABASE_URL=url, CACHE_BACKEND="ninguna", PYTHONWARNINGS="ignore")
+    salida = subprocess.run(
+        [sys.executable, "-c", codigo], env=entorno, capture_output=True, text=True, check=True
+    ).stdout
+    return float(salida.strip().splitlines()[-1])
+
+
+def medir(repeticiones: int) -> dict:
+    directorio = tempfile.mkdtemp()
+    casos = {"importar main": [], "primera solicitud, base nueva": [],
+             "primera solicitud, base existente": [], "primera solicitud, SQLite en memoria": []}
+    for i in range(repeticiones):
+        url = f"sqlite:///{os.path.join(directorio, f'arranque_{i}.db')}"
+        casos["importar main"].append(_ejecutar(IMPORTAR, url))
+        casos["primera solicitud, base nueva"].append(_ejecutar(PRIMERA_SOLICITUD, url))
+        # La misma base: la versión del esquema ya está guardada
+        casos["primera solicitud, base existente"].append(_ejecutar(PRIMERA_SOLICITUD, url))
+        casos["primera solicitud, SQLite en memoria"].append(_ejecutar(PRIMERA_SOLICITUD, "sqlite://"))
+    return {caso: statistics.median(tiempos) for caso, tiempos in casos.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+    print(f"Mediana de {args.repeticiones} procesos por caso")
+    for caso, mediana in medir(args.repeticiones).items():
+        print(f"{caso:38} {mediana:8.1f} ms")
@@ -0,0 +1,102 @@
+"""
+Mide la latencia de la búsqueda de texto completo sobre un catálogo sintético
+y la compara con un LIKE '%palabra%' que recorre toda la tabla.
+
+Uso: python -m benchmarks.busqueda [--filas 1000000] [--repeticiones 50]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert, or_
+from sqlmodel import Session, SQLModel, select
+
+from busqueda import consulta_busqueda, crear_indice_busqueda
+from modelos import Categoria, Producto
+
+PALABRAS = (
+    "camara lente tripode zapato camisa pantalon mesa silla lampara teclado raton monitor "
+    "altavoz cable cargador botella mochila reloj gafas bolso cuaderno lapiz taza sarten olla "
+    "cuchillo toalla sabana almohada colchon bicicleta casco balon raqueta guante gorra bufanda"
+).split()
+ADJETIVOS = "rojo azul negro blanco grande pequeño ligero resistente digital clasico moderno barato".split()
+CONSULTAS = ["camara", "lente digital", "bici", "silla negra", "cargador", "toalla grande", "mochila ligera"]
+
+
+def sembrar(motor, filas: int, lote: int = 50000):
+    """
+    Inserta 'filas' productos con nombres y descripciones aleatorias.
+    El índice FTS se crea al final para no pagar los triggers en cada lote.
+    """
+    SQLModel.metadata.create_all(motor)
+    aleatorio = random.Random(42)
+    with Session(motor) as session:
+        session.execute(insert(Categoria), [{"nombre": f"Categoría {i}"} for i in range(1, 51)])
+        for inicio in range(0, filas, lote):
+            session.execute(insert(Producto), [
+                {
+                    "nombre": f"{aleatorio.choice(PALABRAS)} {aleatorio.choice(ADJETIVOS)} {i}",
+                    "descripcion": " ".join(aleatorio.choices(PALABRAS + ADJETIVOS, k=8)),
+                    "precio": round(aleatorio.uniform(1, 1000), 2),
+                    "cantidad": aleatorio.randint(0, 100),
+                    "categoria_id": aleatorio.randint(1, 50),
+                }
+                for i in range(inicio, min(inicio + lote, filas))
+            ])
+            session.commit()
+    inicio = time.perf_counter()
+    crear_indice_busqueda(motor)
+    return time.perf_counter() - inicio
+
+
+def medir(session, construir, repeticiones: int) -> dict:
+    tiempos = []
+    for _ in range(repeticiones):
+        for q in CONSULTAS:
+            inicio = time.perf_counter()
+            session.exec(construir(q).limit(20)).all()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return {
+        "p50_ms": round(statistics.median(tiempos), 2),
+        "p95_ms": round(tiempos[int(len(tiempos) * 0.95) - 1], 2),
+        "max_ms": round(tiempos[-1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=1_000_000)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    motor = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'busqueda.db')}")
+    print(f"Sembrando {args.filas} productos...")
+    duracion_indice = sembrar(motor, args.filas)
+    print(f"Índice FTS construido en {duracion_indice:.1f} s")
+
+    def con_fts(q):
+        return consulta_busqueda("sqlite", q).where(Producto.activo == True)
+
+    def con_like(q):
+        condiciones = [or_(Producto.nombre.like(f"%{p}%"), Producto.descripcion.like(f"%{p}%")) for p in q.split()]
+        return select(Producto).where(Producto.activo == True, *condiciones)
+
+    def con_fts_y_filtros(q):
+        return con_fts(q).where(Producto.cantidad >= 10, Producto.precio <= 500, Producto.categoria_id == 7)
+
+    with Session(motor) as session:
+        for nombre, construir, repeticiones in (
+            ("FTS5", con_fts, args.repeticiones),
+            ("FTS5 + filtros", con_fts_y_filtros, args.repeticiones),
+            # LIKE es mucho más lento: pocas repeticiones bastan
+            ("LIKE %x%", con_like, max(1, args.repeticiones // 10)),
+        ):
+            print(f"{nombre:>15}: {medir(session, construir, repeticiones)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Feed de cambios GET /productos/cambios (SSE) con muchos suscriptores inactivos:
+memoria por suscriptor, tiempo desde que se envía una compra hasta que todos
+reciben el delta, reanudación con Last-Event-ID y desconexión.
+
+Los suscriptores llaman a la app ASGI directamente (httpx.ASGITransport espera
+el cuerpo completo y no sirve para respuestas que no terminan).
+
+Uso: python -m benchmarks.cambios [--suscriptores 2000] [--compras 50]
+Termina con código 1 si algún suscriptor pierde o desordena un cambio.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import httpx
+from sqlalchemy import insert
+from sqlmodel import Session
+
+import database
+import main
+from cambios import feed
+from config import Settings
+from modelos import Categoria, Producto
+
+
+class Suscriptor:
+    """
+    Cliente SSE sobre la interfaz ASGI: guarda las secuencias recibidas y la
+    hora de llegada de cada una.
+    """
+
+    def __init__(self, app, cabeceras=()):
+        self.secuencias = []
+        self.llegadas = {}
+        self._desconectar = asyncio.Event()
+        self._pedido_enviado = False
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": "/productos/cambios", "raw_path": b"/productos/cambios",
+            "query_string": b"", "root_path": "", "server": ("bench", 80), "client": ("127.0.0.1", 1),
+            "headers": [(b"host", b"bench"), (b"accept", b"text/event-stream"), *cabeceras],
+        }
+        self.tarea = asyncio.create_task(app(scope, self._recibir, self._enviar))
+
+    async def _recibir(self):
+        if not self._pedido_enviado:
+            self._pedido_enviado = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self._desconectar.wait()
+        return {"type": "http.disconnect"}
+
+    async def _enviar(self, mensaje):
+        if mensaje["type"] != "http.response.body":
+            return
+        ahora = time.perf_counter()
+        for linea in mensaje.get("body", b"").split(b"\n"):
+            if linea.startswith(b"id: "):
+                secuencia = int(linea[4:])
+                self.secuencias.append(secuencia)
+                self.llegadas[secuencia] = ahora
+
+    async def cerrar(self):
+        self._desconectar.set()
+        await self.tarea
+
+
+def sembrar():
+    database.init_db()
+    with Session(database.get_motor()) as session:
+        session.execute(insert(Categoria), [{"nombre": "General"}])
+        session.execute(insert(Producto), [{"nombre": "Oferta", "precio": 10, "cantidad": 1_000_000, "categoria_id": 1}])
+        session.commit()
+
+
+async def esperar_suscriptores(cantidad: int):
+    while feed.suscriptores < cantidad:
+        await asyncio.sleep(0.01)
+
+
+async def ejecutar(args) -> int:
+    directorio = tempfile.mkdtemp()
+    app = main.create_app(Settings(
+        database_url=f"sqlite:///{os.path.join(directorio, 'cambios.db')}", cache_backend="ninguna", slow_query_ms=100000,
+    ))
+    correcto = True
+    async with app.router.lifespan_context(app):
+        sembrar()
+        tracemalloc.start()
+        antes = tracemalloc.get_traced_memory()[0]
+        suscriptores = [Suscriptor(app) for _ in range(args.suscriptores)]
+        await esperar_suscriptores(args.suscriptores)
+        por_suscriptor = (tracemalloc.get_traced_memory()[0] - antes) / args.suscriptores
+        tracemalloc.stop()
+        print(f"{args.suscriptores} suscriptores conectados: {por_suscriptor / 1024:.1f} KiB cada uno")
+
+        retrasos = []
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+            for _ in range(args.compras):
+                inicio = time.perf_counter()
+                (await cliente.put("/productos/1/comprar?cantidad=1")).raise_for_status()
+                secuencia = feed.secuencia
+                while any(secuencia not in s.llegadas for s in suscriptores):
+                    await asyncio.sleep(0)
+                retrasos.append((max(s.llegadas[secuencia] for s in suscriptores) - inicio) * 1000)
+        retrasos.sort()
+        print(f"{args.compras} compras: desde la solicitud hasta que el último suscriptor recibe el cambio "
+              f"p50 {retrasos[len(retrasos) // 2]:.1f} ms, máx {retrasos[-1]:.1f} ms")
+
+        esperadas = list(range(1, args.compras + 1))
+        completos = sum(s.secuencias == esperadas for s in suscriptores)
+        correcto &= completos == len(suscriptores)
+        print(f"[{'OK ' if completos == len(suscriptores) else 'MAL'}] {completos}/{len(suscriptores)} "
+              f"suscriptores recibieron las {args.compras} secuencias en orden")
+
+        # Reconexión: con Last-Event-ID recibe solo lo posterior a esa secuencia
+        reanudado = Suscriptor(app, [(b"last-event-id", str(args.compras // 2).encode())])
+        await esperar_suscriptores(args.suscriptores + 1)
+        await asyncio.sleep(0.05)
+        esperadas = list(range(args.compras // 2 + 1, args.compras + 1))
+        correcto &= reanudado.secuencias == esperadas
+        print(f"[{'OK ' if reanudado.secuencias == esperadas else 'MAL'}] reanudación desde "
+              f"{args.compras // 2}: {len(reanudado.secuencias)} cambios pendientes")
+
+        for suscriptor in suscriptores + [reanudado]:
+            await suscriptor.cerrar()
+        correcto &= feed.suscriptores == 0
+        print(f"[{'OK ' if feed.suscriptores == 0 else 'MAL'}] suscriptores tras desconectar: {feed.suscriptores}")
+    return 0 if correcto else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suscriptores", type=int, default=2000)
+    parser.add_argument("--compras", type=int, default=50)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(ejecutar(args)))
@@ -0,0 +1,258 @@
+"""
+Prueba de carga reproducible de la API dentro del proceso.
+
+Siembra un catálogo sintético, lanza clientes concurrentes contra la app de
+main.py e informa p50/p95/p99 y solicitudes
+por segundo de cada escenario, incluido un escenario mixto de lecturas y
+compras. Los resultados se guardan en JSON y se pueden comparar con una
+línea base: termina con código 1 si algún escenario empeora más del umbral.
+
+Uso:
+    python -m benchmarks.carga --filas 10000 --salida linea_base.json
+    python -m benchmarks.carga --filas 10000 --base linea_base.json --umbral 0.2
+    python -m benchmarks.carga --url sqlite:///./tienda.db --filas 1000000 --clientes 32
+
+Sin --url usa una base SQLite temporal. Si la base ya tiene productos no se
+vuelve a sembrar. La caché está desactivada por defecto para medir las
+consultas reales (--cache memoria para medir con caché).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# Escenarios medidos, en este orden
+ESCENARIOS = [
+    "listar_productos",
+    "listar_filtrado",
+    "obtener_producto",
+    "producto_con_categoria",
+    "listar_categorias",
+    "categoria_con_productos",
+    "buscar_productos",
+    "resumen_inventario",
+    "mixto_lectura_compra",
+]
+PALABRAS = "camara lente tripode zapato camisa mesa silla lampara teclado monitor mochila reloj taza".split()
+ADJETIVOS = "rojo azul negro grande ligero digital clasico".split()
+
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="DATABASE_URL a usar (por defecto una SQLite temporal)")
+    parser.add_argument("--filas", type=int, default=10000, help="Productos del catálogo (10000, 100000, 1000000...)")
+    parser.add_argument("--categorias", type=int, default=50)
+    parser.add_argument("--clientes", type=int, default=16, help="Clientes concurrentes por escenario")
+    parser.add_argument("--solicitudes", type=int, default=1000, help="Solicitudes por escenario")
+    parser.add_argument("--calentamiento", type=int, default=50,
+                        help="Solicitudes previas sin medir en cada escenario")
+    parser.add_argument("--compras", type=float, default=0.2, help="Proporción de compras en el escenario mixto")
+    parser.add_argument("--cache", default="ninguna", choices=["ninguna", "memoria"])
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", help="Archivo JSON donde guardar los resultados")
+    parser.add_argument("--base", help="Archivo JSON con la línea base a comparar")
+    parser.add_argument("--umbral", type=float, default=0.2,
+                        help="Empeoramiento tolerado respecto a la base (0.2 = 20%% en p95 o req/s)")
+    return parser.parse_args()
+
+
+ARGS = _argumentos()
+# La configuración se lee al importar database y cache, así que va antes de importarlos
+os.environ["DATABASE_URL"] = ARGS.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'carga.db')}"
+os.environ["CACHE_BACKEND"] = ARGS.cache
+os.environ.setdefault("DB_POOL_SIZE", str(max(5, ARGS.clientes)))
+
+import httpx  # noqa: E402
+from sqlalchemy import func, insert  # noqa: E402
+from sqlmodel import Session, SQLModel, select  # noqa: E402
+
+import database  # noqa: E402
+import main  # noqa: E402
+from modelos import Categoria, Producto  # noqa: E402
+
+
+# SIEMBRA DEL CATÁLOGO
+
+
+def sembrar(filas: int, categorias: int, semilla: int, lote: int = 50000) -> int:
+    """
+    Crea el catálogo sintético si la base no tiene productos.
+    El índice de búsqueda se crea después para no pagar sus triggers fila a fila.
+    Devuelve la cantidad de productos del catálogo.
+    """
+    SQLModel.metadata.create_all(database.get_motor())
+    with Session(database.get_motor()) as session:
+        existentes = session.exec(select(func.count()).select_from(Producto)).one()
+        if existentes:
+            print(f"La base ya tiene {existentes} productos; no se siembra.")
+        else:
+            print(f"Sembrando {filas} productos en {categorias} categorías...")
+            aleatorio = random.Random(semilla)
+            session.execute(insert(Categoria), [{"nombre": f"Categoría {i}"} for i in range(1, categorias + 1)])
+            for inicio in range(0, filas, lote):
+                session.execute(insert(Producto), [
+                    {
+                        "nombre": f"{aleatorio.choice(PALABRAS)} {aleatorio.choice(ADJETIVOS)} {i}",
+                        "descripcion": " ".join(aleatorio.choices(PALABRAS + ADJETIVOS, k=6)),
+                        "precio": round(aleatorio.uniform(1, 1000), 2),
+                        # Stock alto para que el escenario mixto no agote los productos
+                        "cantidad": aleatorio.randint(10000, 100000),
+                        "categoria_id": aleatorio.randint(1, categorias),
+                    }
+                    for i in range(inicio, min(inicio + lote, filas))
+                ])
+                session.commit()
+            existentes = filas
+    database.init_db()
+    return existentes
+
+
+# ESCENARIOS
+
+
+def _solicitud(escenario: str, aleatorio: random.Random, productos: int, categorias: int, compras: float):
+    """
+    Devuelve (método, ruta) de la siguiente solicitud del escenario.
+    """
+    id_producto = aleatorio.randint(1, productos)
+    id_categoria = aleatorio.randint(1, categorias)
+    if escenario == "listar_productos":
+        return "GET", f"/productos?limit=100&after={aleatorio.randint(0, max(0, productos - 100))}"
+    if escenario == "listar_filtrado":
+        return "GET", f"/productos?categoria_id={id_categoria}&precio_max={aleatorio.randint(50, 1000)}&limit=50"
+    if escenario == "obtener_producto":
+        return "GET", f"/productos/{id_producto}"
+    if escenario == "producto_con_categoria":
+        return "GET", f"/productos/{id_producto}/categoria"
+    if escenario == "listar_categorias":
+        return "GET", "/categorias"
+    if escenario == "categoria_con_productos":
+        return "GET", f"/categorias/{id_categoria}/productos"
+    if escenario == "buscar_productos":
+        return "GET", f"/productos/buscar?q={aleatorio.choice(PALABRAS)}+{aleatorio.choice(ADJETIVOS)}&limit=20"
+    if escenario == "resumen_inventario":
+        return "GET", "/inventario/resumen"
+    if escenario == "mixto_lectura_compra":
+        if aleatorio.random() < compras:
+            return "PUT", f"/productos/{id_producto}/comprar?cantidad=1"
+        return "GET", f"/productos/{id_producto}"
+    raise ValueError(escenario)
+
+
+async def medir(app, escenario: str, productos: int) -> dict:
+    """
+    Ejecuta ARGS.solicitudes solicitudes del escenario con ARGS.clientes clientes
+    concurrentes y devuelve sus percentiles de latencia y el rendimiento.
+    """
+    aleatorio = random.Random(f"{ARGS.semilla}-{escenario}")
+    pendientes = [
+        _solicitud(escenario, aleatorio, productos, ARGS.categorias, ARGS.compras)
+        for _ in range(ARGS.solicitudes)
+    ]
+    tiempos = []
+    errores = 0
+
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://carga") as cliente:
+        # Llena el pool de conexiones y las cachés de sentencias antes de medir
+        for _ in range(ARGS.calentamiento):
+            await cliente.request(*_solicitud(escenario, aleatorio, productos, ARGS.categorias, ARGS.compras))
+
+        async def cliente_concurrente():
+            nonlocal errores
+            while pendientes:
+                metodo, ruta = pendientes.pop()
+                inicio = time.perf_counter()
+                respuesta = await cliente.request(metodo, ruta)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+                # Un 404 (producto inactivo) o un 400 sin stock son respuestas válidas
+                if respuesta.status_code >= 500:
+                    errores += 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente_concurrente() for _ in range(ARGS.clientes)))
+        duracion = time.perf_counter() - inicio
+
+    tiempos.sort()
+    return {
+        "solicitudes": len(tiempos),
+        "errores": errores,
+        "req_s": round(len(tiempos) / duracion, 1),
+        "p50_ms": round(statistics.median(tiempos), 2),
+        "p95_ms": round(_percentil(tiempos, 0.95), 2),
+        "p99_ms": round(_percentil(tiempos, 0.99), 2),
+    }
+
+
+def _percentil(ordenados: list, fraccion: float) -> float:
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * fraccion))]
+
+
+# COMPARACIÓN CON LA LÍNEA BASE
+
+
+def comparar(resultados: dict, base: dict, umbral: float) -> list:
+    """
+    Devuelve los escenarios cuyo p95 subió o cuyo req/s bajó más del umbral.
+    """
+    regresiones = []
+    for escenario, actual in resultados.items():
+        anterior = base.get(escenario)
+        if not anterior:
+            continue
+        if actual["p95_ms"] > anterior["p95_ms"] * (1 + umbral):
+            regresiones.append(f"{escenario}: p95 {anterior['p95_ms']} -> {actual['p95_ms']} ms")
+        if actual["req_s"] < anterior["req_s"] * (1 - umbral):
+            regresiones.append(f"{escenario}: req/s {anterior['req_s']} -> {actual['req_s']}")
+    return regresiones
+
+
+async def ejecutar() -> int:
+    productos = sembrar(ARGS.filas, ARGS.categorias, ARGS.semilla)
+
+    resultados = {}
+    for escenario in ESCENARIOS:
+        resultado = await medir(main.app, escenario, productos)
+        resultados[escenario] = resultado
+        print(f"{escenario:24} {resultado['req_s']:>8} req/s  p50 {resultado['p50_ms']:>7} ms  "
+              f"p95 {resultado['p95_ms']:>7} ms  p99 {resultado['p99_ms']:>7} ms  errores {resultado['errores']}")
+
+    informe = {
+        "configuracion": {
+            "filas": productos,
+            "categorias": ARGS.categorias,
+            "clientes": ARGS.clientes,
+            "solicitudes": ARGS.solicitudes,
+            "compras": ARGS.compras,
+            "cache": ARGS.cache,
+            "base_de_datos": database.get_motor().dialect.name,
+            "python": platform.python_version(),
+        },
+        "resultados": resultados,
+    }
+    if ARGS.salida:
+        with open(ARGS.salida, "w", encoding="utf-8") as archivo:
+            json.dump(informe, archivo, indent=2, ensure_ascii=False)
+        print(f"Resultados guardados en {ARGS.salida}")
+
+    if ARGS.base:
+        with open(ARGS.base, encoding="utf-8") as archivo:
+            base = json.load(archivo)
+        regresiones = comparar(resultados, base["resultados"], ARGS.umbral)
+        if regresiones:
+            print(f"Regresiones de más del {ARGS.umbral:.0%}:")
+            for regresion in regresiones:
+                print(f"  {regresion}")
+            return 1
+        print(f"Sin regresiones de más del {ARGS.umbral:.0%} respecto a {ARGS.base}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(ejecutar()))
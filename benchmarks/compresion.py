@@ -0,0 +1,150 @@
+"""
+Bytes transferidos y latencia de una página del listado de productos, completa
+o con ?fields=, sin comprimir y con gzip / Brotli.
+
+Antes de medir comprueba cada codificación: la página y el listado en NDJSON
+(streaming) deben llegar con su Content-Encoding, descomprimirse igual que sin
+comprimir, y el NDJSON en varios bloques que se pueden descomprimir a medida que
+llegan. Brotli se prueba si está instalado (pip install -r requirements-opcional.txt).
+
+Uso: python -m benchmarks.compresion [--filas 5000] [--limit 1000] [--repeticiones 20]
+Termina con código 1 si alguna codificación no pasa la comprobación.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'compresion.db')}"
+os.environ["CACHE_BACKEND"] = "ninguna"
+os.environ["SLOW_QUERY_MS"] = "100000"
+
+import httpx  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+
+import database  # noqa: E402
+import main  # noqa: E402
+from compresion import brotli  # noqa: E402
+from modelos import Categoria, Producto  # noqa: E402
+
+
+def sembrar(filas: int):
+    database.init_db()
+    with Session(database.get_motor()) as session:
+        session.execute(insert(Categoria), [{"nombre": "General"}])
+        session.execute(insert(Producto), [
+            {"nombre": f"Producto {i}", "descripcion": f"Descripción larga del producto número {i} del catálogo",
+             "precio": 10 + i % 90, "cantidad": i % 50, "categoria_id": 1}
+            for i in range(filas)
+        ])
+        session.commit()
+
+
+async def medir(ruta: str, codificacion: str, repeticiones: int):
+    tiempos = []
+    transporte = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        cabeceras = {"Accept-Encoding": codificacion}
+        await cliente.get(ruta, headers=cabeceras)
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            respuesta = await cliente.get(ruta, headers=cabeceras)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+    # Bytes recibidos antes de descomprimir
+    return respuesta.num_bytes_downloaded, statistics.median(tiempos)
+
+
+async def bloques(ruta: str, codificacion: str):
+    """
+    Pide la ruta por ASGI y devuelve las cabeceras y cada bloque del cuerpo tal
+    como sale del middleware (httpx.ASGITransport los juntaría).
+    """
+    inicio, cuerpo = {}, []
+    pedido_enviado = False
+
+    async def recibir():
+        nonlocal pedido_enviado
+        if not pedido_enviado:
+            pedido_enviado = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()
+
+    async def enviar(mensaje):
+        if mensaje["type"] == "http.response.start":
+            inicio.update({nombre.decode().lower(): valor.decode() for nombre, valor in mensaje["headers"]})
+        elif mensaje["type"] == "http.response.body" and mensaje.get("body"):
+            cuerpo.append(mensaje["body"])
+
+    camino, _, consulta = ruta.partition("?")
+    await main.app({
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": camino, "raw_path": camino.encode(), "query_string": consulta.encode(),
+        "root_path": "", "server": ("bench", 80), "client": ("127.0.0.1", 1),
+        "headers": [(b"host", b"bench"), (b"accept-encoding", codificacion.encode())],
+    }, recibir, enviar)
+    return inicio, cuerpo
+
+
+def descompresor(codificacion: str):
+    if codificacion == "br":
+        return brotli.Decompressor().process
+    if codificacion == "gzip":
+        return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress
+    return lambda bloque: bloque
+
+
+async def comprobar(nombre: str, ruta: str, codificaciones: list, streaming: bool) -> bool:
+    _, original = await bloques(ruta, "identity")
+    original = b"".join(original)
+    correcto = True
+    for codificacion in codificaciones[1:]:
+        cabeceras, cuerpo = await bloques(ruta, codificacion)
+        descomprimir = descompresor(codificacion)
+        # Cada bloque se descomprime al llegar: el streaming no queda retenido en el compresor
+        partes = [descomprimir(bloque) for bloque in cuerpo]
+        fallos = []
+        if cabeceras.get("content-encoding") != codificacion:
+            fallos.append(f"Content-Encoding {cabeceras.get('content-encoding')}")
+        if b"".join(partes) != original:
+            fallos.append("el contenido no coincide")
+        # El último bloque puede traer solo el cierre del formato comprimido
+        if streaming and (len(cuerpo) < 2 or not all(partes[:-1])):
+            fallos.append(f"{len(cuerpo)} bloques, alguno sin datos al descomprimirlo")
+        correcto &= not fallos
+        print(f"[{'MAL' if fallos else 'OK '}] {nombre:22} {codificacion:5} {len(cuerpo):3} bloques  "
+              f"{'; '.join(fallos)}")
+    return correcto
+
+
+async def ejecutar(filas: int, limit: int, repeticiones: int) -> int:
+    sembrar(filas)
+    codificaciones = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+    correcto = await comprobar("página", f"/productos?limit={limit}", codificaciones, streaming=False)
+    correcto &= await comprobar("NDJSON", "/productos?formato=ndjson", codificaciones, streaming=True)
+    if not correcto:
+        return 1
+
+    print(f"Página de {limit} productos, mediana de {repeticiones} solicitudes"
+          f"{'' if brotli is not None else ' (Brotli no instalado)'}")
+    for nombre, ruta in (
+        ("completo", f"/productos?limit={limit}"),
+        ("fields=nombre,precio", f"/productos?limit={limit}&fields=nombre,precio"),
+    ):
+        for codificacion in codificaciones:
+            tamano, mediana = await medir(ruta, codificacion, repeticiones)
+            print(f"{nombre:22} {codificacion:9} {tamano:>9} bytes  {mediana:7.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=5000)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(ejecutar(args.filas, args.limit, args.repeticiones)))
@@ -0,0 +1,98 @@
+"""
+Cuenta las consultas SQL de los endpoints con relaciones y falla si alguno
+supera su máximo, para que no vuelvan a aparecer consultas N+1 o duplicadas.
+
+Uso: python -m benchmarks.conteo_consultas
+Termina con código 1 si algún endpoint ejecuta más consultas de las permitidas.
+"""
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+# Base temporal y sin caché, para contar siempre las consultas reales
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'conteo.db')}"
+os.environ["CACHE_BACKEND"] = "ninguna"
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+
+import database  # noqa: E402
+import main  # noqa: E402
+from modelos import Categoria, Producto  # noqa: E402
+
+CATEGORIAS = 20
+PRODUCTOS_POR_CATEGORIA = 10
+
+
+@contextmanager
+def contar_consultas():
+    """
+    Cuenta las sentencias enviadas a la base por los motores síncrono y asíncrono.
+    """
+    contador = {"consultas": 0}
+
+    def _antes(conn, cursor, sentencia, parametros, contexto, multiples):
+        contador["consultas"] += 1
+
+    motores = [database.get_motor(), database.get_motor_async().sync_engine]
+    for motor in motores:
+        event.listen(motor, "before_cursor_execute", _antes)
+    try:
+        yield contador
+    finally:
+        for motor in motores:
+            event.remove(motor, "before_cursor_execute", _antes)
+
+
+def sembrar():
+    database.init_db()
+    with Session(database.get_motor()) as session:
+        for c in range(CATEGORIAS):
+            categoria = Categoria(nombre=f"Categoría {c}")
+            session.add(categoria)
+            session.flush()
+            for p in range(PRODUCTOS_POR_CATEGORIA):
+                session.add(Producto(nombre=f"Producto {c}-{p}", precio=10 + p, cantidad=5, categoria_id=categoria.id))
+        # Una categoría vacía para poder borrarla
+        session.add(Categoria(nombre="Vacía"))
+        session.commit()
+
+
+# (método, ruta, máximo de consultas)
+# Los listados de categorías suman las consultas de versión de la colección (ETag).
+# Una categoría con productos activos se rechaza con el EXISTS, sin más consultas;
+# el borrado de una vacía suma el incremento de la versión después del commit
+CASOS = [
+    ("GET", "/productos/1/categoria", 1),
+    ("GET", "/categorias/1/productos", 2),
+    ("GET", "/categorias?include=productos", 4),
+    ("DELETE", "/categorias/2", 1),
+    ("DELETE", f"/categorias/{CATEGORIAS + 1}", 4),
+]
+
+
+def ejecutar():
+    sembrar()
+    cliente = TestClient(main.app)
+
+    fallos = 0
+    for metodo, ruta, maximo in CASOS:
+        with contar_consultas() as contador:
+            respuesta = cliente.request(metodo, ruta)
+        estado = "OK " if contador["consultas"] <= maximo else "MAL"
+        if estado == "MAL":
+            fallos += 1
+        print(f"[{estado}] {metodo:6} {ruta}: {contador['consultas']} consultas "
+              f"(máximo {maximo}), HTTP {respuesta.status_code}")
+
+    if fallos:
+        print(f"{fallos} endpoint(s) superan su número de consultas.")
+        return 1
+    print("Ningún endpoint supera su número de consultas.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(ejecutar())
@@ -0,0 +1,214 @@
+"""
+Exportación del catálogo completo (GET /exportar/productos) sobre un catálogo
+sintético: duración, bytes y cuánto crece la memoria residente (RSS) del
+proceso mientras se transmite, comparado con cargar todas las filas a la vez.
+
+La respuesta se consume por la interfaz ASGI descartando cada bloque, como un
+cliente que escribe a disco (httpx.ASGITransport guardaría el cuerpo entero).
+
+Con --wal la base usa WAL y la exportación lee con un único cursor (yield_per);
+sin WAL, en lotes cortos por ID.
+
+Después archiva una parte de los productos y pide la exportación incremental
+(updated_since) en cada formato: deben llegar, con archivado = true, todos los
+archivados. El Parquet se lee de vuelta con pyarrow (pip install -r
+requirements-opcional.txt); sin pyarrow esa parte se omite.
+
+Uso: python -m benchmarks.exportacion [--filas 1000000] [--limite-mb 64] [--wal]
+Termina con código 1 si alguna exportación hace crecer el RSS más que el límite
+o si la incremental no trae las bajas.
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import quote
+
+from sqlalchemy import insert, update
+from sqlmodel import Session, select
+
+import database
+import main
+from config import Settings
+from archivo import archivar
+from modelos import Categoria, Producto, ahora
+from rutas_exportacion import cargar_pyarrow
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as estado:
+        for linea in estado:
+            if linea.startswith("VmRSS:"):
+                return int(linea.split()[1]) / 1024
+    return 0.0
+
+
+class PicoRSS:
+    """
+    Muestrea el RSS en un hilo y guarda el máximo alcanzado.
+    """
+
+    def __enter__(self):
+        self.inicial = self.pico = rss_mb()
+        self._fin = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+        self._hilo.start()
+        return self
+
+    def _muestrear(self):
+        while not self._fin.wait(0.01):
+            self.pico = max(self.pico, rss_mb())
+
+    def __exit__(self, *error):
+        self._fin.set()
+        self._hilo.join()
+        self.pico = max(self.pico, rss_mb())
+
+    @property
+    def crecimiento(self) -> float:
+        return self.pico - self.inicial
+
+
+def sembrar(filas: int, lote: int = 50000):
+    database.init_db()
+    aleatorio = random.Random(42)
+    with Session(database.get_motor()) as session:
+        session.execute(insert(Categoria), [{"nombre": f"Categoría {i}"} for i in range(1, 51)])
+        for inicio in range(0, filas, lote):
+            session.execute(insert(Producto), [
+                {
+                    "nombre": f"Producto {i}",
+                    "descripcion": f"Descripción del producto {i} para la exportación",
+                    "precio": round(aleatorio.uniform(1, 1000), 2),
+                    "cantidad": aleatorio.randint(0, 500),
+                    "categoria_id": aleatorio.randint(1, 50),
+                }
+                for i in range(inicio, min(inicio + lote, filas))
+            ])
+            session.commit()
+
+
+async def exportar(app, ruta: str, cuerpo: bytearray = None) -> int:
+    """
+    Pide la ruta por ASGI y devuelve los bytes recibidos sin guardarlos,
+    salvo que se pase 'cuerpo', donde se acumulan.
+    """
+    recibidos = 0
+    pedido_enviado = False
+
+    async def recibir():
+        nonlocal pedido_enviado
+        if not pedido_enviado:
+            pedido_enviado = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()
+
+    async def enviar(mensaje):
+        nonlocal recibidos
+        if mensaje["type"] == "http.response.start" and mensaje["status"] != 200:
+            raise RuntimeError(f"{ruta}: HTTP {mensaje['status']}")
+        if mensaje["type"] == "http.response.body":
+            recibidos += len(mensaje.get("body", b""))
+            if cuerpo is not None:
+                cuerpo.extend(mensaje.get("body", b""))
+
+    camino, _, consulta = ruta.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": camino, "raw_path": camino.encode(), "query_string": consulta.encode(),
+        "root_path": "", "server": ("bench", 80), "client": ("127.0.0.1", 1), "headers": [(b"host", b"bench")],
+    }
+    await app(scope, recibir, enviar)
+    return recibidos
+
+
+def leer_exportacion(formato: str, cuerpo: bytes) -> list:
+    """
+    Filas de la exportación como diccionarios.
+    """
+    if formato == "csv":
+        return list(csv.DictReader(io.StringIO(cuerpo.decode("utf-8"))))
+    if formato == "ndjson":
+        return [json.loads(linea) for linea in cuerpo.splitlines()]
+    import pyarrow.parquet
+
+    return pyarrow.parquet.read_table(io.BytesIO(cuerpo)).to_pylist()
+
+
+def archivar_muestra() -> int:
+    """
+    Desactiva uno de cada diez productos con fecha de hace dos meses y los archiva.
+    """
+    with Session(database.get_motor()) as session:
+        session.execute(
+            update(Producto)
+            .where(Producto.id % 10 == 0)
+            .values(activo=False, actualizado_en=ahora() - timedelta(days=60))
+        )
+        session.commit()
+    return archivar(database.get_motor(), dias=30).productos
+
+
+async def comprobar_incremental(app, formatos: list) -> bool:
+    desde = ahora() - timedelta(seconds=1)
+    archivados = archivar_muestra()
+    correcto = True
+    for formato in formatos:
+        cuerpo = bytearray()
+        await exportar(app, f"/exportar/productos?formato={formato}&updated_since={quote(desde.isoformat())}", cuerpo)
+        bajas = [fila for fila in leer_exportacion(formato, bytes(cuerpo)) if fila["archivado"] in (True, "True")]
+        bien = len(bajas) == archivados
+        correcto &= bien
+        print(f"[{'OK ' if bien else 'MAL'}] incremental {formato:8} {len(bajas)} bajas de {archivados} archivados")
+    return correcto
+
+
+async def ejecutar(args) -> int:
+    directorio = tempfile.mkdtemp()
+    app = main.create_app(Settings(
+        database_url=f"sqlite:///{os.path.join(directorio, 'exportacion.db')}", sqlite_wal=args.wal,
+        cache_backend="ninguna", slow_query_ms=100000,
+    ))
+    correcto = True
+    async with app.router.lifespan_context(app):
+        print(f"Sembrando {args.filas} productos...")
+        sembrar(args.filas)
+
+        pyarrow = cargar_pyarrow()
+        formatos = ["csv", "ndjson"] + (["parquet"] if pyarrow is not None else [])
+        for formato in formatos:
+            inicio = time.perf_counter()
+            with PicoRSS() as memoria:
+                recibidos = await exportar(app, f"/exportar/productos?formato={formato}")
+            dentro = memoria.crecimiento <= args.limite_mb
+            correcto &= dentro
+            print(f"[{'OK ' if dentro else 'MAL'}] {formato:8} {time.perf_counter() - inicio:6.1f} s  "
+                  f"{recibidos / 1e6:7.1f} MB  RSS +{memoria.crecimiento:6.1f} MB")
+        if pyarrow is None:
+            print("      parquet  (pyarrow no instalado: pip install -r requirements-opcional.txt)")
+
+        # Antes: todas las filas en memoria de una vez
+        with PicoRSS() as memoria, Session(database.get_motor()) as session:
+            filas = session.exec(select(Producto)).all()
+            del filas
+        print(f"      todo en memoria          RSS +{memoria.crecimiento:6.1f} MB")
+
+        correcto &= await comprobar_incremental(app, formatos)
+    return 0 if correcto else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=1_000_000)
+    parser.add_argument("--limite-mb", type=float, default=64, help="Crecimiento máximo del RSS por exportación")
+    parser.add_argument("--wal", action="store_true", help="Base en modo WAL: un solo cursor del lado del servidor")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(ejecutar(args)))
@@ -0,0 +1,122 @@
+"""
+Listados ordenados (sort=) y facetas de GET /productos sobre un catálogo sintético.
+
+Compara las páginas top-N con los índices parciales (columna, id) contra la misma
+consulta sin ellos y contra lo que hacían los clientes: leer todos los productos
+y ordenarlos o contarlos en memoria.
+
+Uso: python -m benchmarks.ordenacion [--filas 1000000] [--repeticiones 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert, text
+from sqlmodel import Session, SQLModel
+
+from Esquemas import ProductRead
+from facetas import consulta_facetas, facetas_de_filas
+from modelos import Categoria, Producto
+from paginacion import consulta_pagina
+from serializacion import consulta_columnas
+
+INDICES_ORDEN = ("ix_producto_vivo_precio", "ix_producto_vivo_cantidad", "ix_producto_vivo_nombre")
+
+
+def sembrar(motor, filas: int, lote: int = 50000):
+    SQLModel.metadata.create_all(motor)
+    aleatorio = random.Random(42)
+    with Session(motor) as session:
+        session.execute(insert(Categoria), [{"nombre": f"Categoría {i}"} for i in range(1, 51)])
+        for inicio in range(0, filas, lote):
+            session.execute(insert(Producto), [
+                {
+                    "nombre": f"Producto {aleatorio.randrange(filas)}",
+                    "precio": round(aleatorio.lognormvariate(3.5, 1.2), 2),
+                    "cantidad": aleatorio.randint(0, 500),
+                    "categoria_id": aleatorio.randint(1, 50),
+                    "activo": aleatorio.random() > 0.05,
+                }
+                for _ in range(inicio, min(inicio + lote, filas))
+            ])
+            session.commit()
+        session.execute(text("ANALYZE"))
+
+
+def casos():
+    """
+    (descripción, sort, condiciones) de las páginas a medir.
+    """
+    activo = Producto.activo == True
+    return [
+        ("más baratos", "precio", [activo]),
+        ("más caros", "-precio", [activo]),
+        ("más stock", "-cantidad", [activo]),
+        ("por nombre", "nombre", [activo]),
+        ("más baratos de la categoría 7", "precio", [activo, Producto.categoria_id == 7]),
+    ]
+
+
+def medir(session, consulta, repeticiones: int) -> float:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        session.exec(consulta).all()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+def medir_paginas(session, limit: int, repeticiones: int):
+    for descripcion, sort, condiciones in casos():
+        base = consulta_columnas(Producto, ProductRead).where(*condiciones)
+        primera = session.exec(consulta_pagina(base, Producto, limit, None, sort)).all()
+        primera_ms = medir(session, consulta_pagina(base, Producto, limit, None, sort), repeticiones)
+        # Página siguiente con el cursor: sigue siendo una búsqueda en el índice
+        siguiente_ms = medir(session, consulta_pagina(base, Producto, limit, primera[limit - 1].id, sort), repeticiones)
+        print(f"  {descripcion:32} primera {primera_ms:8.2f} ms   siguiente {siguiente_ms:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    motor = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ordenacion.db')}")
+    print(f"Sembrando {args.filas} productos...")
+    sembrar(motor, args.filas)
+
+    with Session(motor) as session:
+        print(f"Top {args.limit} con índices:")
+        medir_paginas(session, args.limit, args.repeticiones)
+
+        activo = Producto.activo == True
+        facetas_ms = medir(session, consulta_facetas(activo), max(1, args.repeticiones // 4))
+        facetas = facetas_de_filas(session.exec(consulta_facetas(activo)).all())
+        print(f"Facetas (una consulta agrupada): {facetas_ms:8.2f} ms, {facetas.total} productos, "
+              f"{len(facetas.categorias)} categorías, {len(facetas.precios)} cubetas")
+
+        # Antes: el cliente leía todo el catálogo y ordenaba o contaba en memoria
+        inicio = time.perf_counter()
+        filas = session.exec(consulta_columnas(Producto, ProductRead).where(activo)).all()
+        lectura_ms = (time.perf_counter() - inicio) * 1000
+        inicio = time.perf_counter()
+        sorted(filas, key=lambda fila: (fila.precio, fila.id))[:args.limit]
+        orden_ms = (time.perf_counter() - inicio) * 1000
+        print(f"Cliente: leer {len(filas)} productos {lectura_ms:8.0f} ms + ordenar {orden_ms:6.0f} ms")
+        del filas
+
+    with motor.begin() as conexion:
+        for indice in INDICES_ORDEN:
+            conexion.execute(text(f"DROP INDEX {indice}"))
+    with Session(motor) as session:
+        print("Top N sin los índices (columna, id); nombre y categoría usan los índices previos:")
+        medir_paginas(session, args.limit, max(1, args.repeticiones // 10))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Prueba de concurrencia de POST /pedidos.
+
+Lanza muchos pedidos simultáneos sobre pocos productos con poco stock, con las
+líneas en orden aleatorio, y reenvía cada pedido a la vez con la misma
+Idempotency-Key (como un cliente que reintenta). Al terminar comprueba que:
+- ninguna solicitud falló con un error del servidor (bloqueos, deadlocks),
+- cada clave generó un único pedido y sus repeticiones devolvieron ese pedido,
+- el stock descontado de cada producto es igual a lo vendido en las líneas y nunca es negativo,
+- el resumen de inventario coincide con el recalculado desde los productos.
+
+Uso: python -m benchmarks.pedidos_concurrentes [--pedidos 500] [--clientes 32] [--productos 20]
+Termina con código 1 si alguna comprobación falla.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Base temporal en modo WAL y sin caché, configurada antes de importar la app
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pedidos.db')}"
+os.environ["CACHE_BACKEND"] = "ninguna"
+os.environ["SQLITE_WAL"] = "true"
+os.environ.setdefault("SQLITE_BUSY_TIMEOUT_MS", "30000")
+
+import httpx  # noqa: E402
+from sqlalchemy import func  # noqa: E402
+from sqlmodel import Session, select  # noqa: E402
+
+import database  # noqa: E402
+import main  # noqa: E402
+from modelos import Categoria, LineaPedido, Pedido, Producto, ResumenCategoria  # noqa: E402
+from resumen import recalcular_resumen  # noqa: E402
+
+STOCK_INICIAL = 50
+
+
+def sembrar(productos: int):
+    database.init_db()
+    with Session(database.get_motor()) as session:
+        for c in range(2):
+            session.add(Categoria(nombre=f"Categoría {c}"))
+        session.flush()
+        for i in range(productos):
+            session.add(Producto(nombre=f"Producto {i}", precio=1.5 + i, cantidad=STOCK_INICIAL, categoria_id=1 + i % 2))
+        session.commit()
+    # Resumen exacto de partida
+    recalcular_resumen(database.get_motor())
+
+
+async def ejecutar(pedidos: int, clientes: int, productos: int, semilla: int) -> int:
+    sembrar(productos)
+    aleatorio = random.Random(semilla)
+    solicitudes = []
+    for numero in range(pedidos):
+        ids = aleatorio.sample(range(1, productos + 1), aleatorio.randint(1, 4))
+        cuerpo = {"lineas": [{"producto_id": i, "cantidad": aleatorio.randint(1, 3)} for i in ids]}
+        # Cada pedido se envía dos veces con la misma clave
+        solicitudes += [(f"pedido-{numero}", cuerpo)] * 2
+    aleatorio.shuffle(solicitudes)
+
+    respuestas = []
+    transporte = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://pedidos", timeout=60) as cliente:
+
+        async def cliente_concurrente():
+            while solicitudes:
+                clave, cuerpo = solicitudes.pop()
+                respuesta = await cliente.post("/pedidos", json=cuerpo, headers={"Idempotency-Key": clave})
+                respuestas.append((clave, respuesta.status_code, respuesta.json()))
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente_concurrente() for _ in range(clientes)))
+        duracion = time.perf_counter() - inicio
+
+    fallos = []
+    estados = {}
+    for _, codigo, _ in respuestas:
+        estados[codigo] = estados.get(codigo, 0) + 1
+    if any(codigo >= 500 for codigo in estados):
+        fallos.append(f"Errores del servidor: {estados}")
+
+    # Todas las respuestas correctas de una misma clave deben ser el mismo pedido
+    por_clave = {}
+    for clave, codigo, cuerpo in respuestas:
+        if codigo == 201:
+            por_clave.setdefault(clave, set()).add(cuerpo["id"])
+    repetidos = [clave for clave, ids in por_clave.items() if len(ids) > 1]
+    if repetidos:
+        fallos.append(f"Claves con más de un pedido: {repetidos[:5]}")
+
+    with Session(database.get_motor()) as session:
+        registrados = session.exec(select(func.count()).select_from(Pedido)).one()
+        if registrados != len(por_clave):
+            fallos.append(f"Pedidos registrados {registrados}, claves aceptadas {len(por_clave)}")
+
+        vendidos = dict(session.exec(
+            select(LineaPedido.producto_id, func.sum(LineaPedido.cantidad)).group_by(LineaPedido.producto_id)
+        ).all())
+        for producto in session.exec(select(Producto)).all():
+            if producto.cantidad < 0:
+                fallos.append(f"Producto {producto.id} con stock negativo: {producto.cantidad}")
+            if STOCK_INICIAL - producto.cantidad != vendidos.get(producto.id, 0):
+                fallos.append(f"Producto {producto.id}: descontado {STOCK_INICIAL - producto.cantidad}, "
+                              f"vendido {vendidos.get(producto.id, 0)}")
+
+        incremental = {r.categoria_id: (r.productos, r.unidades, round(r.valor, 2))
+                       for r in session.exec(select(ResumenCategoria)).all()}
+    recalcular_resumen(database.get_motor())
+    with Session(database.get_motor()) as session:
+        recalculado = {r.categoria_id: (r.productos, r.unidades, round(r.valor, 2))
+                       for r in session.exec(select(ResumenCategoria)).all()}
+    if incremental != recalculado:
+        fallos.append(f"Resumen incremental {incremental} != recalculado {recalculado}")
+
+    print(f"{len(respuestas)} solicitudes ({pedidos} pedidos x 2) con {clientes} clientes en {duracion:.2f} s "
+          f"({len(respuestas) / duracion:.0f} req/s). Códigos: {dict(sorted(estados.items()))}")
+    print(f"{len(por_clave)} pedidos aceptados, {registrados} registrados.")
+    for fallo in fallos:
+        print(f"[MAL] {fallo}")
+    if fallos:
+        return 1
+    print("Sin pedidos duplicados, stock negativo ni diferencias en el resumen.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pedidos", type=int, default=500)
+    parser.add_argument("--clientes", type=int, default=32)
+    parser.add_argument("--productos", type=int, default=20)
+    parser.add_argument("--semilla", type=int, default=7)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(ejecutar(args.pedidos, args.clientes, args.productos, args.semilla)))
@@ -0,0 +1,127 @@
+"""
+Verifica con EXPLAIN QUERY PLAN que las consultas de filtrado de productos,
+las validaciones de nombre único y la versión de las colecciones (ETag) busquen
+por índice (SEARCH), y que los listados ordenados (sort=) lean en orden del índice.
+
+Un recorrido (SCAN), aunque sea de un índice, solo se acepta si la consulta lo
+declara: el listado sin filtros lee el índice en el orden pedido y el LIMIT lo
+corta en la primera página. Ordenar en memoria ('USE TEMP B-TREE FOR ... ORDER
+BY', también 'RIGHT PART OF') solo se acepta donde la consulta lo declara.
+
+Uso: python -m benchmarks.plan_consultas
+Termina con código 1 si algún paso del plan no es una búsqueda por índice ni está permitido.
+"""
+import itertools
+import os
+import re
+import sys
+import tempfile
+from typing import NamedTuple, Optional
+
+# Base temporal para no tocar tienda.db
+_archivo = os.path.join(tempfile.mkdtemp(), "plan.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_archivo}"
+
+from sqlmodel import select  # noqa: E402
+
+import database  # noqa: E402
+from cache_http import consulta_version  # noqa: E402
+from modelos import Categoria, Producto  # noqa: E402
+from facetas import consulta_facetas  # noqa: E402
+from paginacion import LIMITE_POR_DEFECTO, consulta_pagina  # noqa: E402
+
+
+class Revision(NamedTuple):
+    descripcion: str
+    consulta: object
+    # Índice que la consulta puede recorrer entero (SCAN), o None si solo puede buscar
+    recorrido: Optional[str] = None
+    # Motivo por el que se acepta ordenar en memoria, o None si no se acepta
+    orden_en_memoria: Optional[str] = None
+
+
+def consultas_a_revisar():
+    """
+    Genera una Revision por cada combinación de filtros de listar_productos con
+    y sin cursor, los listados ordenados, las facetas, la versión de las colecciones
+    y las búsquedas por nombre de crear_categoria/crear_producto.
+    """
+    for stock_min, precio_max, categoria_id, after in itertools.product([None, 5], [None, 100.0], [None, 1], [None, 10]):
+        consulta = select(Producto).where(Producto.activo == True)
+        if stock_min is not None:
+            consulta = consulta.where(Producto.cantidad >= stock_min)
+        if precio_max is not None:
+            consulta = consulta.where(Producto.precio <= precio_max)
+        if categoria_id is not None:
+            consulta = consulta.where(Producto.categoria_id == categoria_id)
+        if after is not None:
+            consulta = consulta.where(Producto.id > after)
+        consulta = consulta.order_by(Producto.id).limit(LIMITE_POR_DEFECTO + 1)
+        descripcion = f"listar_productos stock_min={stock_min} precio_max={precio_max} categoria_id={categoria_id} after={after}"
+        yield Revision(
+            descripcion, consulta,
+            # Sin categoría: el índice de IDs en orden, cortado por el LIMIT
+            recorrido="ix_producto_vivo_id" if categoria_id is None else None,
+            # Un rango de precio o de stock dentro de la categoría no sale en orden
+            # de ID: se ordenan solo las filas de la categoría que cumplen el filtro
+            orden_en_memoria="rango dentro de la categoría" if categoria_id and (precio_max or stock_min) else None,
+        )
+
+    for sort, categoria_id, after in itertools.product(
+        ["precio", "-precio", "cantidad", "-cantidad", "nombre", "-nombre"], [None, 1], [None, 10]
+    ):
+        consulta = select(Producto).where(Producto.activo == True)
+        if categoria_id is not None:
+            consulta = consulta.where(Producto.categoria_id == categoria_id)
+        consulta = consulta_pagina(consulta, Producto, LIMITE_POR_DEFECTO, after, sort)
+        descripcion = f"listar_productos sort={sort} categoria_id={categoria_id} after={after}"
+        columna = sort.lstrip("-")
+        yield Revision(descripcion, consulta, recorrido=f"ix_producto_vivo_{columna}" if categoria_id is None else None)
+
+    # Las facetas agrupan todos los activos: recorren el índice parcial sin leer la tabla
+    yield Revision("facetas del listado", consulta_facetas(Producto.activo == True), recorrido="ix_producto_vivo_categoria_precio_id")
+    yield Revision("facetas del listado categoria_id=1", consulta_facetas(Producto.activo == True, Producto.categoria_id == 1))
+    yield Revision("versión de productos (ETag)", consulta_version(Producto))
+    yield Revision("versión de categorías (ETag)", consulta_version(Categoria))
+    yield Revision("crear_categoria nombre único", select(Categoria).where(Categoria.nombre == "x"))
+    yield Revision("crear_producto nombre único", select(Producto).where(Producto.nombre == "x"))
+
+
+_RECORRIDO = re.compile(r"^SCAN \w+ USING (COVERING )?INDEX (\w+)$")
+
+
+def problema(paso: str, revision: Revision) -> Optional[str]:
+    """
+    'SCAN' si el paso recorre una tabla o un índice no declarado, 'SORT' si ordena
+    en memoria sin estar declarado, o None si el paso es aceptable.
+    """
+    if paso.startswith("SCAN"):
+        recorrido = _RECORRIDO.match(paso)
+        if recorrido is None or recorrido.group(2) != revision.recorrido:
+            return "SCAN"
+    elif paso.startswith("USE TEMP B-TREE") and "ORDER BY" in paso and revision.orden_en_memoria is None:
+        return "SORT"
+    return None
+
+
+def main() -> int:
+    database.init_db()
+    fallos = 0
+    with database.get_motor().connect() as conexion:
+        for revision in consultas_a_revisar():
+            sql = str(revision.consulta.compile(conexion, compile_kwargs={"literal_binds": True}))
+            plan = [fila[3] for fila in conexion.exec_driver_sql("EXPLAIN QUERY PLAN " + sql)]
+            problemas = [p for p in (problema(paso, revision) for paso in plan) if p]
+            estado = problemas[0] if problemas else "OK "
+            fallos += bool(problemas)
+            print(f"[{estado:4}] {revision.descripcion}: {' | '.join(plan)}")
+
+    if fallos:
+        print(f"{fallos} consulta(s) recorren una tabla o un índice no previsto u ordenan en memoria.")
+        return 1
+    print("Todas las consultas usan índices.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
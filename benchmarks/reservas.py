@@ -0,0 +1,221 @@
+"""
+Venta flash: muchas compras simultáneas de PUT /productos/{id}/comprar sobre
+pocos productos, con el camino actual (un UPDATE y un commit por compra) y con
+las reservas en memoria escritas en lotes (RESERVAS_EN_MEMORIA=true).
+
+Además simula una caída del proceso con compras sin escribir y comprueba que
+al reiniciar se aplican desde el diario: el stock final de la base debe ser
+el inicial menos las compras admitidas en todos los casos.
+
+Una de cada diez compras va por POST /pedidos y otra por POST /compras, que
+descuentan en la base directamente. La última pasada agota el stock: ninguna
+ruta debe vender unidades que las reservas en memoria ya vendieron.
+
+También comprueba que el diario no crece: al terminar las compras solo tiene
+las que aún no se escribieron, y que una segunda instancia no puede abrirlo.
+
+Uso: python -m benchmarks.reservas [--compras 5000] [--clientes 64] [--productos 3]
+Termina con código 1 si el stock de la base no coincide o falla alguna de esas
+comprobaciones.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from sqlmodel import Session, select
+
+import database
+import main
+from config import Settings
+from modelos import Categoria, Producto
+from reservas import MotorReservas, reservas
+
+
+def configuracion(directorio: str, en_memoria: bool, intervalo_ms: int = 50) -> Settings:
+    return Settings(
+        database_url=f"sqlite:///{os.path.join(directorio, 'tienda.db')}",
+        sqlite_wal=True,
+        db_pool_size=16,
+        reservas_en_memoria=en_memoria,
+        reservas_diario=os.path.join(directorio, "reservas.log"),
+        reservas_intervalo_ms=intervalo_ms,
+        cache_backend="ninguna",
+        slow_query_ms=100000,
+    )
+
+
+def crear_app(directorio: str, en_memoria: bool, intervalo_ms: int = 50):
+    return main.create_app(configuracion(directorio, en_memoria, intervalo_ms))
+
+
+def sembrar(productos: int, stock: int):
+    database.init_db()
+    with Session(database.get_motor()) as session:
+        session.add(Categoria(nombre="Ofertas"))
+        session.flush()
+        for i in range(productos):
+            session.add(Producto(nombre=f"Oferta {i}", precio=9.99, cantidad=stock, categoria_id=1))
+        session.commit()
+
+
+def stock_en_base() -> dict:
+    with Session(database.get_motor()) as session:
+        return dict(session.exec(select(Producto.id, Producto.cantidad)).all())
+
+
+async def comprar(app, compras: int, clientes: int, productos: int, semilla: int) -> dict:
+    """
+    Lanza las compras y devuelve las unidades admitidas por producto y el rendimiento.
+    """
+    aleatorio = random.Random(semilla)
+    pendientes = [aleatorio.randint(1, productos) for _ in range(compras)]
+    admitidas = {}
+    estados = {}
+    tiempos = []
+    transporte = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://flash", timeout=60) as cliente:
+
+        async def cliente_concurrente():
+            while pendientes:
+                numero = len(pendientes)
+                id_producto = pendientes.pop()
+                inicio = time.perf_counter()
+                linea = {"producto_id": id_producto, "cantidad": 1}
+                if numero % 10 == 0:
+                    respuesta = await cliente.post("/pedidos", json={"lineas": [linea]})
+                elif numero % 10 == 5:
+                    respuesta = await cliente.post("/compras", json=[linea])
+                else:
+                    respuesta = await cliente.put(f"/productos/{id_producto}/comprar?cantidad=1")
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+                estados[respuesta.status_code] = estados.get(respuesta.status_code, 0) + 1
+                if respuesta.status_code in (200, 201):
+                    admitidas[id_producto] = admitidas.get(id_producto, 0) + 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente_concurrente() for _ in range(clientes)))
+        duracion = time.perf_counter() - inicio
+    tiempos.sort()
+    return {
+        "admitidas": admitidas,
+        "estados": dict(sorted(estados.items())),
+        "req_s": compras / duracion,
+        "p50_ms": tiempos[len(tiempos) // 2],
+        "p99_ms": tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.99))],
+    }
+
+
+def comprobar(nombre: str, inicial: int, admitidas: dict, productos: int) -> bool:
+    stock = stock_en_base()
+    esperado = {i: inicial - admitidas.get(i, 0) for i in range(1, productos + 1)}
+    if stock != esperado:
+        print(f"[MAL] {nombre}: stock en la base {stock}, esperado {esperado}")
+        return False
+    print(f"[OK ] {nombre}: stock en la base {stock}")
+    return True
+
+
+def comprobar_diario(directorio: str) -> bool:
+    """
+    Con compras de una unidad, el diario compactado tiene una línea por unidad pendiente.
+    """
+    with open(os.path.join(directorio, "reservas.log"), encoding="utf-8") as diario:
+        lineas = sum(1 for _ in diario)
+    pendientes = reservas.estadisticas()["unidades_pendientes"]
+    if lineas != pendientes:
+        print(f"[MAL] diario: {lineas} líneas con {pendientes} unidades sin escribir")
+        return False
+    print(f"[OK ] diario: {lineas} líneas, las {pendientes} unidades sin escribir")
+    return True
+
+
+async def comprobar_bloqueo(directorio: str) -> bool:
+    """
+    Otra instancia con el mismo diario (como otro worker) no debe poder arrancar.
+    """
+    otra = MotorReservas()
+    otra.configurar(configuracion(directorio, en_memoria=True))
+    try:
+        await otra.iniciar(database.get_motor_async())
+    except RuntimeError:
+        print("[OK ] una segunda instancia no abre el diario en uso")
+        return True
+    await otra.detener()
+    print("[MAL] una segunda instancia abrió el diario en uso")
+    return False
+
+
+async def ejecutar(args) -> int:
+    correcto = True
+    agotado = args.compras // (4 * args.productos)
+    for nombre, en_memoria, stock in (
+        ("por solicitud", False, args.stock),
+        ("en memoria", True, args.stock),
+        ("agotando", True, agotado),
+    ):
+        directorio = tempfile.mkdtemp()
+        app = crear_app(directorio, en_memoria)
+        sobreventas = reservas.sobreventas
+        async with app.router.lifespan_context(app):
+            sembrar(args.productos, stock)
+            resultado = await comprar(app, args.compras, args.clientes, args.productos, args.semilla)
+            if en_memoria and stock == args.stock:
+                correcto &= comprobar_diario(directorio)
+                correcto &= await comprobar_bloqueo(directorio)
+        print(f"{nombre:14} {resultado['req_s']:8.0f} req/s  p50 {resultado['p50_ms']:7.2f} ms  "
+              f"p99 {resultado['p99_ms']:7.2f} ms  códigos {resultado['estados']}")
+        # Al apagar se escribe lo pendiente: la base ya debe estar al día
+        correcto &= comprobar(nombre, stock, resultado["admitidas"], args.productos)
+        if reservas.sobreventas > sobreventas:
+            print(f"[MAL] {nombre}: {reservas.sobreventas - sobreventas} unidades vendidas de más")
+            correcto = False
+
+    # Caída con compras pendientes: un proceso hijo compra y termina con os._exit,
+    # sin apagar la app, antes de la primera escritura en lote
+    directorio = tempfile.mkdtemp()
+    salida = subprocess.run(
+        [sys.executable, "-m", "benchmarks.reservas", "--caida", directorio, "--productos", str(args.productos),
+         "--stock", str(args.stock), "--semilla", str(args.semilla)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    admitidas = {int(k): v for k, v in json.loads(salida.strip().splitlines()[-1]).items()}
+
+    # Reinicio: la nueva app aplica el diario al arrancar
+    app = crear_app(directorio, en_memoria=True)
+    async with app.router.lifespan_context(app):
+        correcto &= comprobar("reinicio tras caída", args.stock, admitidas, args.productos)
+    return 0 if correcto else 1
+
+
+async def caida(args):
+    """
+    Proceso hijo: compra con la escritura en lote detenida e imprime lo admitido
+    antes de terminar sin apagar la app.
+    """
+    app = crear_app(args.caida, en_memoria=True, intervalo_ms=3_600_000)
+    await app.router.lifespan_context(app).__aenter__()
+    sembrar(args.productos, args.stock)
+    resultado = await comprar(app, 200, 8, args.productos, args.semilla)
+    print(json.dumps(resultado["admitidas"]), flush=True)
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--compras", type=int, default=5000)
+    parser.add_argument("--clientes", type=int, default=64)
+    parser.add_argument("--productos", type=int, default=3)
+    parser.add_argument("--stock", type=int, default=4000, help="Stock inicial de cada producto")
+    parser.add_argument("--semilla", type=int, default=11)
+    parser.add_argument("--caida", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.caida:
+        asyncio.run(caida(args))
+    sys.exit(asyncio.run(ejecutar(args)))
@@ -0,0 +1,91 @@
+"""
+Compara el camino anterior de los listados (objetos del ORM validados uno a uno
+contra ProductRead por el response_model) con el camino rápido (solo columnas,
+filas sin ORM y codificación con orjson) para respuestas de muchas filas.
+
+Uso: python -m benchmarks.serializacion [--filas 10000] [--repeticiones 20]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from typing import List
+
+# Base temporal: se importa database después de fijar la URL
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'serializacion.db')}"
+
+import httpx  # noqa: E402
+from fastapi import Depends, FastAPI  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+from sqlmodel import Session, select  # noqa: E402
+from sqlmodel.ext.asyncio.session import AsyncSession  # noqa: E402
+
+import database  # noqa: E402
+import main  # noqa: F401,E402  (registra todos los modelos)
+from database import get_async_session  # noqa: E402
+from Esquemas import ProductRead  # noqa: E402
+from modelos import Categoria, Producto  # noqa: E402
+from serializacion import consulta_columnas, orjson, respuesta_json  # noqa: E402
+
+app = FastAPI()
+
+
+@app.get("/anterior", response_model=List[ProductRead])
+async def listado_anterior(session: AsyncSession = Depends(get_async_session)):
+    # Réplica del listado antes del cambio
+    productos = (await session.exec(select(Producto).order_by(Producto.id))).all()
+    return [ProductRead.from_orm(p).dict() for p in productos]
+
+
+@app.get("/rapido", response_model=List[ProductRead])
+async def listado_rapido(session: AsyncSession = Depends(get_async_session)):
+    consulta = consulta_columnas(Producto, ProductRead).order_by(Producto.id)
+    return respuesta_json([fila._asdict() for fila in (await session.exec(consulta)).all()])
+
+
+def sembrar(filas: int):
+    database.init_db()
+    with Session(database.get_motor()) as session:
+        session.execute(insert(Categoria), [{"nombre": "General"}])
+        session.execute(insert(Producto), [
+            {"nombre": f"Producto {i}", "descripcion": f"Descripción del producto {i}",
+             "precio": 10 + i % 90, "cantidad": i % 50, "categoria_id": 1}
+            for i in range(filas)
+        ])
+        session.commit()
+
+
+async def medir(ruta: str, repeticiones: int):
+    tiempos = []
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        await cliente.get(ruta)
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            respuesta = await cliente.get(ruta)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+    return respuesta.json(), sorted(tiempos)
+
+
+async def ejecutar(filas: int, repeticiones: int):
+    sembrar(filas)
+    print(f"{filas} filas por respuesta, {repeticiones} repeticiones, orjson {'sí' if orjson else 'no'}")
+    resultados = {}
+    for ruta in ("/anterior", "/rapido"):
+        cuerpo, tiempos = await medir(ruta, repeticiones)
+        resultados[ruta] = (cuerpo, statistics.median(tiempos))
+        print(f"{ruta:10} p50 {statistics.median(tiempos):8.1f} ms  p95 {tiempos[int(len(tiempos) * 0.95) - 1]:8.1f} ms")
+
+    assert resultados["/anterior"][0] == resultados["/rapido"][0], "Las respuestas no coinciden"
+    print(f"Mismo contenido; el camino rápido tarda {resultados['/rapido'][1] / resultados['/anterior'][1]:.0%} "
+          f"del anterior.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=10000)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(ejecutar(args.filas, args.repeticiones))
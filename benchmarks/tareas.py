@@ -0,0 +1,109 @@
+"""
+Latencia de PUT /productos/{id}/comprar mientras el trabajador en segundo plano
+envía alertas de stock bajo a un destino lento (simula un webhook que tarda
+--demora-ms por lote). Cada compra deja un producto distinto bajo el umbral, así
+que el trabajo de alertas crece con las compras; la latencia no debería.
+
+También mide una pasada del mantenimiento de la base (ANALYZE, VACUUM).
+
+Uso: python -m benchmarks.tareas [--compras 2000] [--clientes 16]
+Termina con código 1 si no se avisó exactamente una vez de cada producto.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import insert
+from sqlmodel import Session
+
+import database
+import main
+from config import Settings
+from modelos import Categoria, Producto
+from resumen import UMBRAL_STOCK_BAJO
+from tareas import mantener_base, trabajador
+
+
+class DestinoLento:
+    """
+    Destino de prueba: espera 'demora' segundos por lote y cuenta los avisos.
+    """
+
+    def __init__(self, demora: float):
+        self.demora = demora
+        self.avisados = []
+
+    async def enviar(self, alertas):
+        await asyncio.sleep(self.demora)
+        self.avisados.extend(alerta.producto_id for alerta in alertas)
+
+
+def sembrar(productos: int):
+    database.init_db()
+    with Session(database.get_motor()) as session:
+        session.execute(insert(Categoria), [{"nombre": "General"}])
+        # Una unidad por encima del umbral: la primera compra dispara la alerta
+        session.execute(insert(Producto), [
+            {"nombre": f"Producto {i}", "precio": 10, "cantidad": UMBRAL_STOCK_BAJO + 1, "categoria_id": 1}
+            for i in range(productos)
+        ])
+        session.commit()
+
+
+async def comprar(app, compras: int, clientes: int) -> list:
+    pendientes = list(range(compras, 0, -1))
+    tiempos = []
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+
+        async def cliente_concurrente():
+            while pendientes:
+                id_producto = pendientes.pop()
+                inicio = time.perf_counter()
+                respuesta = await cliente.put(f"/productos/{id_producto}/comprar?cantidad=1")
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+                respuesta.raise_for_status()
+
+        await asyncio.gather(*(cliente_concurrente() for _ in range(clientes)))
+    tiempos.sort()
+    return tiempos
+
+
+async def ejecutar(args) -> int:
+    correcto = True
+    for demora_ms in (0, 20, 200):
+        directorio = tempfile.mkdtemp()
+        app = main.create_app(Settings(
+            database_url=f"sqlite:///{os.path.join(directorio, 'tareas.db')}", sqlite_wal=True, db_pool_size=16,
+            cache_backend="ninguna", slow_query_ms=100000,
+        ))
+        destino = DestinoLento(demora_ms / 1000)
+        async with app.router.lifespan_context(app):
+            trabajador.destinos = [destino]
+            lotes = trabajador.lotes
+            sembrar(args.compras)
+            tiempos = await comprar(app, args.compras, args.clientes)
+        lotes = trabajador.lotes - lotes
+        # Al apagar se procesa lo que quedaba en la cola
+        avisos_ok = sorted(destino.avisados) == list(range(1, args.compras + 1))
+        correcto &= avisos_ok
+        print(f"destino {demora_ms:4} ms/lote  p50 {tiempos[len(tiempos) // 2]:6.2f} ms  "
+              f"p99 {tiempos[int(len(tiempos) * 0.99)]:6.2f} ms  "
+              f"{len(destino.avisados)} alertas en {lotes} lotes  [{'OK ' if avisos_ok else 'MAL'}]")
+
+    inicio = time.perf_counter()
+    mantener_base(database.get_motor())
+    print(f"mantenimiento de la base: {(time.perf_counter() - inicio) * 1000:.1f} ms")
+    return 0 if correcto else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--compras", type=int, default=2000)
+    parser.add_argument("--clientes", type=int, default=16)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(ejecutar(args)))
@@ -0,0 +1,132 @@
+"""
+Rendimiento con varios workers escribiendo y leyendo la misma base SQLite.
+
+Lanza N procesos, cada uno con su propia instancia de la app (como los workers
+de uvicorn/gunicorn), contra una copia del mismo catálogo y con una mezcla de
+lecturas y compras. Compara la configuración anterior (journal por defecto,
+synchronous=FULL) con el modo WAL (SQLITE_WAL=true, synchronous=NORMAL) e
+informa solicitudes por segundo y errores (p. ej. "database is locked").
+
+Uso: python -m benchmarks.workers [--workers 4] [--clientes 8] [--segundos 5] [--compras 0.2]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+# Configuración de cada modo medido
+MODOS = {
+    "anterior": {"SQLITE_WAL": "false", "SQLITE_SYNCHRONOUS": "FULL", "SQLITE_CACHE_KB": "2000"},
+    "wal": {"SQLITE_WAL": "true", "SQLITE_SYNCHRONOUS": "NORMAL", "SQLITE_CACHE_KB": "20000"},
+}
+
+
+def sembrar(url: str, filas: int, categorias: int):
+    from sqlalchemy import insert
+    from sqlmodel import Session
+
+    import database
+    import metricas
+    from config import Settings
+    from modelos import Categoria, Producto
+
+    # La siembra masiva no debe llenar el log de consultas lentas
+    settings = Settings(database_url=url, slow_query_ms=100000)
+    metricas.configurar(settings)
+    database.configurar(settings)
+    database.init_db()
+    with Session(database.get_motor()) as session:
+        session.execute(insert(Categoria), [{"nombre": f"Categoría {i}"} for i in range(1, categorias + 1)])
+        session.execute(insert(Producto), [
+            {"nombre": f"Producto {i}", "precio": 10 + i % 90, "cantidad": 1_000_000,
+             "categoria_id": 1 + i % categorias}
+            for i in range(filas)
+        ])
+        session.commit()
+    # Reconstruye el resumen con los productos insertados
+    database.init_db(forzar=True)
+    database.get_motor().dispose()
+
+
+async def _cargar(app, filas: int, clientes: int, segundos: float, compras: float, semilla: int):
+    import httpx
+
+    conteo = {"solicitudes": 0, "errores": 0}
+    aleatorio = random.Random(semilla)
+    fin = time.perf_counter() + segundos
+    # Con raise_app_exceptions=False un error de la base llega como HTTP 500
+    transporte = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://workers") as cliente:
+
+        async def cliente_concurrente():
+            while time.perf_counter() < fin:
+                id_producto = aleatorio.randint(1, filas)
+                if aleatorio.random() < compras:
+                    metodo, ruta = "PUT", f"/productos/{id_producto}/comprar?cantidad=1"
+                elif aleatorio.random() < 0.5:
+                    metodo, ruta = "GET", f"/productos/{id_producto}"
+                else:
+                    metodo, ruta = "GET", f"/productos?limit=50&after={id_producto}"
+                respuesta = await cliente.request(metodo, ruta)
+                conteo["solicitudes"] += 1
+                if respuesta.status_code >= 500:
+                    conteo["errores"] += 1
+
+        await asyncio.gather(*(cliente_concurrente() for _ in range(clientes)))
+    return conteo
+
+
+def _worker(indice: int, url: str, entorno: dict, args, barrera, resultados):
+    # La configuración se lee del entorno al importar main, como en un worker real
+    os.environ.update(entorno, DATABASE_URL=url, CACHE_BACKEND="ninguna", SLOW_QUERY_MS="100000")
+    import main
+
+    barrera.wait()
+    resultados.put(asyncio.run(_cargar(main.app, args.filas, args.clientes, args.segundos, args.compras, indice)))
+
+
+def medir(modo: str, url: str, args) -> dict:
+    contexto = multiprocessing.get_context("spawn")
+    barrera = contexto.Barrier(args.workers)
+    resultados = contexto.Queue()
+    procesos = [
+        contexto.Process(target=_worker, args=(i, url, MODOS[modo], args, barrera, resultados))
+        for i in range(args.workers)
+    ]
+    for proceso in procesos:
+        proceso.start()
+    totales = [resultados.get() for _ in procesos]
+    for proceso in procesos:
+        proceso.join()
+    solicitudes = sum(t["solicitudes"] for t in totales)
+    return {
+        "solicitudes": solicitudes,
+        "errores": sum(t["errores"] for t in totales),
+        "req_s": round(solicitudes / args.segundos, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--clientes", type=int, default=8, help="Clientes concurrentes por worker")
+    parser.add_argument("--segundos", type=float, default=5)
+    parser.add_argument("--compras", type=float, default=0.2, help="Proporción de compras")
+    parser.add_argument("--filas", type=int, default=10000)
+    parser.add_argument("--categorias", type=int, default=20)
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp()
+    original = os.path.join(directorio, "catalogo.db")
+    sembrar(f"sqlite:///{original}", args.filas, args.categorias)
+    print(f"{args.workers} workers x {args.clientes} clientes, {args.segundos:g} s, {args.compras:.0%} compras")
+    for modo in MODOS:
+        copia = os.path.join(directorio, f"{modo}.db")
+        shutil.copy(original, copia)
+        resultado = medir(modo, f"sqlite:///{copia}", args)
+        print(f"{modo:9} {resultado['req_s']:>8} req/s  {resultado['solicitudes']:>7} solicitudes  "
+              f"{resultado['errores']:>5} errores")
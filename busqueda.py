@@ -0,0 +1,114 @@
+import re
+
+from sqlalchemy import column, desc, func, literal_column, table, text
+from sqlmodel import select
+
+from modelos import Producto
+
+
+# BÚSQUEDA DE TEXTO COMPLETO
+#
+# SQLite: tabla virtual FTS5 'producto_fts' de contenido externo (no duplica el texto),
+# sincronizada con triggers al insertar, borrar o cambiar nombre/descripción.
+# Compras, cambios de precio o desactivaciones no tocan el índice: esos filtros
+# se aplican sobre la tabla producto al unirla con los resultados.
+# PostgreSQL: columna tsvector generada más un índice GIN; la mantiene la propia base.
+
+
+_SQLITE = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS producto_fts USING fts5(
+        nombre, descripcion,
+        content='producto', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS producto_fts_insertar AFTER INSERT ON producto BEGIN
+        INSERT INTO producto_fts(rowid, nombre, descripcion) VALUES (new.id, new.nombre, new.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS producto_fts_borrar AFTER DELETE ON producto BEGIN
+        INSERT INTO producto_fts(producto_fts, rowid, nombre, descripcion)
+        VALUES ('delete', old.id, old.nombre, old.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS producto_fts_actualizar AFTER UPDATE OF nombre, descripcion ON producto BEGIN
+        INSERT INTO producto_fts(producto_fts, rowid, nombre, descripcion)
+        VALUES ('delete', old.id, old.nombre, old.descripcion);
+        INSERT INTO producto_fts(rowid, nombre, descripcion) VALUES (new.id, new.nombre, new.descripcion);
+    END
+    """,
+]
+
+_POSTGRES = [
+    """
+    ALTER TABLE producto ADD COLUMN IF NOT EXISTS busqueda tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('spanish', coalesce(nombre, '') || ' ' || coalesce(descripcion, ''))
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_producto_busqueda ON producto USING GIN (busqueda)",
+]
+
+_producto_fts = table("producto_fts", column("rowid"), column("rank"))
+
+
+def crear_indice_busqueda(motor):
+    """
+    Crea el índice de texto completo según la base de datos.
+    Si la tabla FTS5 es nueva y ya hay productos, la llena con 'rebuild'.
+    """
+    with motor.begin() as conexion:
+        if motor.dialect.name == "sqlite":
+            existia = conexion.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'producto_fts'")
+            ).first()
+            for sentencia in _SQLITE:
+                conexion.execute(text(sentencia))
+            if not existia:
+                conexion.execute(text("INSERT INTO producto_fts(producto_fts) VALUES ('rebuild')"))
+        elif motor.dialect.name == "postgresql":
+            for sentencia in _POSTGRES:
+                conexion.execute(text(sentencia))
+
+
+def _terminos(q: str) -> list:
+    """
+    Separa la búsqueda en palabras, descartando signos que la sintaxis
+    de FTS5 o tsquery interpretaría como operadores.
+    """
+    return re.findall(r"\w+", q.lower())
+
+
+def consulta_busqueda(dialecto: str, q: str):
+    """
+    Devuelve un SELECT de productos que contienen todas las palabras de 'q'
+    (cada una también como prefijo), ordenado por relevancia.
+    Devuelve None si 'q' no tiene palabras buscables.
+    """
+    terminos = _terminos(q)
+    if not terminos:
+        return None
+
+    if dialecto == "postgresql":
+        tsquery = " & ".join(f"{termino}:*" for termino in terminos)
+        consulta_ts = func.to_tsquery("spanish", tsquery)
+        vector = literal_column("producto.busqueda")
+        return (
+            select(Producto)
+            .where(vector.op("@@")(consulta_ts))
+            .order_by(desc(func.ts_rank(vector, consulta_ts)), Producto.id)
+        )
+
+    # Cada palabra entre comillas (literal) y con '*' para coincidir por prefijo
+    expresion = " ".join(f'"{termino}"*' for termino in terminos)
+    return (
+        select(Producto)
+        .join(_producto_fts, _producto_fts.c.rowid == Producto.id)
+        .where(literal_column("producto_fts").op("MATCH")(expresion))
+        # 'rank' es bm25 en FTS5: menor valor = más relevante
+        .order_by(_producto_fts.c.rank, Producto.id)
+    )
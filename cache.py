@@ -0,0 +1,244 @@
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional
+
+from cache_http import avanzar_version
+from modelos import Categoria, Producto
+
+
+# CACHÉ DE LECTURAS
+#
+# Guarda respuestas ya serializadas (dict/list) de las consultas más frecuentes.
+# Las claves individuales se borran al modificar el registro; los listados se
+# agrupan bajo una versión por grupo que se incrementa para invalidarlos todos.
+#
+# La interfaz es asíncrona para que un backend de red (Redis) no bloquee el event
+# loop. Desde código que corre en el threadpool se llama con anyio.from_thread.run.
+
+
+class Cache(ABC):
+    """
+    Interfaz común de los backends de caché con contadores de aciertos y fallos.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+
+    async def obtener(self, clave: str) -> Optional[Any]:
+        valor = await self._leer(clave)
+        if valor is None:
+            self.fallos += 1
+        else:
+            self.aciertos += 1
+        return valor
+
+    async def guardar(self, clave: str, valor: Any):
+        await self._escribir(clave, valor)
+
+    async def borrar(self, *claves: str):
+        if claves:
+            await self._borrar(*claves)
+
+    async def clave_grupo(self, grupo: str, sufijo: str) -> str:
+        """
+        Clave dentro de un grupo versionado, por ejemplo los listados filtrados.
+        """
+        return f"{grupo}:v{await self._version(grupo)}:{sufijo}"
+
+    async def invalidar_grupo(self, *grupos: str):
+        """
+        Invalida todas las claves de los grupos subiendo su versión.
+        Las entradas viejas ya no se leen y caducan solas por TTL o LRU.
+        """
+        for grupo in grupos:
+            await self._incrementar(f"version:{grupo}")
+
+    def estadisticas(self) -> dict:
+        total = self.aciertos + self.fallos
+        return {
+            "backend": type(self).__name__,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": round(self.aciertos / total, 4) if total else 0.0,
+        }
+
+    @abstractmethod
+    async def _version(self, grupo: str) -> int:
+        ...
+
+    @abstractmethod
+    async def _leer(self, clave: str):
+        ...
+
+    @abstractmethod
+    async def _escribir(self, clave: str, valor: Any):
+        ...
+
+    @abstractmethod
+    async def _borrar(self, *claves: str):
+        ...
+
+    @abstractmethod
+    async def _incrementar(self, clave: str):
+        ...
+
+
+class CacheMemoria(Cache):
+    """
+    Caché LRU en el proceso con caducidad por TTL.
+    Cada worker de uvicorn tiene la suya; para varios workers usar CacheRedis.
+    Todas las llamadas ocurren en el event loop, así que no necesita bloqueos.
+    """
+
+    def __init__(self, maximo: int = 10000, ttl: int = 60):
+        super().__init__(ttl)
+        self.maximo = maximo
+        self._datos = OrderedDict()
+        self._versiones = {}
+
+    async def _version(self, grupo: str) -> int:
+        return self._versiones.get(f"version:{grupo}", 0)
+
+    async def _leer(self, clave: str):
+        entrada = self._datos.get(clave)
+        if entrada is None:
+            return None
+        expira, valor = entrada
+        if expira < time.monotonic():
+            del self._datos[clave]
+            return None
+        self._datos.move_to_end(clave)
+        return valor
+
+    async def _escribir(self, clave: str, valor: Any):
+        self._datos[clave] = (time.monotonic() + self.ttl, valor)
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.maximo:
+            self._datos.popitem(last=False)
+
+    async def _borrar(self, *claves: str):
+        for clave in claves:
+            self._datos.pop(clave, None)
+
+    async def _incrementar(self, clave: str):
+        self._versiones[clave] = self._versiones.get(clave, 0) + 1
+
+
+def _a_texto(valor) -> str:
+    # Las fechas se guardan en ISO 8601, el mismo formato que devuelve la API
+    return valor.isoformat() if hasattr(valor, "isoformat") else str(valor)
+
+
+class CacheRedis(Cache):
+    """
+    Caché compartida entre workers sobre cualquier servidor que hable el protocolo Redis.
+    Recibe el cliente asíncrono (redis.asyncio) ya creado, así se puede usar
+    fakeredis.aioredis en pruebas locales.
+    """
+
+    def __init__(self, cliente, ttl: int = 60, prefijo: str = "tienda:"):
+        super().__init__(ttl)
+        self.cliente = cliente
+        self.prefijo = prefijo
+
+    async def _version(self, grupo: str) -> int:
+        return int(await self.cliente.get(f"{self.prefijo}version:{grupo}") or 0)
+
+    async def _leer(self, clave: str):
+        valor = await self.cliente.get(self.prefijo + clave)
+        return None if valor is None else json.loads(valor)
+
+    async def _escribir(self, clave: str, valor: Any):
+        await self.cliente.set(self.prefijo + clave, json.dumps(valor, default=_a_texto), ex=self.ttl)
+
+    async def _borrar(self, *claves: str):
+        # Un solo DEL para todas las claves
+        await self.cliente.delete(*(self.prefijo + clave for clave in claves))
+
+    async def _incrementar(self, clave: str):
+        await self.cliente.incr(self.prefijo + clave)
+
+
+class CacheDesactivada(Cache):
+    """
+    Backend nulo: nunca guarda nada. Útil para comparar rendimiento sin caché.
+    """
+
+    async def _version(self, grupo: str) -> int:
+        return 0
+
+    async def _leer(self, clave: str):
+        return None
+
+    async def _escribir(self, clave: str, valor: Any):
+        pass
+
+    async def _borrar(self, *claves: str):
+        pass
+
+    async def _incrementar(self, clave: str):
+        pass
+
+
+def crear_cache(settings) -> Cache:
+    """
+    Crea el backend indicado en settings.cache_backend: 'memoria' (por defecto), 'redis' o 'ninguna'.
+    """
+    backend = settings.cache_backend.lower()
+    if backend == "redis":
+        # Dependencia opcional: solo se importa si se usa este backend
+        import redis.asyncio
+
+        return CacheRedis(redis.asyncio.Redis.from_url(settings.redis_url), ttl=settings.cache_ttl)
+    if backend == "ninguna":
+        return CacheDesactivada(settings.cache_ttl)
+    return CacheMemoria(maximo=settings.cache_maximo, ttl=settings.cache_ttl)
+
+
+class CacheDelProceso:
+    """
+    Caché compartida por todos los endpoints. Delega en el backend que fija
+    configurar (create_app); hasta entonces, una CacheMemoria con los valores por defecto.
+    """
+
+    def __init__(self):
+        self.backend: Cache = CacheMemoria()
+
+    def configurar(self, settings):
+        self.backend = crear_cache(settings)
+
+    def __getattr__(self, nombre: str):
+        return getattr(self.backend, nombre)
+
+
+# Instancia del proceso, configurada por create_app
+cache = CacheDelProceso()
+
+
+async def invalidar_categoria(id_categoria: int):
+    """
+    Borra lo que depende de una categoría: su entrada, el listado y los
+    productos que muestran su nombre. También cambia el ETag del listado.
+    """
+    await avanzar_version(Categoria)
+    await cache.borrar(f"categoria:{id_categoria}")
+    await cache.invalidar_grupo("categorias", "producto_categoria")
+
+
+async def invalidar_producto(*ids_producto: int):
+    """
+    Borra las entradas de los productos indicados y los listados de productos.
+    Sin IDs solo invalida los listados (por ejemplo al crear productos).
+    También cambia el ETag de los listados.
+    """
+    await avanzar_version(Producto)
+    if ids_producto:
+        # Prefijo del grupo con su versión actual, una sola vez para todos los IDs
+        prefijo = await cache.clave_grupo("producto_categoria", "")
+        claves = [f"producto:{id_producto}" for id_producto in ids_producto]
+        await cache.borrar(*claves, *(prefijo + str(id_producto) for id_producto in ids_producto))
+    await cache.invalidar_grupo("productos")
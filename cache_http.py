@@ -0,0 +1,164 @@
+import hashlib
+import logging
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy import text, update
+from sqlmodel import select
+
+from modelos import Categoria, Producto, VersionColeccion, ahora
+
+log = logging.getLogger("tienda.cache_http")
+
+
+# CACHÉ HTTP (ETag / Last-Modified)
+
+
+# Segundos que el cliente puede reutilizar la respuesta sin preguntar (0 = revalidar siempre).
+# Lo fija create_app desde settings.http_cache_max_age
+MAX_AGE = 0
+
+
+def configurar(settings):
+    global MAX_AGE
+    MAX_AGE = settings.http_cache_max_age
+
+
+def _a_fecha(valor) -> Optional[datetime]:
+    """
+    Normaliza fechas que pueden llegar como datetime o como texto
+    (SQLite devuelve texto en agregados como MAX).
+    """
+    if valor is None:
+        return None
+    if isinstance(valor, str):
+        valor = datetime.fromisoformat(valor)
+    if valor.tzinfo is None:
+        valor = valor.replace(tzinfo=timezone.utc)
+    return valor
+
+
+def calcular_etag(*partes) -> str:
+    """
+    ETag débil a partir de los valores que identifican la versión de la respuesta.
+    """
+    resumen = hashlib.sha1("|".join(str(parte) for parte in partes).encode()).hexdigest()[:20]
+    return f'W/"{resumen}"'
+
+
+def no_modificado(request: Request, response: Response, etag: str, ultima_modificacion=None) -> Optional[Response]:
+    """
+    Agrega ETag, Last-Modified y Cache-Control a la respuesta.
+    Si el cliente ya tiene esa versión devuelve un 304 listo para enviar;
+    si no, devuelve None y el endpoint sigue normalmente.
+    """
+    ultima_modificacion = _a_fecha(ultima_modificacion)
+    cabeceras = {"ETag": etag, "Cache-Control": f"private, max-age={MAX_AGE}, must-revalidate"}
+    if ultima_modificacion is not None:
+        cabeceras["Last-Modified"] = format_datetime(ultima_modificacion.astimezone(timezone.utc), usegmt=True)
+    response.headers.update(cabeceras)
+
+    # If-None-Match tiene prioridad sobre If-Modified-Since (RFC 9110)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etiquetas = {etiqueta.strip() for etiqueta in if_none_match.split(",")}
+        if etag in etiquetas or "*" in etiquetas:
+            return Response(status_code=304, headers=cabeceras)
+        return None
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and ultima_modificacion is not None:
+        try:
+            desde = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return None
+        # Last-Modified tiene resolución de segundos
+        if ultima_modificacion.replace(microsecond=0) <= desde:
+            return Response(status_code=304, headers=cabeceras)
+    return None
+
+
+# VERSIÓN DE LAS COLECCIONES
+#
+# Cada tabla listada con ETag tiene una fila en versioncoleccion con un contador
+# y la hora del último cambio. La incrementa avanzar_version después del commit
+# de la modificación, en una transacción propia de una sola sentencia: así la
+# fila no queda bloqueada durante las transacciones de escritura (con triggers,
+# en PostgreSQL todas las compras esperaban a la anterior y un pedido de varios
+# productos podía bloquearse en ciclo con otra compra).
+#
+# La llaman invalidar_producto e invalidar_categoria (cache.py), que todos los
+# caminos de escritura ya ejecutan después del commit. Como se incrementa cuando
+# los datos ya son visibles, un listado leído entre el commit y el incremento
+# solo se vuelve a pedir una vez de más; nunca queda una versión vieja con datos nuevos.
+
+TABLAS_VERSIONADAS = (Categoria.__tablename__, Producto.__tablename__)
+
+# Triggers de versiones anteriores, que incrementaban la fila dentro de la transacción
+_OBSOLETOS = {
+    "sqlite": [
+        f"DROP TRIGGER IF EXISTS {tabla}_version_{evento}"
+        for tabla in TABLAS_VERSIONADAS
+        for evento in ("insert", "update", "delete")
+    ],
+    "postgresql": [f"DROP TRIGGER IF EXISTS {tabla}_version ON {tabla}" for tabla in TABLAS_VERSIONADAS]
+    + ["DROP FUNCTION IF EXISTS incrementar_version_coleccion()"],
+}
+
+
+def crear_versiones(motor):
+    """
+    Crea la fila de versión de cada tabla listada y borra los triggers obsoletos.
+    """
+    with motor.begin() as conexion:
+        existentes = set(conexion.execute(select(VersionColeccion.tabla)).scalars())
+        for tabla in TABLAS_VERSIONADAS:
+            if tabla not in existentes:
+                conexion.execute(
+                    text("INSERT INTO versioncoleccion (tabla, version) VALUES (:tabla, 0)"), {"tabla": tabla}
+                )
+        for sentencia in _OBSOLETOS.get(motor.dialect.name, []):
+            conexion.execute(text(sentencia))
+
+
+async def avanzar_version(modelo):
+    """
+    Incrementa la versión de la tabla del modelo. Se llama después del commit que la cambió.
+    """
+    # Import diferido: database importa este módulo
+    import database
+
+    try:
+        async with database.get_motor_async().begin() as conexion:
+            await conexion.execute(
+                update(VersionColeccion)
+                .where(VersionColeccion.tabla == modelo.__tablename__)
+                .values(version=VersionColeccion.version + 1, actualizado_en=ahora())
+            )
+    except Exception:
+        # Los datos ya están guardados: sin el incremento el ETag queda viejo hasta el próximo cambio
+        log.exception("No se pudo incrementar la versión de %s", modelo.__tablename__)
+
+
+def consulta_version(modelo):
+    """
+    SELECT de la versión de la tabla del modelo: una búsqueda por clave primaria.
+    """
+    return (
+        select(VersionColeccion.version, VersionColeccion.actualizado_en)
+        .where(VersionColeccion.tabla == modelo.__tablename__)
+    )
+
+
+async def version_coleccion(session, modelo):
+    """
+    Versión de una tabla completa: contador de cambios y hora del último.
+    Cambia con cada alta, baja o modificación y cuesta una fila, sin importar
+    cuántas tenga la tabla.
+    """
+    fila = (await session.exec(consulta_version(modelo))).first()
+    if fila is None:
+        return 0, None
+    return fila.version, _a_fecha(fila.actualizado_en)
@@ -0,0 +1,166 @@
+import asyncio
+import threading
+from collections import deque
+from itertools import islice
+from typing import AsyncIterator, Optional
+
+from serializacion import a_json
+
+
+# FEED DE CAMBIOS DE PRODUCTOS (SSE)
+#
+# Los endpoints que cambian stock, precio o estado publican un delta compacto
+# (id, cantidad, precio, activo) con un número de secuencia. Los deltas quedan
+# en un historial circular y los suscriptores de GET /productos/cambios lo leen
+# desde su última secuencia: publicar no recorre los suscriptores, solo
+# despierta a todos con un único asyncio.Event, y cada suscriptor inactivo es
+# una corrutina en espera, sin hilo ni cola propia.
+#
+# La secuencia es de este proceso: con varios workers cada uno tiene su feed, y
+# tras un reinicio empieza de cero (el cliente recibe 'reinicio' y vuelve a leer).
+
+CAMPOS_DELTA = ("id", "cantidad", "precio", "activo")
+
+
+def _delta(producto) -> dict:
+    """
+    Delta de un producto del ORM o de un dict (como los de las reservas en memoria).
+    """
+    if isinstance(producto, dict):
+        return {campo: producto[campo] for campo in CAMPOS_DELTA}
+    return {campo: getattr(producto, campo) for campo in CAMPOS_DELTA}
+
+
+def evento_sse(datos: bytes, evento: str, id_evento: Optional[int] = None) -> bytes:
+    """
+    Formatea un evento de Server-Sent Events.
+    """
+    cabecera = f"id: {id_evento}\n" if id_evento is not None else ""
+    return f"{cabecera}event: {evento}\n".encode() + b"data: " + datos + b"\n\n"
+
+
+class FeedCambios:
+    """
+    Historial de deltas con secuencia y difusión a los suscriptores del proceso.
+    """
+
+    def __init__(self):
+        self.historial_maximo = 10000
+        self.intervalo_ping = 15.0
+        # (secuencia, delta codificado en JSON); las secuencias son consecutivas
+        self._historial = deque(maxlen=self.historial_maximo)
+        self._secuencia = 0
+        self._nuevo: Optional[asyncio.Event] = None
+        self._bucle: Optional[asyncio.AbstractEventLoop] = None
+        self._hilo: Optional[int] = None
+        self.suscriptores = 0
+        self.publicados = 0
+        self.reinicios = 0
+
+    def configurar(self, settings):
+        self.historial_maximo = settings.cambios_historial
+        self.intervalo_ping = settings.cambios_ping_s
+        self._historial = deque(self._historial, maxlen=self.historial_maximo)
+
+    async def iniciar(self):
+        self._bucle = asyncio.get_running_loop()
+        self._hilo = threading.get_ident()
+        self._nuevo = asyncio.Event()
+
+    async def detener(self):
+        """
+        Cierra las suscripciones abiertas para que el servidor pueda apagarse.
+        """
+        if self._nuevo is None:
+            return
+        nuevo, self._nuevo = self._nuevo, None
+        nuevo.set()
+
+    @property
+    def secuencia(self) -> int:
+        return self._secuencia
+
+    # PUBLICACIÓN
+
+    def publicar(self, *productos):
+        """
+        Publica el estado actual de los productos tras el commit. Se puede llamar
+        desde endpoints síncronos (hilos del threadpool).
+        """
+        if self._nuevo is None:
+            return
+        deltas = [a_json(_delta(producto)) for producto in productos]
+        if threading.get_ident() == self._hilo:
+            self._agregar(deltas)
+        else:
+            self._bucle.call_soon_threadsafe(self._agregar, deltas)
+
+    def _agregar(self, deltas):
+        if self._nuevo is None:
+            return
+        for delta in deltas:
+            self._secuencia += 1
+            self._historial.append((self._secuencia, delta))
+        self.publicados += len(deltas)
+        # Despierta a todos los suscriptores y deja un evento nuevo para la siguiente espera
+        nuevo, self._nuevo = self._nuevo, asyncio.Event()
+        nuevo.set()
+
+    # SUSCRIPCIÓN
+
+    def _pendientes(self, ultima: int):
+        """
+        Deltas posteriores a 'ultima', o None si ya no están en el historial.
+        """
+        if ultima > self._secuencia:
+            return None
+        if not self._historial or ultima == self._secuencia:
+            return []
+        primera = self._historial[0][0]
+        if ultima < primera - 1:
+            return None
+        return list(islice(self._historial, ultima - primera + 1, None))
+
+    async def suscribir(self, desde: Optional[int] = None) -> AsyncIterator[bytes]:
+        """
+        Genera los eventos SSE posteriores a la secuencia 'desde' (por defecto,
+        solo los nuevos). Si esa secuencia ya no está en el historial envía un
+        evento 'reinicio' y sigue desde la actual: el cliente debe volver a leer
+        los productos. Cada 'intervalo_ping' sin cambios envía un comentario para
+        mantener abierta la conexión.
+        """
+        ultima = self._secuencia if desde is None else desde
+        self.suscriptores += 1
+        try:
+            while self._nuevo is not None:
+                # Se toma el evento antes de leer: un delta publicado después despierta la espera
+                nuevo = self._nuevo
+                pendientes = self._pendientes(ultima)
+                if pendientes is None:
+                    self.reinicios += 1
+                    ultima = self._secuencia
+                    yield evento_sse(a_json({"secuencia": ultima}), "reinicio", ultima)
+                    continue
+                if pendientes:
+                    ultima = pendientes[-1][0]
+                    yield b"".join(evento_sse(delta, "producto", secuencia) for secuencia, delta in pendientes)
+                    continue
+                try:
+                    await asyncio.wait_for(nuevo.wait(), self.intervalo_ping)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+        finally:
+            self.suscriptores -= 1
+
+    def estadisticas(self) -> dict:
+        return {
+            "secuencia": self._secuencia,
+            "en_historial": len(self._historial),
+            "suscriptores": self.suscriptores,
+            "publicados": self.publicados,
+            "reinicios": self.reinicios,
+        }
+
+
+# Instancia del proceso, configurada por create_app
+feed = FeedCambios()
@@ -0,0 +1,86 @@
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+
+try:
+    import brotli
+except ImportError:  # Dependencia opcional: sin ella solo se ofrece gzip
+    brotli = None
+
+# RespuestaBrotli reutiliza el manejo de cabeceras y streaming de la respuesta gzip
+# de Starlette redefiniendo apply_compression. No es API pública: si una versión
+# de Starlette lo cambia, se ofrece solo gzip en lugar de enviar respuestas rotas.
+# python -m benchmarks.compresion comprueba las dos codificaciones, con streaming.
+if not hasattr(IdentityResponder, "apply_compression"):
+    brotli = None
+
+
+# COMPRESIÓN DE RESPUESTAS
+#
+# Comprime con Brotli o gzip, según el Accept-Encoding del cliente, las
+# respuestas de al menos COMPRESION_MINIMO bytes, incluidas las de streaming
+# (NDJSON). Las más pequeñas se envían tal cual: comprimirlas no compensa.
+
+
+# Niveles elegidos por velocidad: la respuesta se comprime en cada solicitud
+NIVEL_GZIP = 6
+CALIDAD_BROTLI = 4
+
+
+class RespuestaBrotli(IdentityResponder):
+    """
+    Igual que la respuesta gzip de Starlette, con Brotli.
+    """
+
+    content_encoding = "br"
+
+    def __init__(self, app, minimum_size: int):
+        super().__init__(app, minimum_size)
+        self._compresor = None
+
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if self._compresor is None:
+            self._compresor = brotli.Compressor(quality=CALIDAD_BROTLI)
+        if more_body:
+            # flush() entrega lo comprimido hasta ahora, para no retener el streaming
+            return self._compresor.process(body) + self._compresor.flush()
+        return self._compresor.process(body) + self._compresor.finish()
+
+
+def _codificaciones(accept_encoding: str) -> set:
+    """
+    Codificaciones aceptadas por el cliente, sin las marcadas con q=0.
+    """
+    aceptadas = set()
+    for parte in accept_encoding.lower().split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        if parametros.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if nombre:
+            aceptadas.add(nombre)
+    return aceptadas
+
+
+class MiddlewareCompresion:
+    """
+    Middleware ASGI que comprime las respuestas con Brotli (si está instalado
+    y el cliente lo acepta) o con gzip.
+    """
+
+    def __init__(self, app, minimo: int = 500):
+        self.app = app
+        self.minimo = minimo
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        aceptadas = _codificaciones(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and "br" in aceptadas:
+            respuesta = RespuestaBrotli(self.app, self.minimo)
+        elif "gzip" in aceptadas:
+            respuesta = GZipResponder(self.app, self.minimo, compresslevel=NIVEL_GZIP)
+        else:
+            # Sin comprimir, pero con 'Vary: Accept-Encoding' para las cachés intermedias
+            respuesta = IdentityResponder(self.app, self.minimo)
+        await respuesta(scope, receive, send)
@@ -0,0 +1,159 @@
+import os
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+
+
+# CONFIGURACIÓN DE LA APLICACIÓN
+
+
+# Carga las variables del archivo .env sin pisar las ya definidas en el entorno,
+# al importar el módulo: así Settings.from_env() las ve aunque se llame antes de create_app.
+load_dotenv()
+
+
+def _bool(valor: str) -> bool:
+    return valor.lower() in ("1", "true", "si", "yes")
+
+
+@dataclass
+class Settings:
+    """
+    Configuración de la conexión y del arranque que recibe create_app.
+    Se arma desde el entorno con Settings.from_env() o a mano, por ejemplo
+    Settings(database_url="sqlite://") para probar contra SQLite en memoria.
+    """
+    database_url: str = "sqlite:///./tienda.db"
+    # Si no se indica se deriva de database_url (aiosqlite / asyncpg)
+    async_database_url: Optional[str] = None
+    # Réplica de solo lectura para los listados y consultas; sin ella todo va al primario
+    read_database_url: Optional[str] = None
+    async_read_database_url: Optional[str] = None
+    db_echo: bool = False
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_pre_ping: bool = True
+    db_pool_recycle: int = 1800
+    # SQLite: modo WAL (lecturas en paralelo con una escritura, para varios workers)
+    # y espera ante bloqueos en lugar de fallar con "database is locked"
+    sqlite_wal: bool = False
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_cache_kb: int = 20000
+    # Caché de lecturas (cache.py): 'memoria', 'redis' o 'ninguna', segundos de vida y
+    # entradas de la caché en memoria
+    cache_backend: str = "memoria"
+    cache_ttl: int = 60
+    cache_maximo: int = 10000
+    redis_url: str = "redis://localhost:6379/0"
+    # Segundos que el cliente puede reutilizar una respuesta GET sin revalidarla (cache_http.py)
+    http_cache_max_age: int = 0
+    # Consultas registradas como lentas a partir de estos milisegundos (metricas.py)
+    slow_query_ms: float = 200.0
+    # Unidades o menos con las que un producto cuenta como stock bajo (resumen.py)
+    stock_bajo: int = 5
+    # Respuestas de al menos estos bytes se comprimen (Brotli o gzip); 0 desactiva
+    compresion_minimo: int = 500
+    # Límites de las cubetas del histograma de precios (facetas.py), crecientes
+    facetas_limites_precio: Tuple[float, ...] = (10.0, 25.0, 50.0, 100.0, 250.0, 500.0, 1000.0)
+    # Procesos del servidor (WEB_CONCURRENCY, la variable de uvicorn y gunicorn)
+    workers: int = 1
+    # Compras contra contadores en memoria escritos en lotes (reservas.py); un solo worker
+    reservas_en_memoria: bool = False
+    reservas_intervalo_ms: int = 50
+    reservas_diario: str = "reservas.log"
+    # Trabajador en segundo plano (tareas.py): cola de eventos, lote y mantenimiento (0 desactiva)
+    tareas_cola_maxima: int = 10000
+    tareas_lote: int = 500
+    mantenimiento_intervalo_s: float = 3600.0
+    alertas_webhook_url: Optional[str] = None
+    # Feed de cambios (cambios.py): deltas guardados para reanudar y segundos entre pings
+    cambios_historial: int = 10000
+    cambios_ping_s: float = 15.0
+    # Control de admisión (admision.py): solicitudes simultáneas por clase (compras,
+    # escrituras, lecturas y exportaciones, que ocupan su lugar toda la descarga) y
+    # solicitudes por segundo de cada cliente (0 sin límite); ráfaga en segundos de tasa
+    admision_activa: bool = False
+    admision_concurrencia_compras: int = 4
+    admision_concurrencia_escrituras: int = 3
+    admision_concurrencia_lecturas: int = 8
+    admision_concurrencia_exportaciones: int = 2
+    admision_tasa_compras: float = 5.0
+    admision_tasa_escrituras: float = 5.0
+    admision_tasa_lecturas: float = 50.0
+    admision_tasa_exportaciones: float = 0.2
+    admision_rafaga_s: float = 2.0
+    admision_cabecera_cliente: Optional[str] = None
+    # Archivo (archivo.py): días inactivo para mover una fila a las tablas de archivo
+    # en cada mantenimiento (0 solo a pedido, con POST /archivo) y filas por transacción
+    archivo_dias: float = 0.0
+    archivo_lote: int = 1000
+    # Crear o migrar el esquema al arrancar (solo si cambió su versión)
+    db_create_schema: bool = True
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """
+        Lee la configuración de las variables de entorno (y del .env).
+        """
+        return cls(
+            database_url=os.getenv("DATABASE_URL", cls.database_url),
+            async_database_url=os.getenv("ASYNC_DATABASE_URL") or None,
+            read_database_url=os.getenv("READ_DATABASE_URL") or None,
+            async_read_database_url=os.getenv("ASYNC_READ_DATABASE_URL") or None,
+            db_echo=_bool(os.getenv("DB_ECHO", "false")),
+            db_pool_size=int(os.getenv("DB_POOL_SIZE", str(cls.db_pool_size))),
+            db_max_overflow=int(os.getenv("DB_MAX_OVERFLOW", str(cls.db_max_overflow))),
+            db_pool_pre_ping=_bool(os.getenv("DB_POOL_PRE_PING", "true")),
+            db_pool_recycle=int(os.getenv("DB_POOL_RECYCLE", str(cls.db_pool_recycle))),
+            sqlite_wal=_bool(os.getenv("SQLITE_WAL", "false")),
+            sqlite_busy_timeout_ms=int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", str(cls.sqlite_busy_timeout_ms))),
+            sqlite_synchronous=os.getenv("SQLITE_SYNCHRONOUS", cls.sqlite_synchronous).upper(),
+            sqlite_cache_kb=int(os.getenv("SQLITE_CACHE_KB", str(cls.sqlite_cache_kb))),
+            cache_backend=os.getenv("CACHE_BACKEND", cls.cache_backend).lower(),
+            cache_ttl=int(os.getenv("CACHE_TTL", str(cls.cache_ttl))),
+            cache_maximo=int(os.getenv("CACHE_MAXIMO", str(cls.cache_maximo))),
+            redis_url=os.getenv("REDIS_URL") or cls.redis_url,
+            http_cache_max_age=int(os.getenv("HTTP_CACHE_MAX_AGE", str(cls.http_cache_max_age))),
+            slow_query_ms=float(os.getenv("SLOW_QUERY_MS", str(cls.slow_query_ms))),
+            stock_bajo=int(os.getenv("STOCK_BAJO", str(cls.stock_bajo))),
+            compresion_minimo=int(os.getenv("COMPRESION_MINIMO", str(cls.compresion_minimo))),
+            facetas_limites_precio=tuple(
+                float(limite) for limite in os.getenv("FACETAS_LIMITES_PRECIO", "").split(",") if limite.strip()
+            ) or cls.facetas_limites_precio,
+            workers=int(os.getenv("WEB_CONCURRENCY", str(cls.workers))),
+            reservas_en_memoria=_bool(os.getenv("RESERVAS_EN_MEMORIA", "false")),
+            reservas_intervalo_ms=int(os.getenv("RESERVAS_INTERVALO_MS", str(cls.reservas_intervalo_ms))),
+            reservas_diario=os.getenv("RESERVAS_DIARIO", cls.reservas_diario),
+            tareas_cola_maxima=int(os.getenv("TAREAS_COLA_MAXIMA", str(cls.tareas_cola_maxima))),
+            tareas_lote=int(os.getenv("TAREAS_LOTE", str(cls.tareas_lote))),
+            mantenimiento_intervalo_s=float(os.getenv("MANTENIMIENTO_INTERVALO_S", str(cls.mantenimiento_intervalo_s))),
+            alertas_webhook_url=os.getenv("ALERTAS_WEBHOOK_URL") or None,
+            cambios_historial=int(os.getenv("CAMBIOS_HISTORIAL", str(cls.cambios_historial))),
+            cambios_ping_s=float(os.getenv("CAMBIOS_PING_S", str(cls.cambios_ping_s))),
+            admision_activa=_bool(os.getenv("ADMISION_ACTIVA", "false")),
+            admision_concurrencia_compras=int(
+                os.getenv("ADMISION_CONCURRENCIA_COMPRAS", str(cls.admision_concurrencia_compras))
+            ),
+            admision_concurrencia_escrituras=int(
+                os.getenv("ADMISION_CONCURRENCIA_ESCRITURAS", str(cls.admision_concurrencia_escrituras))
+            ),
+            admision_concurrencia_lecturas=int(
+                os.getenv("ADMISION_CONCURRENCIA_LECTURAS", str(cls.admision_concurrencia_lecturas))
+            ),
+            admision_concurrencia_exportaciones=int(
+                os.getenv("ADMISION_CONCURRENCIA_EXPORTACIONES", str(cls.admision_concurrencia_exportaciones))
+            ),
+            admision_tasa_compras=float(os.getenv("ADMISION_TASA_COMPRAS", str(cls.admision_tasa_compras))),
+            admision_tasa_escrituras=float(os.getenv("ADMISION_TASA_ESCRITURAS", str(cls.admision_tasa_escrituras))),
+            admision_tasa_lecturas=float(os.getenv("ADMISION_TASA_LECTURAS", str(cls.admision_tasa_lecturas))),
+            admision_tasa_exportaciones=float(
+                os.getenv("ADMISION_TASA_EXPORTACIONES", str(cls.admision_tasa_exportaciones))
+            ),
+            admision_rafaga_s=float(os.getenv("ADMISION_RAFAGA_S", str(cls.admision_rafaga_s))),
+            admision_cabecera_cliente=os.getenv("ADMISION_CABECERA_CLIENTE") or None,
+            archivo_dias=float(os.getenv("ARCHIVO_DIAS", str(cls.archivo_dias))),
+            archivo_lote=int(os.getenv("ARCHIVO_LOTE", str(cls.archivo_lote))),
+            db_create_schema=_bool(os.getenv("DB_CREATE_SCHEMA", "true")),
+        )
@@ -1,28 +1,341 @@
 from sqlmodel import SQLModel, create_engine, Session
-import os
-from dotenv import load_dotenv
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import MetaData, event, inspect, text
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.pool import StaticPool
+import hashlib
+import uuid
+from typing import Optional
+from config import Settings
+from busqueda import crear_indice_busqueda
+from cache_http import crear_versiones
+from metricas import instrumentar_motor
+from modelos import Categoria, CategoriaArchivada, Producto, ProductoArchivado, VersionEsquema
+import resumen
+from resumen import recalcular_resumen
 
 
 # CONFIGURACIÓN DE CONEXIÓN A LA BASE DE DATOS
+#
+# Los motores no se crean al importar el módulo sino la primera vez que se piden
+# (get_motor / get_motor_async), con la configuración fijada por configurar().
 
 
-# Carga las variables de entorno desde el archivo .env
-load_dotenv()
+# Se incrementa al cambiar objetos que no están en los modelos
+# (índice de búsqueda, triggers de búsqueda y de versión, cálculo del resumen,
+# opciones de las tablas)
+REVISION_ESQUEMA = 3
 
-# Obtiene la URL de la base de datos desde las variables de entorno (.env)
-# Si no se encuentra, utiliza por defecto una base SQLite local.
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./tienda.db")
+_settings: Optional[Settings] = None
+_url: Optional[str] = None
+_motor = None
+_motor_async = None
+_motor_lectura = None
+_motor_lectura_async = None
 
-# Crea el motor (engine) de conexión a la base de datos
-# 'echo=True' permite mostrar las consultas SQL ejecutadas en consola (modo depuración)
-motor = create_engine(DATABASE_URL, echo=True)
+# Índices que los modelos ya no declaran; init_db los borra al migrar.
+# Los (activo, ...) completos se reemplazaron por índices parciales de las filas activas
+INDICES_OBSOLETOS = (
+    "ix_producto_activo_categoria_precio",
+    "ix_producto_activo_precio",
+    "ix_producto_activo_cantidad",
+    "ix_producto_activo_nombre",
+    # Reemplazado por ix_producto_vivo_categoria_precio_id: sin el id, sort=precio
+    # con categoría ordenaba en memoria los empates de precio
+    "ix_producto_vivo_categoria_precio",
+)
 
+# Valores admitidos por PRAGMA synchronous
+MODOS_SYNCHRONOUS = ("OFF", "NORMAL", "FULL", "EXTRA")
 
-def init_db():
+
+def configurar(settings: Settings):
+    """
+    Fija la configuración de conexión. Los motores se crean al usarse por primera vez.
+    """
+    global _settings, _url, _motor, _motor_async, _motor_lectura, _motor_lectura_async
+    if settings.sqlite_synchronous not in MODOS_SYNCHRONOUS:
+        raise ValueError(f"SQLITE_SYNCHRONOUS debe ser uno de {', '.join(MODOS_SYNCHRONOUS)}")
+    _settings = settings
+    _url = _url_memoria_compartida(settings.database_url)
+    _motor = None
+    _motor_async = None
+    _motor_lectura = None
+    _motor_lectura_async = None
+
+
+def _config() -> Settings:
+    if _settings is None:
+        configurar(Settings.from_env())
+    return _settings
+
+
+def _url_memoria_compartida(url: str) -> str:
+    """
+    'sqlite://' abre una base en memoria distinta por conexión, y el motor síncrono
+    y el asíncrono no verían las mismas tablas. Se traduce a una base en memoria
+    compartida con nombre, que vive mientras alguna conexión siga abierta.
+    """
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        return f"sqlite:///file:tienda_{uuid.uuid4().hex}?mode=memory&cache=shared&uri=true"
+    return url
+
+
+def _es_memoria(url: str) -> bool:
+    return url.startswith("sqlite") and (":memory:" in url or "mode=memory" in url or url.rstrip("/").endswith(":"))
+
+
+def _opciones_pool(url: str) -> dict:
+    """
+    Parámetros del pool de conexiones según la configuración.
+    SQLite en memoria usa una única conexión compartida entre hilos, que además
+    mantiene viva la base mientras exista el motor.
+    """
+    if _es_memoria(url):
+        return {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+    settings = _config()
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle,
+    }
+
+
+def _url_async(url: str) -> str:
+    """
+    Traduce la URL síncrona al driver asíncrono equivalente:
+    aiosqlite para SQLite y asyncpg para PostgreSQL.
+    """
+    esquema, _, resto = url.partition("://")
+    if esquema.startswith("sqlite"):
+        return f"sqlite+aiosqlite://{resto}"
+    if esquema.startswith("postgres"):
+        return f"postgresql+asyncpg://{resto}"
+    return url
+
+
+def _pragmas_sqlite(motor, url: str):
+    """
+    Ajusta cada conexión SQLite nueva al abrirse:
+    - journal_mode=WAL: los lectores no esperan al escritor ni al revés, y varios
+      workers comparten el archivo (se guarda en la base; no aplica en memoria),
+    - busy_timeout: espera a que se libere el bloqueo en lugar de fallar enseguida,
+    - synchronous=NORMAL: con WAL es seguro ante caídas del proceso y evita un fsync por commit,
+    - cache_size: páginas en memoria por conexión, en KB.
+    """
+    settings = _config()
+    wal = settings.sqlite_wal and not _es_memoria(url)
+
+    def _al_conectar(conexion_dbapi, registro):
+        cursor = conexion_dbapi.cursor()
+        if wal:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+        cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+        cursor.execute(f"PRAGMA cache_size=-{int(settings.sqlite_cache_kb)}")
+        cursor.close()
+
+    event.listen(motor, "connect", _al_conectar)
+
+
+def _crear_motor(url: str):
+    settings = _config()
+    # 'db_echo' muestra cada consulta SQL en consola: solo para depuración
+    motor = create_engine(url, echo=settings.db_echo, **_opciones_pool(url))
+    if motor.dialect.name == "sqlite":
+        _pragmas_sqlite(motor, url)
+    instrumentar_motor(motor)
+    return motor
+
+
+def _crear_motor_async(url: str):
+    settings = _config()
+    motor = create_async_engine(url, echo=settings.db_echo, **_opciones_pool(url))
+    if motor.dialect.name == "sqlite":
+        _pragmas_sqlite(motor.sync_engine, url)
+    instrumentar_motor(motor.sync_engine)
+    return motor
+
+
+def get_motor():
+    """
+    Devuelve el motor síncrono, creándolo si todavía no existe.
+    """
+    global _motor
+    if _motor is None:
+        _config()
+        _motor = _crear_motor(_url)
+    return _motor
+
+
+def get_motor_async():
+    """
+    Devuelve el motor asíncrono, creándolo si todavía no existe.
+    """
+    global _motor_async
+    if _motor_async is None:
+        settings = _config()
+        _motor_async = _crear_motor_async(settings.async_database_url or _url_async(_url))
+    return _motor_async
+
+
+def get_motor_lectura():
+    """
+    Motor síncrono para consultas de solo lectura: la réplica si está configurada,
+    si no el primario.
+    """
+    global _motor_lectura
+    url = _config().read_database_url
+    if not url:
+        return get_motor()
+    if _motor_lectura is None:
+        _motor_lectura = _crear_motor(url)
+    return _motor_lectura
+
+
+def get_motor_lectura_async():
+    """
+    Motor asíncrono para consultas de solo lectura: la réplica si está configurada,
+    si no el primario.
+    """
+    global _motor_lectura_async
+    settings = _config()
+    if not settings.read_database_url and not settings.async_read_database_url:
+        return get_motor_async()
+    if _motor_lectura_async is None:
+        url = settings.async_read_database_url or _url_async(settings.read_database_url)
+        _motor_lectura_async = _crear_motor_async(url)
+    return _motor_lectura_async
+
+
+async def cerrar():
     """
-    Crea las tablas definidas en los modelos.
+    Cierra las conexiones de los motores creados (al apagar la app).
+    """
+    global _motor, _motor_async, _motor_lectura, _motor_lectura_async
+    for motor in (_motor_async, _motor_lectura_async):
+        if motor is not None:
+            await motor.dispose()
+    for motor in (_motor, _motor_lectura):
+        if motor is not None:
+            motor.dispose()
+    _motor = None
+    _motor_async = None
+    _motor_lectura = None
+    _motor_lectura_async = None
+
+
+# VERSIÓN Y CREACIÓN DEL ESQUEMA
+
+
+def version_esquema() -> str:
     """
+    Huella de las tablas, columnas e índices de los modelos, más la revisión de
+    los objetos creados a mano y el umbral de stock bajo del resumen.
+    Cambia sola al modificar un modelo.
+    """
+    partes = [str(REVISION_ESQUEMA), str(resumen.UMBRAL_STOCK_BAJO)]
+    for tabla in SQLModel.metadata.sorted_tables:
+        partes.append(tabla.name)
+        partes += [f"{columna.name}:{columna.type}:{columna.nullable}" for columna in tabla.columns]
+        partes += sorted(f"{indice.name}:{[c.name for c in indice.columns]}" for indice in tabla.indexes)
+    return hashlib.sha1("|".join(partes).encode()).hexdigest()[:16]
+
+
+def _version_guardada(motor) -> Optional[str]:
+    if not inspect(motor).has_table(VersionEsquema.__tablename__):
+        return None
+    with Session(motor) as session:
+        fila = session.get(VersionEsquema, 1)
+        return fila.version if fila else None
+
+
+def init_db(forzar: bool = False) -> bool:
+    """
+    Crea las tablas definidas en los modelos, sus índices, el índice de búsqueda
+    y recalcula el resumen de inventario.
+    Si la versión guardada coincide con la de los modelos no hace nada, así
+    arrancar cuesta una o dos consultas. Devuelve True si creó o migró el esquema.
+    """
+    motor = get_motor()
+    version = version_esquema()
+    if not forzar and _version_guardada(motor) == version:
+        return False
+
     SQLModel.metadata.create_all(motor)
+    _agregar_columnas_faltantes(motor)
+    _activar_autoincremento(motor)
+    # create_all no agrega índices nuevos a tablas que ya existían ni borra los viejos
+    for tabla in SQLModel.metadata.sorted_tables:
+        for indice in tabla.indexes:
+            indice.create(motor, checkfirst=True)
+    with motor.begin() as conexion:
+        for nombre in INDICES_OBSOLETOS:
+            conexion.execute(text(f"DROP INDEX IF EXISTS {nombre}"))
+    crear_indice_busqueda(motor)
+    crear_versiones(motor)
+    recalcular_resumen(motor)
+
+    with Session(motor) as session:
+        session.merge(VersionEsquema(id=1, version=version))
+        session.commit()
+    return True
+
+
+def _agregar_columnas_faltantes(motor):
+    """
+    Agrega a las tablas existentes las columnas nuevas de los modelos.
+    create_all solo crea tablas que no existen, no modifica las que ya están.
+    Las columnas se agregan como opcionales para no fallar con filas antiguas.
+    """
+    inspector = inspect(motor)
+    with motor.begin() as conexion:
+        for tabla in SQLModel.metadata.sorted_tables:
+            existentes = {columna["name"] for columna in inspector.get_columns(tabla.name)}
+            for columna in tabla.columns:
+                if columna.name not in existentes:
+                    tipo = columna.type.compile(dialect=motor.dialect)
+                    conexion.execute(text(f"ALTER TABLE {tabla.name} ADD COLUMN {columna.name} {tipo}"))
+
+
+def _activar_autoincremento(motor):
+    """
+    Reconstruye con AUTOINCREMENT las tablas de SQLite creadas sin él, para que
+    los IDs de las filas archivadas no se reutilicen. Copia las filas con sus IDs
+    y fija la secuencia por encima del mayor ID vivo o archivado. Los índices y
+    los triggers de búsqueda se borran con la tabla vieja: init_db los vuelve a crear.
+    """
+    if motor.dialect.name != "sqlite":
+        return
+    with motor.begin() as conexion:
+        for modelo, archivo in ((Categoria, CategoriaArchivada), (Producto, ProductoArchivado)):
+            tabla = modelo.__table__
+            sql = conexion.execute(
+                text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :nombre"), {"nombre": tabla.name}
+            ).scalar()
+            if "AUTOINCREMENT" in sql.upper():
+                continue
+            # Copia de las tablas para que la clave foránea de la nueva encuentre su destino
+            copia = MetaData()
+            for otra in SQLModel.metadata.sorted_tables:
+                otra.to_metadata(copia)
+            nueva = tabla.to_metadata(copia, name=f"{tabla.name}_nueva")
+            columnas = ", ".join(columna.name for columna in tabla.columns)
+            conexion.execute(CreateTable(nueva))
+            conexion.execute(text(f"INSERT INTO {nueva.name} ({columnas}) SELECT {columnas} FROM {tabla.name}"))
+            conexion.execute(text(f"DROP TABLE {tabla.name}"))
+            conexion.execute(text(f"ALTER TABLE {nueva.name} RENAME TO {tabla.name}"))
+            conexion.execute(text("DELETE FROM sqlite_sequence WHERE name = :nombre"), {"nombre": tabla.name})
+            conexion.execute(text(
+                f"INSERT INTO sqlite_sequence (name, seq) SELECT :nombre, MAX("
+                f"(SELECT COALESCE(MAX(id), 0) FROM {tabla.name}), "
+                f"(SELECT COALESCE(MAX(id), 0) FROM {archivo.__tablename__}))"
+            ), {"nombre": tabla.name})
+
+
+# SESIONES
 
 
 def get_session():
@@ -30,7 +343,23 @@ def get_session():
     Devuelve una sesión activa con la base de datos.
     Se usa como dependencia en los endpoints.
     """
-    with Session(motor) as session:
+    with Session(get_motor()) as session:
+        yield session
+
+
+async def get_async_session():
+    """
+    Devuelve una sesión asíncrona para los endpoints 'async def'.
+    expire_on_commit=False evita recargas implícitas al leer el objeto tras el commit.
+    """
+    async with AsyncSession(get_motor_async(), expire_on_commit=False) as session:
         yield session
 
 
+async def get_async_session_lectura():
+    """
+    Sesión asíncrona para los endpoints que solo leen (listar_*, obtener_*...).
+    Usa la réplica de lectura si está configurada; las escrituras van siempre al primario.
+    """
+    async with AsyncSession(get_motor_lectura_async(), expire_on_commit=False) as session:
+        yield session
@@ -0,0 +1,71 @@
+from sqlalchemy import case, func, select
+
+from Esquemas import CategoryFacet, PriceBucket, ProductFacets
+from modelos import Producto
+
+
+# FACETAS DEL LISTADO DE PRODUCTOS
+#
+# Con facets=true el listado devuelve, además de la página, cuántos productos
+# cumplen los filtros en cada categoría y en cada rango de precio. Ambos salen
+# de una sola consulta agrupada por (categoría, cubeta de precio), que recorre
+# el índice parcial (categoria_id, precio) sin leer la tabla; las filas son
+# como mucho categorías x cubetas y se suman en Python.
+
+
+# Límites de las cubetas de precio: [0, 10), [10, 25), ... [1000, sin límite).
+# Los fija create_app desde settings.facetas_limites_precio
+LIMITES_PRECIO = (10.0, 25.0, 50.0, 100.0, 250.0, 500.0, 1000.0)
+
+
+def configurar(settings):
+    """
+    Fija los límites de las cubetas de precio; deben ser positivos y crecientes.
+    """
+    global LIMITES_PRECIO
+    limites = tuple(float(limite) for limite in settings.facetas_limites_precio)
+    if not limites or limites[0] <= 0 or any(a >= b for a, b in zip(limites, limites[1:])):
+        raise ValueError("FACETAS_LIMITES_PRECIO debe ser una lista de precios positivos y crecientes")
+    LIMITES_PRECIO = limites
+
+
+def _cubeta_precio():
+    """
+    Índice de la cubeta de precio de cada producto (0 para el primer rango).
+    """
+    return case(
+        *((Producto.precio < limite, numero) for numero, limite in enumerate(LIMITES_PRECIO)),
+        else_=len(LIMITES_PRECIO),
+    )
+
+
+def consulta_facetas(*condiciones):
+    """
+    Cuenta los productos que cumplen 'condiciones' por categoría y cubeta de precio.
+    """
+    cubeta = _cubeta_precio().label("cubeta")
+    return (
+        select(Producto.categoria_id, cubeta, func.count().label("productos"))
+        .where(*condiciones)
+        .group_by(Producto.categoria_id, cubeta)
+    )
+
+
+def facetas_de_filas(filas) -> ProductFacets:
+    """
+    Suma las filas (categoria_id, cubeta, productos) en conteos por categoría y por cubeta.
+    Las cubetas vacías también se devuelven, para que el histograma tenga siempre la misma forma.
+    """
+    por_categoria = {}
+    por_cubeta = [0] * (len(LIMITES_PRECIO) + 1)
+    for categoria_id, cubeta, productos in filas:
+        por_categoria[categoria_id] = por_categoria.get(categoria_id, 0) + productos
+        por_cubeta[cubeta] += productos
+
+    desde = (0.0,) + LIMITES_PRECIO
+    hasta = LIMITES_PRECIO + (None,)
+    return ProductFacets(
+        total=sum(por_cubeta),
+        categorias=[CategoryFacet(categoria_id=id_categoria, productos=n) for id_categoria, n in sorted(por_categoria.items())],
+        precios=[PriceBucket(desde=d, hasta=h, productos=n) for d, h, n in zip(desde, hasta, por_cubeta)],
+    )
@@ -0,0 +1,99 @@
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import update
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from modelos import Producto
+from resumen import actualizar_resumen, actualizar_resumen_async, estado
+
+
+# OPERACIONES DE STOCK
+
+
+def _consulta_descuento(id_producto: int, cantidad: int):
+    """
+    UPDATE condicional que resta 'cantidad' del stock y devuelve la fila actualizada.
+    La condición 'cantidad >= :n' la evalúa la base de datos, así dos compras
+    simultáneas no pueden dejar el stock en negativo. Los productos inactivos
+    (borrados) no se venden.
+    """
+    return (
+        update(Producto)
+        .where(Producto.id == id_producto, Producto.activo == True, Producto.cantidad >= cantidad)
+        .values(cantidad=Producto.cantidad - cantidad)
+        .returning(Producto)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def descontar_stock(session: Session, id_producto: int, cantidad: int) -> Optional[Producto]:
+    """
+    Resta 'cantidad' del stock en un solo UPDATE condicional.
+    Devuelve el producto actualizado, o None si no existe o no alcanza el stock.
+    También descuenta las unidades del resumen de su categoría.
+    No hace commit: lo decide quien llama.
+    """
+    producto = session.execute(_consulta_descuento(id_producto, cantidad)).scalars().first()
+    if producto:
+        actualizar_resumen(session, _cambio_compra(producto, cantidad))
+    return producto
+
+
+async def descontar_stock_async(session: AsyncSession, id_producto: int, cantidad: int) -> Optional[Producto]:
+    """
+    Igual que descontar_stock, para sesiones asíncronas.
+    """
+    producto = (await session.execute(_consulta_descuento(id_producto, cantidad))).scalars().first()
+    if producto:
+        await actualizar_resumen_async(session, _cambio_compra(producto, cantidad))
+    return producto
+
+
+async def descontar_stock_lote_async(
+    session: AsyncSession, cantidades: Dict[int, int]
+) -> Tuple[List[Producto], Optional[int]]:
+    """
+    Resta el stock de varios productos ({producto_id: cantidad}) en la misma transacción.
+    Bloquea primero los productos en orden de ID y después las filas del resumen
+    en orden de categoría: dos compras simultáneas toman los bloqueos en el mismo
+    orden y no pueden quedar esperándose entre sí.
+    Devuelve (productos, None), o ([], producto_id) con el primero que no existe,
+    está inactivo o no alcanza; en ese caso quien llama debe hacer rollback.
+    """
+    productos = []
+    for producto_id in sorted(cantidades):
+        resultado = await session.execute(_consulta_descuento(producto_id, cantidades[producto_id]))
+        producto = resultado.scalars().first()
+        if not producto:
+            return [], producto_id
+        productos.append(producto)
+    await actualizar_resumen_async(session, *(_cambio_compra(p, cantidades[p.id]) for p in productos))
+    return productos, None
+
+
+async def bloquear_producto_async(session: AsyncSession, id_producto: int) -> Optional[Producto]:
+    """
+    Lee el producto bloqueando su fila hasta el commit, así la diferencia del
+    resumen se calcula sobre el valor que realmente se reemplaza y no sobre uno
+    que otra solicitud cambió mientras tanto.
+    PostgreSQL: SELECT ... FOR UPDATE. SQLite ignora FOR UPDATE y el driver no
+    abre la transacción hasta la primera escritura: un UPDATE que no cambia
+    datos la abre y toma el bloqueo de escritura antes de leer.
+    """
+    if session.bind.dialect.name == "sqlite":
+        await session.execute(
+            update(Producto)
+            .where(Producto.id == id_producto)
+            .values(id=Producto.id)
+            .execution_options(synchronize_session=False)
+        )
+    return await session.get(Producto, id_producto, with_for_update=True, populate_existing=True)
+
+
+def _cambio_compra(producto: Producto, cantidad: int):
+    """
+    Par (antes, después) del producto para el resumen: antes tenía 'cantidad' unidades más.
+    """
+    despues = estado(producto)
+    return despues._replace(cantidad=despues.cantidad + cantidad), despues
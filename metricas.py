@@ -0,0 +1,248 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+
+# MÉTRICAS DE RENDIMIENTO
+#
+# Latencia por ruta, solicitudes en curso y consultas SQL por solicitud,
+# expuestas en formato de texto de Prometheus. Se implementa sin dependencias:
+# los contadores viven en el proceso, así que cada worker publica los suyos.
+
+
+# Límites (en segundos) de los histogramas de latencia
+LIMITES_DURACION = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Límites de los histogramas de consultas por solicitud
+LIMITES_CONSULTAS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+# Consultas más lentas que este umbral (milisegundos) se registran en el log.
+# Lo fija create_app desde settings.slow_query_ms
+SLOW_QUERY_MS = 200.0
+
+# Caracteres de los parámetros que se muestran en el log de consultas lentas
+MAXIMO_PARAMETROS_LOG = 500
+
+log_consultas_lentas = logging.getLogger("tienda.consultas_lentas")
+
+
+def configurar(settings):
+    global SLOW_QUERY_MS
+    SLOW_QUERY_MS = settings.slow_query_ms
+
+
+class Histograma:
+    """
+    Histograma acumulativo con límites fijos, como los de Prometheus.
+    """
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.cubetas = [0] * (len(limites) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        self.cubetas[bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+
+class Metricas:
+    """
+    Registro de las métricas HTTP y de base de datos del proceso.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.en_curso = 0
+        self.solicitudes = {}
+        self.duracion = {}
+        self.consultas = {}
+        self.tiempo_bd = {}
+        self.consultas_totales = 0
+        self.tiempo_bd_total = 0.0
+        self.consultas_lentas = 0
+
+    def registrar_solicitud(self, metodo: str, ruta: str, estado: int, duracion: float, bd: "ConsultasSolicitud"):
+        with self._lock:
+            clave = (metodo, ruta)
+            self.solicitudes[clave + (str(estado),)] = self.solicitudes.get(clave + (str(estado),), 0) + 1
+            self.duracion.setdefault(clave, Histograma(LIMITES_DURACION)).observar(duracion)
+            self.consultas.setdefault(clave, Histograma(LIMITES_CONSULTAS)).observar(bd.cantidad)
+            self.tiempo_bd.setdefault(clave, Histograma(LIMITES_DURACION)).observar(bd.tiempo)
+
+    def registrar_consulta(self, duracion: float, lenta: bool):
+        with self._lock:
+            self.consultas_totales += 1
+            self.tiempo_bd_total += duracion
+            if lenta:
+                self.consultas_lentas += 1
+
+    def cambiar_en_curso(self, delta: int):
+        with self._lock:
+            self.en_curso += delta
+
+    def exportar(self) -> str:
+        """
+        Devuelve todas las métricas en el formato de texto de Prometheus.
+        """
+        lineas = []
+        with self._lock:
+            _cabecera(lineas, "tienda_http_solicitudes_en_curso", "gauge", "Solicitudes HTTP en curso.")
+            lineas.append(f"tienda_http_solicitudes_en_curso {self.en_curso}")
+
+            _cabecera(lineas, "tienda_http_solicitudes_total", "counter", "Solicitudes HTTP atendidas.")
+            for (metodo, ruta, estado), valor in sorted(self.solicitudes.items()):
+                lineas.append(
+                    f"tienda_http_solicitudes_total{_etiquetas(metodo=metodo, ruta=ruta, estado=estado)} {valor}"
+                )
+
+            for nombre, ayuda, histogramas in (
+                ("tienda_http_duracion_segundos", "Duración de las solicitudes HTTP.", self.duracion),
+                ("tienda_bd_consultas_por_solicitud", "Sentencias SQL ejecutadas por solicitud.", self.consultas),
+                ("tienda_bd_segundos_por_solicitud", "Tiempo en la base de datos por solicitud.", self.tiempo_bd),
+            ):
+                _cabecera(lineas, nombre, "histogram", ayuda)
+                for (metodo, ruta), histograma in sorted(histogramas.items()):
+                    _exportar_histograma(lineas, nombre, histograma, metodo=metodo, ruta=ruta)
+
+            _cabecera(lineas, "tienda_bd_consultas_total", "counter", "Sentencias SQL ejecutadas.")
+            lineas.append(f"tienda_bd_consultas_total {self.consultas_totales}")
+            _cabecera(lineas, "tienda_bd_segundos_total", "counter", "Tiempo total en la base de datos.")
+            lineas.append(f"tienda_bd_segundos_total {self.tiempo_bd_total:.6f}")
+            _cabecera(lineas, "tienda_bd_consultas_lentas_total", "counter", f"Sentencias de más de {SLOW_QUERY_MS:g} ms.")
+            lineas.append(f"tienda_bd_consultas_lentas_total {self.consultas_lentas}")
+        return "\n".join(lineas) + "\n"
+
+
+def _cabecera(lineas: list, nombre: str, tipo: str, ayuda: str):
+    lineas.append(f"# HELP {nombre} {ayuda}")
+    lineas.append(f"# TYPE {nombre} {tipo}")
+
+
+def _etiquetas(**valores) -> str:
+    pares = []
+    for clave, valor in valores.items():
+        valor = str(valor).replace("\\", "\\\\").replace('"', '\\"')
+        pares.append(f'{clave}="{valor}"')
+    return "{" + ",".join(pares) + "}"
+
+
+def _exportar_histograma(lineas: list, nombre: str, histograma: Histograma, **etiquetas):
+    acumulado = 0
+    for limite, cantidad in zip(histograma.limites, histograma.cubetas):
+        acumulado += cantidad
+        lineas.append(f"{nombre}_bucket{_etiquetas(**etiquetas, le=f'{limite:g}')} {acumulado}")
+    lineas.append(f"{nombre}_bucket{_etiquetas(**etiquetas, le='+Inf')} {histograma.total}")
+    lineas.append(f"{nombre}_sum{_etiquetas(**etiquetas)} {histograma.suma:.6f}")
+    lineas.append(f"{nombre}_count{_etiquetas(**etiquetas)} {histograma.total}")
+
+
+# Instancia compartida por el middleware y el endpoint /metrics
+metricas = Metricas()
+
+
+# CONSULTAS SQL POR SOLICITUD
+
+
+class ConsultasSolicitud:
+    """
+    Sentencias SQL y tiempo en la base acumulados durante una solicitud.
+    Es mutable para que los hilos del threadpool, que reciben una copia
+    del contexto, sumen sobre el mismo objeto.
+    """
+
+    __slots__ = ("cantidad", "tiempo")
+
+    def __init__(self):
+        self.cantidad = 0
+        self.tiempo = 0.0
+
+
+_consultas_solicitud: ContextVar[Optional[ConsultasSolicitud]] = ContextVar("consultas_solicitud", default=None)
+
+
+def _antes_de_ejecutar(conn, cursor, sentencia, parametros, contexto, multiples):
+    conn.info.setdefault("inicio_consulta", []).append(time.perf_counter())
+
+
+def _despues_de_ejecutar(conn, cursor, sentencia, parametros, contexto, multiples):
+    duracion = time.perf_counter() - conn.info["inicio_consulta"].pop()
+    lenta = duracion * 1000 >= SLOW_QUERY_MS
+    metricas.registrar_consulta(duracion, lenta)
+    actual = _consultas_solicitud.get()
+    if actual is not None:
+        actual.cantidad += 1
+        actual.tiempo += duracion
+    if lenta:
+        log_consultas_lentas.warning(
+            "Consulta lenta (%.1f ms): %s | parámetros: %s", duracion * 1000, sentencia, _resumir(parametros, multiples)
+        )
+
+
+def _resumir(parametros, multiples: bool) -> str:
+    # Un executemany puede traer miles de filas: solo se registra la cantidad y la primera
+    if multiples:
+        return f"{len(parametros)} filas, primera: {parametros[0]!r:.{MAXIMO_PARAMETROS_LOG}}"
+    return f"{parametros!r:.{MAXIMO_PARAMETROS_LOG}}"
+
+
+def _error_al_ejecutar(contexto_error):
+    # Sin esto el inicio de una sentencia fallida quedaría en la pila de la conexión
+    inicios = contexto_error.connection.info.get("inicio_consulta") if contexto_error.connection else None
+    if inicios:
+        inicios.pop()
+
+
+def instrumentar_motor(motor):
+    """
+    Registra los eventos que miden cada sentencia SQL del motor indicado.
+    Para motores asíncronos se pasa su 'sync_engine'.
+    """
+    event.listen(motor, "before_cursor_execute", _antes_de_ejecutar)
+    event.listen(motor, "after_cursor_execute", _despues_de_ejecutar)
+    event.listen(motor, "handle_error", _error_al_ejecutar)
+
+
+# MIDDLEWARE
+
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI que mide cada solicitud HTTP hasta enviar el último byte,
+    incluidas las respuestas en streaming.
+    La ruta se etiqueta con su plantilla ('/productos/{id_producto}') para
+    no crear una serie por cada ID.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        estado = {"codigo": 500}
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado["codigo"] = mensaje["status"]
+            await send(mensaje)
+
+        bd = ConsultasSolicitud()
+        token = _consultas_solicitud.set(bd)
+        metricas.cambiar_en_curso(1)
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracion = time.perf_counter() - inicio
+            metricas.cambiar_en_curso(-1)
+            _consultas_solicitud.reset(token)
+            ruta = getattr(scope.get("route"), "path", None) or "sin_ruta"
+            metricas.registrar_solicitud(scope["method"], ruta, estado["codigo"], duracion, bd)
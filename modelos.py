@@ -1,11 +1,26 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index, text
 from typing import Optional, List
+from datetime import datetime, timezone
+
+
+def ahora() -> datetime:
+    """
+    Fecha y hora actual en UTC.
+    """
+    return datetime.now(timezone.utc)
+
 
 class Categoria(SQLModel, table=True):
+    # AUTOINCREMENT: SQLite no reutiliza el ID de una categoría archivada (ver Producto)
+    __table_args__ = {"sqlite_autoincrement": True}
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    nombre: str
+    nombre: str = Field(index=True)
     descripcion: Optional[str] = None
     activo: bool = Field(default=True)
+    # Se actualiza solo en cada UPDATE (onupdate); lo usan ETag y Last-Modified
+    actualizado_en: Optional[datetime] = Field(default_factory=ahora, index=True, sa_column_kwargs={"onupdate": ahora})
 
     productos: List["Producto"] = Relationship(
         back_populates="categoria",
@@ -14,15 +29,139 @@ class Categoria(SQLModel, table=True):
 
 
 
+def solo_activos(*columnas, nombre: str) -> Index:
+    """
+    Índice parcial que solo incluye las filas activas: no crece con los productos
+    desactivados y se mantiene chico en la caché de la base. SQLite lo usa cuando
+    la consulta trae el mismo término 'activo = 1' (así compila Producto.activo == True).
+    Lleva 'activo' como última columna: SQLite no toma como covering un índice
+    parcial al que le falta una columna de la consulta, aunque sea la de su WHERE.
+    """
+    return Index(nombre, *columnas, "activo", sqlite_where=text("activo = 1"), postgresql_where=text("activo"))
+
+
 class Producto(SQLModel, table=True):
+    # Índices parciales de los productos activos: (id) para el listado por páginas,
+    # (categoría, precio, id) para el filtrado y (columna, id) y (categoría, columna, id)
+    # para el ordenado (sort=) con y sin categoría, así ninguno ordena en memoria.
+    # El de inactivos por fecha busca los candidatos a archivar (archivo.py).
+    # Sin AUTOINCREMENT, SQLite le daría a un producto nuevo el ID más alto si ese
+    # producto se archivó, y al restaurarlo los dos tendrían el mismo ID
+    __table_args__ = (
+        solo_activos("id", nombre="ix_producto_vivo_id"),
+        solo_activos("categoria_id", "precio", "id", nombre="ix_producto_vivo_categoria_precio_id"),
+        solo_activos("categoria_id", "cantidad", "id", nombre="ix_producto_vivo_categoria_cantidad"),
+        solo_activos("categoria_id", "nombre", "id", nombre="ix_producto_vivo_categoria_nombre"),
+        solo_activos("precio", "id", nombre="ix_producto_vivo_precio"),
+        solo_activos("cantidad", "id", nombre="ix_producto_vivo_cantidad"),
+        solo_activos("nombre", "id", nombre="ix_producto_vivo_nombre"),
+        Index(
+            "ix_producto_inactivo_actualizado", "actualizado_en",
+            sqlite_where=text("activo = 0"), postgresql_where=text("NOT activo"),
+        ),
+        {"sqlite_autoincrement": True},
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    nombre: str
+    nombre: str = Field(index=True)
     descripcion: Optional[str] = None
     precio: float
     cantidad: int
     activo: bool = Field(default=True)
-    categoria_id: int = Field(foreign_key="categoria.id")
+    categoria_id: int = Field(foreign_key="categoria.id", index=True)
+    actualizado_en: Optional[datetime] = Field(default_factory=ahora, index=True, sa_column_kwargs={"onupdate": ahora})
 
     categoria: Optional[Categoria] = Relationship(back_populates="productos")
 
 
+
+# ARCHIVO
+#
+# Productos y categorías inactivos desde hace tiempo se mueven a estas tablas
+# (archivo.py) para que las tablas vivas solo tengan lo que se consulta. Conservan
+# el mismo ID y no tienen claves foráneas: una categoría puede archivarse antes
+# que sus productos archivados.
+
+
+class CategoriaArchivada(SQLModel, table=True):
+    id: int = Field(primary_key=True)
+    nombre: str
+    descripcion: Optional[str] = None
+    activo: bool = False
+    actualizado_en: Optional[datetime] = None
+    # Indexada: las exportaciones incrementales buscan las bajas desde una fecha
+    archivado_en: datetime = Field(default_factory=ahora, index=True)
+
+
+class ProductoArchivado(SQLModel, table=True):
+    id: int = Field(primary_key=True)
+    nombre: str
+    descripcion: Optional[str] = None
+    precio: float
+    cantidad: int
+    activo: bool = False
+    categoria_id: int = Field(index=True)
+    actualizado_en: Optional[datetime] = None
+    # Indexada: las exportaciones incrementales buscan las bajas desde una fecha
+    archivado_en: datetime = Field(default_factory=ahora, index=True)
+
+
+class ResumenCategoria(SQLModel, table=True):
+    # Totales de los productos activos de cada categoría. Los mantienen al día,
+    # sumando y restando diferencias, los endpoints que modifican productos (resumen.py)
+    categoria_id: int = Field(foreign_key="categoria.id", primary_key=True)
+    productos: int = 0
+    unidades: int = 0
+    valor: float = 0
+    stock_bajo: int = 0
+    suma_precios: float = 0
+    precio_min: Optional[float] = None
+    precio_max: Optional[float] = None
+
+
+class VersionEsquema(SQLModel, table=True):
+    # Una sola fila con la huella del esquema (database.version_esquema);
+    # si coincide con la de los modelos el arranque no recrea nada
+    id: int = Field(default=1, primary_key=True)
+    version: str
+
+
+class VersionColeccion(SQLModel, table=True):
+    # Una fila por tabla listada con ETag (cache_http.py). Se incrementa después
+    # de cada alta, baja o modificación, así la versión del listado se lee de una
+    # fila en lugar de recorrer la tabla
+    tabla: str = Field(primary_key=True)
+    version: int = 0
+    actualizado_en: Optional[datetime] = None
+
+
+class Pedido(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    # Clave enviada en la cabecera Idempotency-Key: un reintento con la misma
+    # clave devuelve este pedido en lugar de volver a descontar el stock
+    clave_idempotencia: Optional[str] = Field(default=None, unique=True, index=True, max_length=255)
+    # Huella de las líneas pedidas, para rechazar la misma clave con otro contenido
+    huella: str
+    total: float = 0
+    creado_en: datetime = Field(default_factory=ahora)
+
+    lineas: List["LineaPedido"] = Relationship(back_populates="pedido")
+
+
+class LineaPedido(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    pedido_id: int = Field(foreign_key="pedido.id", index=True)
+    producto_id: int = Field(foreign_key="producto.id", index=True)
+    cantidad: int
+    # Precio del producto al momento de la compra
+    precio_unitario: float
+    subtotal: float
+
+    pedido: Optional[Pedido] = Relationship(back_populates="lineas")
+
+
+class EstadoReservas(SQLModel, table=True):
+    # Última compra del diario de reservas (reservas.py) ya escrita en la base;
+    # al reiniciar solo se aplican las posteriores
+    id: int = Field(default=1, primary_key=True)
+    ultima_secuencia: int = 0
@@ -0,0 +1,113 @@
+from typing import Optional
+
+from sqlalchemy import tuple_
+from sqlmodel import Session, select
+
+import database
+from serializacion import a_json
+
+
+# PAGINACIÓN POR CURSOR (KEYSET)
+
+
+# Cantidad de filas por página cuando el cliente no envía 'limit'
+LIMITE_POR_DEFECTO = 100
+# Máximo de filas que se pueden pedir en una sola página
+LIMITE_MAXIMO = 1000
+# Filas que se leen de la BD en cada lote al transmitir en NDJSON
+TAMANO_LOTE = 500
+# Valores de 'sort' del listado de productos; con '-' delante, de mayor a menor
+ORDENES_PRODUCTO = "^-?(precio|cantidad|nombre)$"
+
+
+def ordenar(consulta, modelo, after: Optional[int] = None, sort: Optional[str] = None):
+    """
+    Ordena la consulta por ID, o por la columna de 'sort' desempatando por ID en
+    el mismo sentido (así la recorre un índice (columna, id) sin ordenar
+    en memoria), y la continúa después del producto 'after'.
+    Con 'sort' el cursor sigue siendo un ID: el valor de la columna se lee con
+    una subconsulta por clave primaria y se compara el par (valor, id). Si el
+    producto ya no existe la subconsulta da NULL y no sale ninguna fila (ver
+    cursor_existe).
+    """
+    if not sort:
+        if after is not None:
+            consulta = consulta.where(modelo.id > after)
+        return consulta.order_by(modelo.id)
+
+    descendente = sort.startswith("-")
+    columna = getattr(modelo, sort.lstrip("-"))
+    if after is not None:
+        valor = select(columna).where(modelo.id == after).scalar_subquery()
+        clave, cursor = tuple_(columna, modelo.id), tuple_(valor, after)
+        consulta = consulta.where(clave < cursor if descendente else clave > cursor)
+    if descendente:
+        return consulta.order_by(columna.desc(), modelo.id.desc())
+    return consulta.order_by(columna, modelo.id)
+
+
+async def cursor_existe(session, modelo, after: int) -> bool:
+    """
+    Indica si el registro del cursor sigue en la tabla. Con 'sort' un cursor
+    archivado o inventado da una página vacía que no se distingue del final.
+    """
+    return (await session.exec(select(modelo.id).where(modelo.id == after))).first() is not None
+
+
+def consulta_pagina(consulta, modelo, limit: int, after: Optional[int] = None, sort: Optional[str] = None):
+    """
+    Ordena la consulta (ver ordenar) a partir del cursor 'after'.
+    Se pide una fila de más para saber si quedan resultados sin contarlos.
+    """
+    return ordenar(consulta, modelo, after, sort).limit(limit + 1)
+
+
+def cortar_pagina(filas, limit: int):
+    """
+    Separa la fila extra pedida por consulta_pagina y calcula el cursor siguiente.
+    """
+    siguiente = None
+    if len(filas) > limit:
+        filas = filas[:limit]
+        siguiente = filas[-1].id
+    return filas, siguiente
+
+
+def paginar(session: Session, consulta, modelo, limit: int, after: Optional[int] = None, sort: Optional[str] = None):
+    """
+    Devuelve una página de resultados ordenada (por ID o por 'sort') y el cursor de la siguiente.
+    """
+    filas = session.exec(consulta_pagina(consulta, modelo, limit, after, sort)).all()
+    return cortar_pagina(filas, limit)
+
+
+async def paginar_async(
+    session, consulta, modelo, limit: int, after: Optional[int] = None, sort: Optional[str] = None
+):
+    """
+    Igual que paginar, para sesiones asíncronas.
+    """
+    filas = (await session.exec(consulta_pagina(consulta, modelo, limit, after, sort))).all()
+    return cortar_pagina(filas, limit)
+
+
+def transmitir_ndjson(consulta, modelo, after: Optional[int] = None, sort: Optional[str] = None):
+    """
+    Genera los resultados línea por línea en formato NDJSON.
+    Lee la BD por lotes de TAMANO_LOTE usando el ID como cursor, así la memoria
+    no crece con el tamaño del catálogo.
+    'consulta' selecciona columnas (serializacion.consulta_columnas): cada fila
+    se codifica tal cual, sin crear objetos del ORM.
+    """
+    # Usa su propia sesión porque la respuesta se envía después de cerrar la del endpoint
+    with Session(database.get_motor_lectura()) as session:
+        ultimo = after
+        while True:
+            filas = session.exec(ordenar(consulta, modelo, ultimo, sort).limit(TAMANO_LOTE)).all()
+            if not filas:
+                break
+            bloque = b"".join(a_json(fila._asdict()) + b"\n" for fila in filas)
+            ultimo = filas[-1].id
+            yield bloque
+            if len(filas) < TAMANO_LOTE:
+                break
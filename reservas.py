@@ -0,0 +1,351 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo del diario, solo la comprobación de WEB_CONCURRENCY
+    fcntl = None
+
+from cache import invalidar_producto
+from Esquemas import ProductRead
+from modelos import EstadoReservas, Producto
+from resumen import actualizar_resumen_async, estado
+
+
+# RESERVAS DE STOCK EN MEMORIA (WRITE-BEHIND)
+#
+# Opcional (RESERVAS_EN_MEMORIA=true), para ventas flash: cada compra se admite
+# o rechaza contra un contador en memoria del producto, sin esperar a la base.
+# Los descuentos acumulados se escriben cada RESERVAS_INTERVALO_MS en una sola
+# transacción. Cada compra admitida se anota antes en un diario en disco, con
+# número de secuencia; la transacción guarda el último número aplicado, así al
+# reiniciar tras una caída se aplican solo las compras que no llegaron a la base.
+#
+# Los contadores viven en el proceso: sirve con un único worker. No arranca con
+# WEB_CONCURRENCY > 1 y toma un bloqueo exclusivo del diario, así un segundo
+# proceso falla al iniciar en lugar de vender el mismo stock dos veces. Las
+# lecturas de stock muestran el valor de la base, con hasta un intervalo de retraso.
+#
+# Tras cada escritura el diario se compacta: quedan solo las compras posteriores
+# a la secuencia aplicada, así no crece aunque las compras no paren. Cada lote
+# se aplica una sola vez: la transacción solo avanza si la secuencia guardada es
+# menor que la del lote.
+#
+# Las rutas que descuentan stock directamente en la base (POST /pedidos,
+# POST /compras) retienen antes sus productos (retener/liberar): se escribe lo
+# pendiente y esos contadores no se vuelven a cargar hasta su commit.
+
+log = logging.getLogger("tienda.reservas")
+
+
+class MotorReservas:
+    """
+    Contadores de stock por producto y cola de descuentos pendientes de escribir.
+    """
+
+    def __init__(self):
+        self.activo = False
+        self.intervalo = 0.05
+        self.ruta_diario = "reservas.log"
+        self._lock = threading.Lock()
+        # Stock disponible según la memoria y datos del producto al cargarlo
+        self._stock: Dict[int, int] = {}
+        self._productos: Dict[int, dict] = {}
+        # Unidades vendidas aún no escritas en la base
+        self._pendiente: Dict[int, int] = {}
+        # Las cargas de contadores esperan a que termine la escritura en curso
+        self._escritura: Optional[asyncio.Lock] = None
+        self._secuencia = 0
+        self._diario = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._parar: Optional[asyncio.Event] = None
+        self._motor = None
+        self.admitidas = 0
+        self.rechazadas = 0
+        self.escrituras = 0
+        # Unidades vendidas que la base ya no tenía al escribirlas (stock cambiado por otra vía)
+        self.sobreventas = 0
+
+    def configurar(self, settings):
+        if settings.reservas_en_memoria and settings.workers > 1:
+            raise ValueError("RESERVAS_EN_MEMORIA requiere un solo worker (WEB_CONCURRENCY=1)")
+        self.activo = settings.reservas_en_memoria
+        self.intervalo = settings.reservas_intervalo_ms / 1000
+        self.ruta_diario = settings.reservas_diario
+
+    # ARRANQUE Y PARADA
+
+    async def iniciar(self, motor):
+        """
+        Aplica las compras del diario que no llegaron a la base y arranca la escritura periódica.
+        """
+        self._motor = motor
+        self._escritura = asyncio.Lock()
+        self._parar = asyncio.Event()
+        async with AsyncSession(motor, expire_on_commit=False) as session:
+            fila = await session.get(EstadoReservas, 1)
+            if not fila:
+                fila = EstadoReservas(id=1, ultima_secuencia=0)
+                session.add(fila)
+                await session.commit()
+            aplicada = fila.ultima_secuencia
+
+        self._diario = self._abrir_diario()
+        pendientes, ultima = self._leer_diario(aplicada)
+        self._secuencia = max(aplicada, ultima)
+        if pendientes:
+            log.warning("Aplicando %s productos con compras pendientes del diario", len(pendientes))
+            await self._escribir(pendientes, self._secuencia)
+        self._diario.seek(0)
+        self._diario.truncate()
+        self._tarea = asyncio.create_task(self._escribir_periodicamente())
+
+    async def detener(self):
+        """
+        Escribe lo pendiente y cierra el diario (al apagar la app).
+        La escritura periódica se detiene con un evento y no con cancel(): una
+        cancelación durante el commit dejaría el lote como pendiente y se
+        volvería a escribir.
+        """
+        if self._tarea is not None:
+            self._parar.set()
+            await self._tarea
+            self._tarea = None
+        if self._motor is not None:
+            await self.escribir_pendiente()
+        if self._diario is not None:
+            self._diario.close()
+            self._diario = None
+        self._stock.clear()
+        self._productos.clear()
+
+    def _abrir_diario(self, ruta: Optional[str] = None):
+        """
+        Abre el diario para leer y agregar, con un bloqueo exclusivo que dura
+        mientras esté abierto. Falla si otro proceso ya lo tiene.
+        """
+        diario = open(ruta or self.ruta_diario, "a+", buffering=1, encoding="utf-8")
+        if fcntl is not None:
+            try:
+                fcntl.flock(diario.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                diario.close()
+                raise RuntimeError(
+                    f"Otro proceso usa el diario de reservas {self.ruta_diario}: "
+                    "RESERVAS_EN_MEMORIA requiere un solo worker"
+                )
+        return diario
+
+    def _leer_diario(self, aplicada: int) -> Tuple[Dict[int, int], int]:
+        """
+        Suma por producto las compras del diario con secuencia mayor que la aplicada.
+        """
+        pendientes = {}
+        ultima = 0
+        self._diario.seek(0)
+        for linea in self._diario:
+            partes = linea.split()
+            # Una línea cortada por la caída no llegó a confirmarse al cliente
+            if len(partes) != 3:
+                continue
+            secuencia, id_producto, cantidad = map(int, partes)
+            ultima = max(ultima, secuencia)
+            if secuencia > aplicada:
+                pendientes[id_producto] = pendientes.get(id_producto, 0) + cantidad
+        return pendientes, ultima
+
+    def _compactar_diario(self, aplicada: int):
+        """
+        Deja en el diario solo las compras con secuencia mayor que la aplicada.
+        Se llama con self._lock tomado, así no se anotan compras mientras tanto.
+        """
+        if aplicada == self._secuencia:
+            self._diario.seek(0)
+            self._diario.truncate()
+            return
+        self._diario.seek(0)
+        restantes = [linea for linea in self._diario if linea.endswith("\n") and int(linea.split()[0]) > aplicada]
+        # Las compras sin aplicar se escriben en otro archivo que luego reemplaza
+        # al diario: una caída a mitad de camino deja el diario anterior entero
+        temporal = f"{self.ruta_diario}.tmp"
+        with open(temporal, "w", encoding="utf-8") as nuevo:
+            nuevo.writelines(restantes)
+        anterior = self._diario
+        self._diario = self._abrir_diario(temporal)
+        os.replace(temporal, self.ruta_diario)
+        anterior.close()
+
+    # COMPRAS
+
+    async def reservar(self, session: AsyncSession, id_producto: int, cantidad: int) -> Optional[dict]:
+        """
+        Descuenta 'cantidad' del contador del producto, cargándolo de la base la
+        primera vez. Devuelve el producto con el stock restante, o None si no
+        existe o no alcanza (como descontar_stock).
+        """
+        while True:
+            if id_producto not in self._stock:
+                # Durante una escritura la base y lo pendiente no coinciden: se espera a que termine
+                async with self._escritura:
+                    if id_producto not in self._stock:
+                        producto = await session.get(Producto, id_producto, populate_existing=True)
+                        if not producto or not producto.activo:
+                            return None
+                        with self._lock:
+                            self._stock[id_producto] = producto.cantidad - self._pendiente.get(id_producto, 0)
+                            self._productos[id_producto] = ProductRead.from_orm(producto).dict()
+            with self._lock:
+                # Otra ruta pudo descartar el contador (olvidar) mientras se cargaba
+                if id_producto in self._stock:
+                    break
+
+        with self._lock:
+            disponible = self._stock[id_producto]
+            if disponible < cantidad:
+                self.rechazadas += 1
+                return None
+            self._stock[id_producto] = disponible - cantidad
+            self._pendiente[id_producto] = self._pendiente.get(id_producto, 0) + cantidad
+            self._secuencia += 1
+            # Sin fsync: sobrevive a la caída del proceso, no a la del sistema
+            self._diario.write(f"{self._secuencia} {id_producto} {cantidad}\n")
+            self.admitidas += 1
+            return {**self._productos[id_producto], "cantidad": disponible - cantidad}
+
+    def olvidar(self, *ids_producto: int):
+        """
+        Descarta los contadores de productos cuyo stock cambió por otra vía;
+        se vuelven a cargar desde la base en la siguiente compra.
+        """
+        with self._lock:
+            for id_producto in ids_producto:
+                self._stock.pop(id_producto, None)
+                self._productos.pop(id_producto, None)
+
+    # PRODUCTOS RETENIDOS POR OTRAS RUTAS
+
+    async def retener(self, *ids_producto: int):
+        """
+        Antes de descontar stock en la base por otra vía: escribe lo pendiente y
+        descarta los contadores de los productos. Hasta liberar() no corre la
+        escritura periódica ni se cargan contadores, así las compras en memoria
+        de esos productos esperan al commit y después leen el stock resultante.
+        """
+        await self._escritura.acquire()
+        try:
+            self.olvidar(*ids_producto)
+            escritos = await self._escribir_pendiente()
+        except BaseException:
+            self._escritura.release()
+            raise
+        if escritos:
+            await invalidar_producto(*escritos)
+
+    def liberar(self):
+        """
+        Termina la retención de retener(), después del commit o del rollback.
+        """
+        self._escritura.release()
+
+    # ESCRITURA EN LA BASE
+
+    async def _escribir_periodicamente(self):
+        while not self._parar.is_set():
+            try:
+                await asyncio.wait_for(self._parar.wait(), timeout=self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.escribir_pendiente()
+            except Exception:
+                # Lo pendiente se conserva y se reintenta en el siguiente intervalo
+                log.exception("No se pudieron escribir las reservas pendientes")
+
+    async def escribir_pendiente(self):
+        """
+        Escribe en una transacción los descuentos acumulados desde la última escritura.
+        """
+        async with self._escritura:
+            escritos = await self._escribir_pendiente()
+        if escritos:
+            await invalidar_producto(*escritos)
+
+    async def _escribir_pendiente(self) -> Dict[int, int]:
+        """
+        Escribe lo pendiente con self._escritura tomado y devuelve lo escrito.
+        """
+        with self._lock:
+            if not self._pendiente:
+                return {}
+            pendientes = dict(self._pendiente)
+            secuencia = self._secuencia
+        await self._escribir(pendientes, secuencia)
+        with self._lock:
+            for id_producto, cantidad in pendientes.items():
+                restante = self._pendiente[id_producto] - cantidad
+                if restante:
+                    self._pendiente[id_producto] = restante
+                else:
+                    del self._pendiente[id_producto]
+            if self._diario is not None:
+                self._compactar_diario(secuencia)
+        return pendientes
+
+    async def _escribir(self, pendientes: Dict[int, int], secuencia: int):
+        """
+        Resta las unidades de cada producto (en orden de ID), actualiza el resumen
+        y guarda la secuencia aplicada, todo en la misma transacción. Si la base
+        ya tiene esa secuencia (el lote se confirmó pero no se llegó a descontar
+        de lo pendiente) no vuelve a restar nada.
+        """
+        async with AsyncSession(self._motor, expire_on_commit=False) as session:
+            # La secuencia se guarda primero: en SQLite toma el bloqueo de escritura desde el inicio
+            guardada = await session.execute(
+                update(EstadoReservas)
+                .where(EstadoReservas.id == 1, EstadoReservas.ultima_secuencia < secuencia)
+                .values(ultima_secuencia=secuencia)
+            )
+            if guardada.rowcount == 0:
+                log.warning("Las reservas hasta la secuencia %s ya estaban escritas", secuencia)
+                return
+            consulta = select(Producto).where(Producto.id.in_(pendientes)).order_by(Producto.id).with_for_update()
+            cambios = []
+            for producto in (await session.exec(consulta)).all():
+                antes = estado(producto)
+                # Las compras ya se confirmaron al cliente: si otra vía bajó el stock
+                # mientras estaban pendientes, queda en 0 y el faltante se registra
+                faltante = pendientes[producto.id] - producto.cantidad
+                if faltante > 0:
+                    log.error(
+                        "Sobreventa de %s unidades del producto %s: su stock cambió con compras pendientes",
+                        faltante, producto.id,
+                    )
+                    self.sobreventas += faltante
+                producto.cantidad = max(0, producto.cantidad - pendientes[producto.id])
+                cambios.append((antes, estado(producto)))
+            await actualizar_resumen_async(session, *cambios)
+            await session.commit()
+        self.escrituras += 1
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "activo": self.activo,
+                "admitidas": self.admitidas,
+                "rechazadas": self.rechazadas,
+                "escrituras": self.escrituras,
+                "sobreventas": self.sobreventas,
+                "productos_en_memoria": len(self._stock),
+                "unidades_pendientes": sum(self._pendiente.values()),
+            }
+
+
+# Instancia del proceso, configurada por create_app
+reservas = MotorReservas()
@@ -0,0 +1,204 @@
+from collections import namedtuple
+from typing import Optional
+
+from sqlalchemy import and_, case, delete, func, insert, select as select_core, update
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from Esquemas import CategoryInventorySummary, InventorySummary
+from modelos import Categoria, Producto, ResumenCategoria
+
+
+# RESUMEN DE INVENTARIO POR CATEGORÍA
+#
+# La tabla resumencategoria guarda los totales de los productos activos de cada
+# categoría. Cada cambio de un producto se traduce en un UPDATE que suma o resta
+# su diferencia, en la misma transacción que el cambio, así leer los resúmenes
+# cuesta una fila por categoría. El mínimo y el máximo de precio no se pueden
+# restar: se recalculan con el índice parcial (categoria_id, precio) de los
+# activos solo cuando cambia el conjunto de precios activos de la categoría.
+
+
+# Un producto tiene stock bajo si le quedan estas unidades o menos.
+# Lo fija create_app desde settings.stock_bajo; database y tareas lo leen
+# como resumen.UMBRAL_STOCK_BAJO para ver el valor configurado
+UMBRAL_STOCK_BAJO = 5
+
+
+def configurar(settings):
+    global UMBRAL_STOCK_BAJO
+    UMBRAL_STOCK_BAJO = settings.stock_bajo
+
+_CAMPOS = ("productos", "unidades", "valor", "stock_bajo", "suma_precios")
+
+# Campos de un producto que afectan al resumen
+EstadoProducto = namedtuple("EstadoProducto", "categoria_id precio cantidad activo")
+
+
+def estado(producto) -> Optional[EstadoProducto]:
+    """
+    Copia los campos del producto que cuentan para el resumen.
+    Se toma antes y después de modificarlo para calcular la diferencia.
+    """
+    if producto is None:
+        return None
+    return EstadoProducto(producto.categoria_id, producto.precio, producto.cantidad, bool(producto.activo))
+
+
+def _aporte(estado_producto: Optional[EstadoProducto]) -> Optional[dict]:
+    if estado_producto is None or not estado_producto.activo:
+        return None
+    return {
+        "productos": 1,
+        "unidades": estado_producto.cantidad,
+        "valor": estado_producto.precio * estado_producto.cantidad,
+        "stock_bajo": int(estado_producto.cantidad <= UMBRAL_STOCK_BAJO),
+        "suma_precios": estado_producto.precio,
+    }
+
+
+def _precio_activo(estado_producto: Optional[EstadoProducto]):
+    if estado_producto is None or not estado_producto.activo:
+        return None
+    return estado_producto.categoria_id, estado_producto.precio
+
+
+def sentencias_resumen(*cambios):
+    """
+    Traduce pares (antes, después) de EstadoProducto en un UPDATE por categoría afectada.
+    'antes' es None para productos nuevos y 'después' es None para productos borrados.
+    """
+    diferencias = {}
+    recalcular_precios = set()
+    for antes, despues in cambios:
+        for signo, estado_producto in ((-1, antes), (1, despues)):
+            aporte = _aporte(estado_producto)
+            if aporte is None:
+                continue
+            diferencia = diferencias.setdefault(estado_producto.categoria_id, dict.fromkeys(_CAMPOS, 0))
+            for campo, valor in aporte.items():
+                diferencia[campo] += signo * valor
+        # Una compra solo cambia la cantidad: no hace falta recalcular mínimo y máximo
+        if _precio_activo(antes) != _precio_activo(despues):
+            for precio in (_precio_activo(antes), _precio_activo(despues)):
+                if precio is not None:
+                    recalcular_precios.add(precio[0])
+
+    sentencias = []
+    # Siempre en orden de categoría, para que dos transacciones bloqueen las filas en el mismo orden
+    for categoria_id in sorted(set(diferencias) | recalcular_precios):
+        valores = {
+            campo: getattr(ResumenCategoria, campo) + cambio
+            for campo, cambio in diferencias.get(categoria_id, {}).items()
+            if cambio
+        }
+        if categoria_id in recalcular_precios:
+            activos = and_(Producto.activo == True, Producto.categoria_id == categoria_id)
+            valores["precio_min"] = select_core(func.min(Producto.precio)).where(activos).scalar_subquery()
+            valores["precio_max"] = select_core(func.max(Producto.precio)).where(activos).scalar_subquery()
+        if valores:
+            sentencias.append(
+                update(ResumenCategoria)
+                .where(ResumenCategoria.categoria_id == categoria_id)
+                .values(**valores)
+                .execution_options(synchronize_session=False)
+            )
+    return sentencias
+
+
+def actualizar_resumen(session: Session, *cambios):
+    """
+    Aplica al resumen los cambios de productos indicados.
+    Se llama antes del commit, dentro de la misma transacción que los cambios.
+    """
+    # Las subconsultas de mínimo y máximo deben ver los productos ya modificados
+    session.flush()
+    for sentencia in sentencias_resumen(*cambios):
+        session.execute(sentencia)
+
+
+async def actualizar_resumen_async(session: AsyncSession, *cambios):
+    """
+    Igual que actualizar_resumen, para sesiones asíncronas.
+    """
+    await session.flush()
+    for sentencia in sentencias_resumen(*cambios):
+        await session.execute(sentencia)
+
+
+def recalcular_resumen(motor):
+    """
+    Reconstruye el resumen completo desde la tabla de productos.
+    init_db lo ejecuta al crear o migrar el esquema, también cuando cambia STOCK_BAJO.
+    Si la base se modificó por fuera de la API se puede llamar a mano, sin la
+    API atendiendo: no se coordina con los UPDATE incrementales de las compras.
+    """
+    activos = and_(Producto.categoria_id == Categoria.id, Producto.activo == True)
+    consulta = (
+        select_core(
+            Categoria.id,
+            func.count(Producto.id),
+            func.coalesce(func.sum(Producto.cantidad), 0),
+            func.coalesce(func.sum(Producto.precio * Producto.cantidad), 0),
+            func.coalesce(func.sum(case((Producto.cantidad <= UMBRAL_STOCK_BAJO, 1), else_=0)), 0),
+            func.coalesce(func.sum(Producto.precio), 0),
+            func.min(Producto.precio),
+            func.max(Producto.precio),
+        )
+        .select_from(Categoria)
+        .outerjoin(Producto, activos)
+        .group_by(Categoria.id)
+    )
+    columnas = ["categoria_id", *_CAMPOS, "precio_min", "precio_max"]
+    with motor.begin() as conexion:
+        conexion.execute(delete(ResumenCategoria))
+        conexion.execute(insert(ResumenCategoria).from_select(columnas, consulta))
+
+
+# LECTURA
+
+
+def consulta_resumen():
+    """
+    SELECT de los resúmenes junto con el nombre de cada categoría.
+    """
+    return select(ResumenCategoria, Categoria.nombre).join(Categoria, Categoria.id == ResumenCategoria.categoria_id)
+
+
+def _promedio(suma: float, cantidad: int) -> Optional[float]:
+    return round(suma / cantidad, 2) if cantidad else None
+
+
+def resumen_de_categoria(resumen: ResumenCategoria, nombre: str) -> CategoryInventorySummary:
+    return CategoryInventorySummary(
+        categoria_id=resumen.categoria_id,
+        nombre=nombre,
+        productos=resumen.productos,
+        unidades=resumen.unidades,
+        valor_inventario=round(resumen.valor, 2),
+        stock_bajo=resumen.stock_bajo,
+        precio_min=resumen.precio_min,
+        precio_max=resumen.precio_max,
+        precio_promedio=_promedio(resumen.suma_precios, resumen.productos),
+    )
+
+
+def resumen_total(filas) -> InventorySummary:
+    """
+    Suma los resúmenes de las categorías (filas de consulta_resumen).
+    """
+    categorias = [resumen_de_categoria(resumen, nombre) for resumen, nombre in filas]
+    productos = sum(resumen.productos for resumen, _ in filas)
+    minimos = [c.precio_min for c in categorias if c.precio_min is not None]
+    maximos = [c.precio_max for c in categorias if c.precio_max is not None]
+    return InventorySummary(
+        productos=productos,
+        unidades=sum(c.unidades for c in categorias),
+        valor_inventario=round(sum(resumen.valor for resumen, _ in filas), 2),
+        stock_bajo=sum(c.stock_bajo for c in categorias),
+        precio_min=min(minimos, default=None),
+        precio_max=max(maximos, default=None),
+        precio_promedio=_promedio(sum(resumen.suma_precios for resumen, _ in filas), productos),
+        umbral_stock_bajo=UMBRAL_STOCK_BAJO,
+        categorias=categorias,
+    )
@@ -1,130 +1,385 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlmodel import Session, select
-from database import get_session
-from modelos import Categoria, Producto
-from Esquemas import CategoryCreate, CategoryRead, CategoryUpdate, ProductCreate, ProductRead, ProductUpdate
-from typing import Optional, List
-
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlmodel import select
+from sqlalchemy import exists
+from sqlalchemy.orm import joinedload, selectinload
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database import get_async_session, get_async_session_lectura
+from modelos import Categoria, Producto, ResumenCategoria
+from Esquemas import (
+    CategoryCreate, CategoryInventorySummary, CategoryRead, CategoryReadWithProducts, CategoryUpdate,
+    InventorySummary, ProductCreate, ProductPageWithFacets, ProductRead, ProductReadWithCategory, ProductUpdate,
+)
+from typing import Optional, List, Union
+from inventario import bloquear_producto_async, descontar_stock_async
+from paginacion import cursor_existe, paginar_async, transmitir_ndjson, LIMITE_POR_DEFECTO, LIMITE_MAXIMO, ORDENES_PRODUCTO
+from cache import cache, invalidar_categoria, invalidar_producto
+from cache_http import calcular_etag, no_modificado, version_coleccion
+from busqueda import consulta_busqueda
+from facetas import consulta_facetas, facetas_de_filas
+from metricas import metricas
+from reservas import reservas
+from admision import admision
+from cambios import feed
+from tareas import COMPRA, DESACTIVACION, STOCK, Evento, trabajador
+from serializacion import campos_pedidos, consulta_columnas, proyectar, respuesta_json
+from resumen import actualizar_resumen_async, consulta_resumen, estado, resumen_de_categoria, resumen_total
+
+# Todos los endpoints de categorías y productos. Los registros se desactivan
+# (activo = False) en lugar de borrarse, y los listados solo muestran los activos.
+# Los endpoints que solo leen usan get_async_session_lectura (réplica si existe).
 router = APIRouter()
 
-# CRUD DE CATEGORÍAS
+# Descripción del parámetro 'fields' de los endpoints de lectura
+CAMPOS_PRODUCTO = f"Campos a devolver separados por coma ({', '.join(ProductRead.model_fields)}); el id va siempre"
+CAMPOS_CATEGORIA = f"Campos a devolver separados por coma ({', '.join(CategoryRead.model_fields)}); el id va siempre"
+
 
+# ESTADO DE LA API
 
-@router.get("/categorias", response_model=List[CategoryRead], status_code=status.HTTP_200_OK)
-def listar_categorias(session: Session = Depends(get_session)):
+
+@router.get("/")
+def root():
     """
-    Devuelve todas las categorías activas
+    Mensaje de bienvenida para verificar que la API funciona.
     """
-    categorias = session.exec(select(Categoria).where(Categoria.activo == True)).all()
-    if not categorias:
-        raise HTTPException(status_code=404, detail="No hay categorías registradas.")
-    return categorias
+    return {"message": "API del Sistema de Gestión de Tienda Online operativa"}
 
 
-@router.get("/categorias/{id}", response_model=CategoryRead, status_code=status.HTTP_200_OK)
-def obtener_categoria(id: int, session: Session = Depends(get_session)):
+@router.get("/cache/estadisticas")
+def estadisticas_cache():
     """
-    Devuelve una categoría por su ID.
+    Devuelve los aciertos y fallos de la caché de lecturas.
     """
-    categoria = session.get(Categoria, id)
-    if not categoria:
-        raise HTTPException(status_code=404, detail="Categoría no encontrada.")
-    return categoria
+    return cache.estadisticas()
 
 
-@router.post("/categorias", response_model=CategoryRead, status_code=status.HTTP_201_CREATED)
-def crear_categoria(data: CategoryCreate, session: Session = Depends(get_session)):
+@router.get("/reservas/estadisticas")
+def estadisticas_reservas():
     """
-    Crea una nueva categoría si no existe otra con el mismo nombre.
+    Compras admitidas y rechazadas en memoria y escrituras en lote a la base.
     """
-    existente = session.exec(select(Categoria).where(Categoria.nombre == data.nombre)).first()
-    if existente:
-        raise HTTPException(status_code=409, detail="Ya existe una categoría con ese nombre.")
+    return reservas.estadisticas()
 
-    nueva_categoria = Categoria.from_orm(data)
-    session.add(nueva_categoria)
-    session.commit()
-    session.refresh(nueva_categoria)
-    return nueva_categoria
 
+@router.get("/admision/estadisticas")
+def estadisticas_admision():
+    """
+    Solicitudes en curso por clase y rechazadas por tasa (429) o por cupo (503).
+    """
+    return admision.estadisticas()
 
-@router.put("/categorias/{id}", response_model=CategoryRead, status_code=status.HTTP_200_OK)
-def actualizar_categoria(id: int, data: CategoryUpdate, session: Session = Depends(get_session)):
+
+@router.get("/cambios/estadisticas")
+def estadisticas_cambios():
     """
-    Actualiza los datos de una categoría existente.
+    Secuencia actual del feed de cambios y suscriptores conectados.
     """
-    categoria = session.get(Categoria, id)
-    if not categoria:
-        raise HTTPException(status_code=404, detail="Categoría no encontrada.")
+    return feed.estadisticas()
 
-    for key, value in data.dict(exclude_unset=True).items():
-        setattr(categoria, key, value)
 
-    session.commit()
-    session.refresh(categoria)
-    return categoria
+@router.get("/tareas/estadisticas")
+def estadisticas_tareas():
+    """
+    Eventos recibidos, descartados y procesados por el trabajador en segundo plano.
+    """
+    return trabajador.estadisticas()
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def exportar_metricas():
+    """
+    Métricas de rendimiento en formato de texto de Prometheus.
+    """
+    return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4")
+
 
+# CRUD DE CATEGORÍAS
 
-@router.delete("/categorias/{id}", status_code=status.HTTP_200_OK)
-def eliminar_categoria(id: int, session: Session = Depends(get_session)):
+
+@router.post("/categorias", response_model=CategoryRead, status_code=status.HTTP_201_CREATED)
+async def crear_categoria(datos: CategoryCreate, session: AsyncSession = Depends(get_async_session)):
     """
-    Desactiva una categoría sin eliminarla del todo.
+    Crea una categoría nueva si no existe otra con el mismo nombre.
+    """
+    ## Validar nombre único
+    if (await session.exec(select(Categoria).where(Categoria.nombre == datos.nombre))).first():
+        raise HTTPException(status_code=409, detail="La categoría ya existe.")
+    ## Crear instancia y activar categoría
+    categoria = Categoria.from_orm(datos)
+    categoria.activo = True
+    session.add(categoria)
+    await session.flush()
+    # Fila vacía del resumen de inventario, que después actualizan los productos
+    session.add(ResumenCategoria(categoria_id=categoria.id))
+    await session.commit()
+    await session.refresh(categoria)
+    await invalidar_categoria(categoria.id)
+    return respuesta_json(CategoryRead.from_orm(categoria).dict(), status_code=201)  # Retorna código 201 (creado)
+
+
+@router.get("/categorias", response_model=Union[List[CategoryReadWithProducts], List[CategoryRead]])
+async def listar_categorias(
+    request: Request,
+    response: Response,
+    include: Optional[str] = Query(None, pattern="^productos$", description="'productos' agrega los productos de cada categoría"),
+    fields: Optional[str] = Query(None, description=CAMPOS_CATEGORIA),
+    session: AsyncSession = Depends(get_async_session_lectura)
+):
+    """
+    Devuelve todas las categorías activas.
+    Con include=productos agrega sus productos activos en una segunda consulta (selectin),
+    sin importar cuántas categorías haya.
+    """
+    campos = campos_pedidos(fields, CategoryRead)
+    # Si la colección no cambió desde la última consulta del cliente, responde 304 sin consultarla
+    version, ultima = await version_coleccion(session, Categoria)
+    partes = ["categorias", include, version, ultima, *(campos or ())]
+    if include == "productos":
+        version_productos, ultima_producto = await version_coleccion(session, Producto)
+        partes += [version_productos, ultima_producto]
+        ultima = max(filter(None, (ultima, ultima_producto)), default=None)
+    respuesta = no_modificado(request, response, calcular_etag(*partes), ultima)
+    if respuesta is not None:
+        return respuesta
+
+    if include == "productos":
+        consulta = (
+            select(Categoria)
+            .where(Categoria.activo == True)
+            .options(selectinload(Categoria.productos.and_(Producto.activo == True)))
+        )
+        return (await session.exec(consulta)).all()
+
+    clave = await cache.clave_grupo("categorias", f"activas|{campos}")
+    categorias = await cache.obtener(clave)
+    if categorias is None:
+        # Lee solo las columnas pedidas, en lugar de objetos del ORM
+        consulta = consulta_columnas(Categoria, CategoryRead, campos).where(Categoria.activo == True)
+        categorias = [fila._asdict() for fila in (await session.exec(consulta)).all()]
+        await cache.guardar(clave, categorias)
+    return respuesta_json(categorias, response)
+
+
+@router.get("/categorias/{id_categoria}", response_model=CategoryRead)
+async def obtener_categoria(
+    id_categoria: int,
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description=CAMPOS_CATEGORIA),
+    session: AsyncSession = Depends(get_async_session_lectura)
+):
     """
-    categoria = session.get(Categoria, id)
+    Devuelve una categoría por su ID.
+    """
+    campos = campos_pedidos(fields, CategoryRead)
+    clave = f"categoria:{id_categoria}"
+    cacheada = await cache.obtener(clave)
+    if cacheada is None:
+        # Busca la categoría en la BD
+        categoria = await session.get(Categoria, id_categoria)
+        if not categoria:
+            raise HTTPException(status_code=404, detail="Categoría no encontrada")
+        cacheada = CategoryRead.from_orm(categoria).dict()
+        await cache.guardar(clave, cacheada)
+
+    etag = calcular_etag("categoria", id_categoria, cacheada["actualizado_en"], *(campos or ()))
+    respuesta = no_modificado(request, response, etag, cacheada["actualizado_en"])
+    if respuesta is not None:
+        return respuesta
+    if campos is not None:
+        return respuesta_json(proyectar(cacheada, campos), response)
+    return cacheada
+
+
+@router.put("/categorias/{id_categoria}", response_model=CategoryRead)
+async def actualizar_categoria(id_categoria: int, datos: CategoryUpdate, session: AsyncSession = Depends(get_async_session)):
+    """
+    Actualiza los datos de una categoría existente
+    """
+    categoria = await session.get(Categoria, id_categoria)
     if not categoria:
-        raise HTTPException(status_code=404, detail="Categoría no encontrada.")
+        raise HTTPException(status_code=404, detail="Categoría no encontrada")
+    # Actualiza solo los campos enviados (exclude_unset evita reemplazar con None)
+    for key, value in datos.dict(exclude_unset=True).items():
+        setattr(categoria, key, value)
+    await session.commit()
+    await session.refresh(categoria)
+    await invalidar_categoria(id_categoria)
+    return categoria
+
 
+@router.delete("/categorias/{id_categoria}")
+async def eliminar_categoria(id_categoria: int, session: AsyncSession = Depends(get_async_session)):
+    """
+    Desactiva una categoría si no tiene productos activos.
+    """
+    # Verifica con EXISTS si hay productos activos relacionados, sin cargarlos
+    consulta = exists().where(Producto.categoria_id == id_categoria, Producto.activo == True)
+    if (await session.exec(select(consulta))).one():
+        raise HTTPException(status_code=400, detail="No se puede eliminar, tiene productos asociados.")
+
+    categoria = await session.get(Categoria, id_categoria)
+    if not categoria:
+        raise HTTPException(status_code=404, detail="Categoría no encontrada")
     categoria.activo = False
-    session.commit()
-    return {"message": "Categoría desactivada correctamente."}
+    await session.commit()
+    await invalidar_categoria(id_categoria)
+    return {"mensaje": "Categoría desactivada correctamente"}
 
 
-@router.get("/categorias/{id_categoria}/productos", response_model=CategoryRead, status_code=status.HTTP_200_OK)
-def categoria_con_productos(id_categoria: int, session: Session = Depends(get_session)):
+@router.get("/categorias/{id_categoria}/productos", response_model=CategoryReadWithProducts)
+async def categoria_con_productos(id_categoria: int, session: AsyncSession = Depends(get_async_session_lectura)):
     """
-    Obtiene una categoría junto con sus productos.
+    Obtiene una categoría junto con sus productos activos.
     """
-    categoria = session.get(Categoria, id_categoria)
+    # Los productos se cargan de una vez (selectin) en lugar de uno por acceso
+    opciones = [selectinload(Categoria.productos.and_(Producto.activo == True))]
+    categoria = await session.get(Categoria, id_categoria, options=opciones)
     if not categoria:
-        raise HTTPException(status_code=404, detail="Categoría no encontrada.")
+        raise HTTPException(status_code=404, detail="Categoría no encontrada")
     return categoria
 
 
-# CRUD DE PRODUCTOS
+@router.get("/categorias/{id_categoria}/resumen", response_model=CategoryInventorySummary)
+async def resumen_categoria(id_categoria: int, session: AsyncSession = Depends(get_async_session_lectura)):
+    """
+    Devuelve los totales de inventario de una categoría activa sin recorrer sus productos.
+    """
+    consulta = consulta_resumen().where(ResumenCategoria.categoria_id == id_categoria, Categoria.activo == True)
+    fila = (await session.exec(consulta)).first()
+    if not fila:
+        raise HTTPException(status_code=404, detail="Categoría no encontrada")
+    return resumen_de_categoria(*fila)
 
 
-@router.post("/productos", response_model=ProductRead, status_code=status.HTTP_201_CREATED)
-def crear_producto(producto: ProductCreate, session: Session = Depends(get_session)):
+@router.get("/inventario/resumen", response_model=InventorySummary)
+async def resumen_inventario(session: AsyncSession = Depends(get_async_session_lectura)):
     """
-    Crea un nuevo producto asociado a una categoría
+    Devuelve los totales de inventario de las categorías activas y su suma.
     """
-    categoria = session.get(Categoria, producto.categoria_id)
-    if not categoria:
-        raise HTTPException(status_code=400, detail="La categoría no existe.")
+    filas = (await session.exec(consulta_resumen().where(Categoria.activo == True))).all()
+    return resumen_total(filas)
 
-    existente = session.exec(select(Producto).where(Producto.nombre == producto.nombre)).first()
-    if existente:
-        raise HTTPException(status_code=409, detail="Ya existe un producto con ese nombre.")
 
-    producto_db = Producto.from_orm(producto)
-    session.add(producto_db)
-    session.commit()
-    session.refresh(producto_db)
-    return producto_db
+# CRUD DE PRODUCTOS
 
 
-@router.get("/productos", response_model=List[ProductRead], status_code=status.HTTP_200_OK)
-def listar_productos(
-        stock_min: Optional[int] = Query(None),
-        precio_max: Optional[float] = Query(None),
-        categoria_id: Optional[int] = Query(None),
-        session: Session = Depends(get_session)
+@router.post("/productos", response_model=ProductRead, status_code=status.HTTP_201_CREATED)
+async def crear_producto(datos: ProductCreate, session: AsyncSession = Depends(get_async_session)):
+    """
+    Crea un nuevo producto si la categoría existe y el nombre no está repetido.
+    """
+    # Validaciones de cantidad y precio
+    if datos.cantidad < 0:
+        raise HTTPException(status_code=400, detail="La cantidad no puede ser negativa.")
+    if datos.precio <= 0:
+        raise HTTPException(status_code=400, detail="El precio debe ser mayor que 0.")
+
+    # Verificar si la categoría existe
+    if not await session.get(Categoria, datos.categoria_id):
+        raise HTTPException(status_code=404, detail="Categoría no encontrada")
+    if (await session.exec(select(Producto).where(Producto.nombre == datos.nombre))).first():
+        raise HTTPException(status_code=409, detail="Ya existe un producto con ese nombre.")
+
+    producto = Producto.from_orm(datos)
+    session.add(producto)
+    await actualizar_resumen_async(session, (None, estado(producto)))
+    await session.commit()
+    await session.refresh(producto)
+    await invalidar_producto()
+    return respuesta_json(ProductRead.from_orm(producto).dict(), status_code=201)
+
+
+@router.get("/productos", response_model=Union[List[ProductRead], ProductPageWithFacets])
+async def listar_productos(
+    request: Request,
+    response: Response,
+    stock_min: Optional[int] = Query(None, description="Stock mínimo"),
+    precio_max: Optional[float] = Query(None, description="Precio máximo"),
+    categoria_id: Optional[int] = Query(None, description="Filtrar por categoría"),
+    limit: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO, description="Productos por página"),
+    after: Optional[int] = Query(None, description="Cursor: ID del último producto de la página anterior"),
+    sort: Optional[str] = Query(None, pattern=ORDENES_PRODUCTO, description="precio, cantidad o nombre; '-' delante invierte el orden"),
+    facets: bool = Query(False, description="Incluir conteos por categoría e histograma de precios"),
+    formato: str = Query("json", pattern="^(json|ndjson)$", description="'ndjson' transmite todos los resultados"),
+    fields: Optional[str] = Query(None, description=CAMPOS_PRODUCTO),
+    session: AsyncSession = Depends(get_async_session_lectura)
 ):
     """
-    "Lista productos con filtros opcionales.
+    Lista los productos activos con filtros opcionales, paginados por ID o en el orden de 'sort'.
+    El cursor de la siguiente página se devuelve en la cabecera 'X-Next-Cursor'.
+    Con facets=true responde {productos, facetas}.
+    """
+    # Construye la consulta dinámicamente según los filtros.
+    # Solo lee las columnas pedidas de ProductRead: filas simples, sin objetos del ORM
+    campos = campos_pedidos(fields, ProductRead)
+    condiciones = [Producto.activo == True]
+    if stock_min is not None:
+        condiciones.append(Producto.cantidad >= stock_min)
+    if precio_max is not None:
+        condiciones.append(Producto.precio <= precio_max)
+    if categoria_id is not None:
+        condiciones.append(Producto.categoria_id == categoria_id)
+    consulta = consulta_columnas(Producto, ProductRead, campos).where(*condiciones)
+
+    # Modo streaming: envía los productos por lotes sin cargarlos todos en memoria.
+    # Una vez empezada la respuesta ya no se puede rechazar el cursor: se comprueba antes
+    if formato == "ndjson":
+        if sort and after is not None and not await cursor_existe(session, Producto, after):
+            raise HTTPException(status_code=400, detail="El cursor 'after' no corresponde a ningún producto del catálogo.")
+        return StreamingResponse(transmitir_ndjson(consulta, Producto, after, sort), media_type="application/x-ndjson")
+
+    # Si ningún producto cambió desde la última consulta del cliente, responde 304 sin consultarlos
+    version, ultima = await version_coleccion(session, Producto)
+    respuesta = no_modificado(request, response, calcular_etag("productos", version, ultima, request.url.query), ultima)
+    if respuesta is not None:
+        return respuesta
+
+    filtros = f"{stock_min}|{precio_max}|{categoria_id}"
+    clave = await cache.clave_grupo("productos", f"{filtros}|{limit}|{after}|{sort}|{campos}")
+    pagina = await cache.obtener(clave)
+    if pagina is None:
+        filas, siguiente = await paginar_async(session, consulta, Producto, limit, after, sort)
+        # Con sort una página vacía puede deberse a un cursor que ya no existe
+        if not filas and sort and after is not None and not await cursor_existe(session, Producto, after):
+            raise HTTPException(status_code=400, detail="El cursor 'after' no corresponde a ningún producto del catálogo.")
+        pagina = {"productos": [fila._asdict() for fila in filas], "siguiente": siguiente}
+        await cache.guardar(clave, pagina)
+
+    if pagina["siguiente"] is not None:
+        response.headers["X-Next-Cursor"] = str(pagina["siguiente"])
+    if not facets:
+        # Las filas vienen de la BD: se codifican con orjson sin revalidarlas contra ProductRead
+        return respuesta_json(pagina["productos"], response)
+
+    # Las facetas dependen solo de los filtros: se comparten entre páginas, órdenes y campos
+    clave = await cache.clave_grupo("productos", f"facetas|{filtros}")
+    facetas = await cache.obtener(clave)
+    if facetas is None:
+        facetas = facetas_de_filas((await session.exec(consulta_facetas(*condiciones))).all()).dict()
+        await cache.guardar(clave, facetas)
+    return respuesta_json({"productos": pagina["productos"], "facetas": facetas}, response)
+
+
+@router.get("/productos/buscar", response_model=List[ProductRead])
+async def buscar_productos(
+    q: str = Query(..., min_length=1, description="Palabras a buscar en nombre y descripción"),
+    stock_min: Optional[int] = Query(None, description="Stock mínimo"),
+    precio_max: Optional[float] = Query(None, description="Precio máximo"),
+    categoria_id: Optional[int] = Query(None, description="Filtrar por categoría"),
+    limit: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO, description="Cantidad máxima de resultados"),
+    session: AsyncSession = Depends(get_async_session_lectura)
+):
     """
-    consulta = select(Producto).where(Producto.activo == True)
+    Busca productos activos por texto usando el índice de texto completo,
+    ordenados por relevancia. Admite los mismos filtros que el listado.
+    """
+    consulta = consulta_busqueda(session.bind.dialect.name, q)
+    if consulta is None:
+        raise HTTPException(status_code=400, detail="La búsqueda no contiene palabras válidas.")
 
+    consulta = consulta.where(Producto.activo == True)
     if stock_min is not None:
         consulta = consulta.where(Producto.cantidad >= stock_min)
     if precio_max is not None:
@@ -132,68 +387,182 @@ def listar_productos(
     if categoria_id is not None:
         consulta = consulta.where(Producto.categoria_id == categoria_id)
 
-    productos = session.exec(consulta).all()
-    if not productos:
-        raise HTTPException(status_code=404, detail="No se encontraron productos con los filtros aplicados.")
-    return productos
+    return (await session.exec(consulta.limit(limit))).all()
 
 
-@router.get("/productos/{producto_id}", response_model=ProductRead, status_code=status.HTTP_200_OK)
-def obtener_producto(producto_id: int, session: Session = Depends(get_session)):
+@router.get("/productos/cambios", response_class=StreamingResponse)
+async def cambios_productos(
+    desde: Optional[int] = Query(None, ge=0, description="Última secuencia recibida; por defecto solo los cambios nuevos"),
+    last_event_id: Optional[str] = Header(None, description="Última secuencia recibida (la envía EventSource al reconectar)"),
+):
+    """
+    Cambios de stock, precio y estado de los productos como Server-Sent Events:
+    un evento 'producto' con {id, cantidad, precio, activo} por cambio, con su
+    secuencia como id. Reemplaza el sondeo de GET /productos.
+    """
+    if desde is None and last_event_id:
+        if not last_event_id.isdigit():
+            raise HTTPException(status_code=400, detail="Last-Event-ID debe ser un número de secuencia.")
+        desde = int(last_event_id)
+    return StreamingResponse(
+        feed.suscribir(desde),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/productos/{id_producto}", response_model=ProductRead)
+async def obtener_producto(
+    id_producto: int,
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description=CAMPOS_PRODUCTO),
+    session: AsyncSession = Depends(get_async_session_lectura)
+):
     """
-    Devuelve un producto por su ID.
+    Obtiene un producto por su ID
     """
-    producto = session.get(Producto, producto_id)
+    # La caché guarda el producto completo y sirve a cualquier combinación de campos
+    campos = campos_pedidos(fields, ProductRead)
+    clave = f"producto:{id_producto}"
+    cacheado = await cache.obtener(clave)
+    if cacheado is None:
+        producto = await session.get(Producto, id_producto)
+        if not producto:
+            raise HTTPException(status_code=404, detail="Producto no encontrado")
+        cacheado = ProductRead.from_orm(producto).dict()
+        await cache.guardar(clave, cacheado)
+
+    etag = calcular_etag("producto", id_producto, cacheado["actualizado_en"], *(campos or ()))
+    respuesta = no_modificado(request, response, etag, cacheado["actualizado_en"])
+    if respuesta is not None:
+        return respuesta
+    if campos is not None:
+        return respuesta_json(proyectar(cacheado, campos), response)
+    return cacheado
+
+
+@router.get("/productos/{id_producto}/categoria", response_model=ProductReadWithCategory)
+async def producto_con_categoria(id_producto: int, session: AsyncSession = Depends(get_async_session_lectura)):
+    """
+    Obtiene un producto junto con su categoría asociada.
+    """
+    clave = await cache.clave_grupo("producto_categoria", str(id_producto))
+    cacheado = await cache.obtener(clave)
+    if cacheado is not None:
+        return cacheado
+
+    # Trae producto y categoría en una sola consulta con JOIN
+    producto = await session.get(Producto, id_producto, options=[joinedload(Producto.categoria)])
     if not producto:
-        raise HTTPException(status_code=404, detail="Producto no encontrado.")
-    return producto
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
 
+    # Agrega los datos de la categoría al resultado
+    resultado = producto.dict()
+    resultado["categoria"] = {"id": producto.categoria.id, "nombre": producto.categoria.nombre}
+    await cache.guardar(clave, resultado)
+    return resultado
 
-@router.put("/productos/{producto_id}", response_model=ProductRead, status_code=status.HTTP_200_OK)
-def actualizar_producto(producto_id: int, data: ProductUpdate, session: Session = Depends(get_session)):
+
+@router.put("/productos/{id_producto}", response_model=ProductRead)
+async def actualizar_producto(id_producto: int, datos: ProductUpdate, session: AsyncSession = Depends(get_async_session)):
     """
-    Actualiza los datos de un producto
+    Actualiza los datos de un producto existente.
     """
-    producto = session.get(Producto, producto_id)
+    # Validaciones
+    if datos.cantidad is not None and datos.cantidad < 0:
+        raise HTTPException(status_code=400, detail="La cantidad no puede ser negativa.")
+    if datos.precio is not None and datos.precio <= 0:
+        raise HTTPException(status_code=400, detail="El precio debe ser mayor que 0.")
+
+    # Bloqueado hasta el commit: el resumen suma la diferencia con lo que se reemplaza
+    producto = await bloquear_producto_async(session, id_producto)
     if not producto:
-        raise HTTPException(status_code=404, detail="Producto no encontrado.")
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
 
-    for key, value in data.dict(exclude_unset=True).items():
+    # Actualiza solo los campos enviados
+    antes = estado(producto)
+    for key, value in datos.dict(exclude_unset=True).items():
         setattr(producto, key, value)
-
-    session.commit()
-    session.refresh(producto)
+    await actualizar_resumen_async(session, (antes, estado(producto)))
+    await session.commit()
+    await session.refresh(producto)
+    await invalidar_producto(id_producto)
+    reservas.olvidar(id_producto)
+    trabajador.publicar(Evento(STOCK if producto.activo else DESACTIVACION, id_producto, producto.cantidad))
+    feed.publicar(producto)
     return producto
 
 
-@router.delete("/productos/{producto_id}", status_code=status.HTTP_200_OK)
-def eliminar_producto(producto_id: int, session: Session = Depends(get_session)):
+@router.delete("/productos/{id_producto}")
+async def eliminar_producto(id_producto: int, session: AsyncSession = Depends(get_async_session)):
     """
     Desactiva un producto sin eliminarlo del todo.
     """
-    producto = session.get(Producto, producto_id)
+    producto = await bloquear_producto_async(session, id_producto)
     if not producto:
-        raise HTTPException(status_code=404, detail="Producto no encontrado.")
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
 
+    antes = estado(producto)
     producto.activo = False
-    session.commit()
-    return {"message": "Producto desactivado correctamente."}
+    await actualizar_resumen_async(session, (antes, estado(producto)))
+    await session.commit()
+    await invalidar_producto(id_producto)
+    # Sin contador en memoria, la siguiente compra lo lee inactivo y se rechaza
+    reservas.olvidar(id_producto)
+    trabajador.publicar(Evento(DESACTIVACION, id_producto))
+    feed.publicar(producto)
+    return {"mensaje": "Producto desactivado correctamente"}
+
+
+@router.put("/productos/{id_producto}/comprar", response_model=ProductRead)
+async def comprar_producto(id_producto: int, cantidad: int, session: AsyncSession = Depends(get_async_session)):
+    """
+    Reduce el stock al realizar una compra
+    """
+    # Validaciones de cantidad
+    if cantidad <= 0:
+        raise HTTPException(status_code=400, detail="Cantidad inválida")
+
+    # Con las reservas en memoria la compra se admite sin escribir en la base;
+    # si no, resta la cantidad comprada en un único UPDATE condicional
+    if reservas.activo:
+        producto = await reservas.reservar(session, id_producto, cantidad)
+        if producto:
+            trabajador.publicar(Evento(COMPRA, id_producto, producto["cantidad"]))
+            feed.publicar(producto)
+            return producto
+    else:
+        producto = await descontar_stock_async(session, id_producto, cantidad)
+    if not producto:
+        # Solo en caso de fallo se consulta el motivo; un producto borrado no se encuentra
+        existente = await session.get(Producto, id_producto)
+        if not existente or not existente.activo:
+            raise HTTPException(status_code=404, detail="Producto no encontrado")
+        raise HTTPException(status_code=400, detail="No hay suficiente stock")
+    await session.commit()
+    await invalidar_producto(id_producto)
+    trabajador.publicar(Evento(COMPRA, id_producto, producto.cantidad))
+    feed.publicar(producto)
+    return producto
 
 
-@router.put("/productos/{producto_id}/comprar", response_model=ProductRead, status_code=status.HTTP_200_OK)
-def comprar_producto(producto_id: int, cantidad: int, session: Session = Depends(get_session)):
+@router.put("/productos/{id_producto}/estado", response_model=ProductRead)
+async def cambiar_estado_producto(id_producto: int, activo: bool, session: AsyncSession = Depends(get_async_session)):
     """
-    Realiza la compra de un producto, restando del stock la cantidad comprada.
+    Cambia el estado (activo/inactivo) de un producto.
     """
-    producto = session.get(Producto, producto_id)
+    producto = await bloquear_producto_async(session, id_producto)
     if not producto:
-        raise HTTPException(status_code=404, detail="Producto no encontrado.")
-    if cantidad <= 0:
-        raise HTTPException(status_code=400, detail="Cantidad inválida.")
-    if producto.cantidad < cantidad:
-        raise HTTPException(status_code=400, detail="No hay suficiente stock disponible.")
-
-    producto.cantidad -= cantidad
-    session.commit()
-    session.refresh(producto)
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+
+    antes = estado(producto)
+    producto.activo = activo  # Cambia el estado activo/inactivo
+    await actualizar_resumen_async(session, (antes, estado(producto)))
+    await session.commit()
+    await session.refresh(producto)
+    await invalidar_producto(id_producto)
+    reservas.olvidar(id_producto)
+    trabajador.publicar(Evento(STOCK if activo else DESACTIVACION, id_producto, producto.cantidad))
+    feed.publicar(producto)
     return producto
@@ -0,0 +1,123 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import database
+from archivo import COLUMNAS_CATEGORIA, COLUMNAS_PRODUCTO, archivar_async
+from cache import invalidar_categoria, invalidar_producto
+from cambios import feed
+from database import get_async_session, get_async_session_lectura
+from Esquemas import ArchivedProductRead, ArchiveResult, CategoryRead, ProductRead
+from modelos import Categoria, CategoriaArchivada, Producto, ProductoArchivado, ResumenCategoria, ahora
+from paginacion import LIMITE_MAXIMO, LIMITE_POR_DEFECTO, paginar_async
+from resumen import actualizar_resumen_async, estado
+from serializacion import consulta_columnas, respuesta_json
+from tareas import STOCK, Evento, trabajador
+
+router = APIRouter()
+
+
+# ARCHIVO
+#
+# POST /archivo mueve a las tablas de archivo lo inactivo desde hace 'dias' días
+# (ver archivo.py). Lo archivado se consulta en GET /archivo/productos y vuelve
+# a su tabla, con el mismo ID, con POST /archivo/.../restaurar.
+
+
+@router.post("/archivo", response_model=ArchiveResult)
+async def archivar_inactivos(
+    dias: float = Query(..., ge=0, description="Días mínimos desde que la fila se desactivó"),
+    lote: int = Query(1000, ge=1, le=10000, description="Filas por transacción"),
+):
+    """
+    Archiva los productos y categorías inactivos desde hace al menos 'dias' días.
+    """
+    return await archivar_async(database.get_motor(), dias, lote)
+
+
+@router.get("/archivo/productos", response_model=List[ArchivedProductRead])
+async def listar_productos_archivados(
+    response: Response,
+    categoria_id: Optional[int] = Query(None, description="Filtrar por categoría"),
+    limit: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO, description="Productos por página"),
+    after: Optional[int] = Query(None, description="Cursor: ID del último producto de la página anterior"),
+    session: AsyncSession = Depends(get_async_session_lectura)
+):
+    """
+    Lista los productos archivados, paginados por ID (cabecera 'X-Next-Cursor').
+    """
+    consulta = consulta_columnas(ProductoArchivado, ArchivedProductRead)
+    if categoria_id is not None:
+        consulta = consulta.where(ProductoArchivado.categoria_id == categoria_id)
+    filas, siguiente = await paginar_async(session, consulta, ProductoArchivado, limit, after)
+    if siguiente is not None:
+        response.headers["X-Next-Cursor"] = str(siguiente)
+    return respuesta_json([fila._asdict() for fila in filas], response)
+
+
+@router.post("/archivo/productos/{id_producto}/restaurar", response_model=ProductRead)
+async def restaurar_producto(
+    id_producto: int,
+    activar: bool = Query(False, description="Restaurarlo ya activo"),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Devuelve un producto archivado a la tabla de productos con su mismo ID.
+    Su categoría tiene que estar en la tabla de categorías.
+    """
+    archivado = await session.get(ProductoArchivado, id_producto)
+    if not archivado:
+        raise HTTPException(status_code=404, detail="Producto archivado no encontrado")
+    if await session.get(Producto, id_producto):
+        raise HTTPException(status_code=409, detail="Ya existe un producto con ese ID.")
+    if not await session.get(Categoria, archivado.categoria_id):
+        raise HTTPException(status_code=409, detail="La categoría del producto está archivada: restáurela primero.")
+    if (await session.exec(select(Producto.id).where(Producto.nombre == archivado.nombre))).first():
+        raise HTTPException(status_code=409, detail="Ya existe un producto con ese nombre.")
+
+    # La fecha se renueva para que el próximo archivo no lo vuelva a mover enseguida
+    producto = Producto(**{columna: getattr(archivado, columna) for columna in COLUMNAS_PRODUCTO})
+    producto.activo = activar
+    producto.actualizado_en = ahora()
+    session.add(producto)
+    await session.delete(archivado)
+    await actualizar_resumen_async(session, (None, estado(producto)))
+    await session.commit()
+    await invalidar_producto(id_producto)
+    if activar:
+        trabajador.publicar(Evento(STOCK, id_producto, producto.cantidad))
+    feed.publicar(producto)
+    return producto
+
+
+@router.post("/archivo/categorias/{id_categoria}/restaurar", response_model=CategoryRead)
+async def restaurar_categoria(
+    id_categoria: int,
+    activar: bool = Query(False, description="Restaurarla ya activa"),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Devuelve una categoría archivada a la tabla de categorías con su mismo ID.
+    Sus productos archivados se restauran después, de a uno.
+    """
+    archivada = await session.get(CategoriaArchivada, id_categoria)
+    if not archivada:
+        raise HTTPException(status_code=404, detail="Categoría archivada no encontrada")
+    if await session.get(Categoria, id_categoria):
+        raise HTTPException(status_code=409, detail="Ya existe una categoría con ese ID.")
+    if (await session.exec(select(Categoria.id).where(Categoria.nombre == archivada.nombre))).first():
+        raise HTTPException(status_code=409, detail="La categoría ya existe.")
+
+    categoria = Categoria(**{columna: getattr(archivada, columna) for columna in COLUMNAS_CATEGORIA})
+    categoria.activo = activar
+    categoria.actualizado_en = ahora()
+    session.add(categoria)
+    await session.delete(archivada)
+    await session.flush()
+    # Fila vacía del resumen de inventario, como al crear la categoría
+    session.add(ResumenCategoria(categoria_id=id_categoria))
+    await session.commit()
+    await invalidar_categoria(id_categoria)
+    return categoria
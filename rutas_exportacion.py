@@ -0,0 +1,259 @@
+import csv
+import io
+import itertools
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import literal, null, text
+from sqlmodel import select
+
+import database
+from modelos import Categoria, CategoriaArchivada, Producto, ProductoArchivado
+from paginacion import ordenar
+from serializacion import a_json
+
+router = APIRouter()
+
+
+# EXPORTACIÓN DEL CATÁLOGO
+#
+# Transmiten el catálogo completo (activos e inactivos) en CSV, NDJSON o Parquet
+# por lotes de TAMANO_LOTE_EXPORTACION filas: la memoria del worker no crece con
+# el tamaño del catálogo. Con updated_since solo salen las filas cambiadas desde
+# esa fecha; la cabecera X-Export-Watermark trae la fecha a usar en la siguiente
+# exportación incremental.
+#
+# Las filas archivadas desde esa fecha (archivo.py) ya no están en la tabla viva:
+# la exportación incremental las agrega al final con archivado = true, para que
+# el consumidor las borre. La exportación completa solo trae la tabla viva.
+
+TAMANO_LOTE_EXPORTACION = 5000
+# La marca se atrasa este margen para no perder cambios de transacciones que
+# terminan durante la exportación: algunas filas pueden llegar dos veces, así
+# que los consumidores deben aplicarlas como upsert por id
+MARGEN_MARCA = timedelta(seconds=5)
+
+TIPOS_CONTENIDO = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Columnas exportadas: (nombre, columna, tipo de Arrow)
+COLUMNAS_PRODUCTO = (
+    ("id", Producto.id, "int64"),
+    ("nombre", Producto.nombre, "string"),
+    ("descripcion", Producto.descripcion, "string"),
+    ("precio", Producto.precio, "float64"),
+    ("cantidad", Producto.cantidad, "int64"),
+    ("activo", Producto.activo, "bool_"),
+    ("categoria_id", Producto.categoria_id, "int64"),
+    ("categoria_nombre", Categoria.nombre, "string"),
+    ("actualizado_en", Producto.actualizado_en, "timestamp"),
+    ("archivado", literal(False), "bool_"),
+)
+COLUMNAS_CATEGORIA = (
+    ("id", Categoria.id, "int64"),
+    ("nombre", Categoria.nombre, "string"),
+    ("descripcion", Categoria.descripcion, "string"),
+    ("activo", Categoria.activo, "bool_"),
+    ("actualizado_en", Categoria.actualizado_en, "timestamp"),
+    ("archivado", literal(False), "bool_"),
+)
+
+
+def _columnas_bajas(columnas, archivo):
+    """
+    Columnas de las filas archivadas con los mismos nombres que las exportadas:
+    las que el archivo no guarda van vacías y actualizado_en es la fecha en que
+    se archivó, el último cambio de la fila en el catálogo.
+    """
+    propias = {"actualizado_en": archivo.archivado_en, "archivado": literal(True)}
+    return [
+        (propias[nombre] if nombre in propias else getattr(archivo, nombre, null())).label(nombre)
+        for nombre, _, _ in columnas
+    ]
+
+
+# LECTURA POR LOTES
+
+
+def _lotes(consulta, modelo):
+    """
+    Genera las filas de la consulta en listas de TAMANO_LOTE_EXPORTACION.
+    Usa un cursor del lado del servidor (yield_per) salvo en SQLite sin WAL:
+    ahí una lectura larga bloquearía las escrituras durante toda la descarga,
+    así que se leen lotes cortos usando el ID como cursor.
+    """
+    motor = database.get_motor_lectura()
+    with motor.connect() as conexion:
+        sqlite_sin_wal = (
+            motor.dialect.name == "sqlite"
+            and conexion.execute(text("PRAGMA journal_mode")).scalar().lower() != "wal"
+        )
+        if not sqlite_sin_wal:
+            resultado = conexion.execution_options(yield_per=TAMANO_LOTE_EXPORTACION).execute(consulta.order_by(modelo.id))
+            yield from resultado.partitions()
+            return
+
+    ultimo = None
+    while True:
+        with motor.connect() as conexion:
+            filas = conexion.execute(ordenar(consulta, modelo, ultimo).limit(TAMANO_LOTE_EXPORTACION)).all()
+        if not filas:
+            return
+        yield filas
+        if len(filas) < TAMANO_LOTE_EXPORTACION:
+            return
+        ultimo = filas[-1].id
+
+
+# FORMATOS
+
+
+def _csv(lotes, columnas):
+    nombres = [nombre for nombre, _, _ in columnas]
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow(nombres)
+    for filas in lotes:
+        escritor.writerows(
+            [valor.isoformat() if isinstance(valor, datetime) else valor for valor in fila] for fila in filas
+        )
+        yield salida.getvalue().encode("utf-8")
+        salida.seek(0)
+        salida.truncate()
+    if salida.tell():
+        yield salida.getvalue().encode("utf-8")
+
+
+def _ndjson(lotes, columnas):
+    for filas in lotes:
+        yield b"".join(a_json(fila._asdict()) + b"\n" for fila in filas)
+
+
+class _SalidaPorBloques:
+    """
+    Archivo de solo escritura que acumula lo escrito hasta que se vacía:
+    permite enviar el Parquet por partes a medida que se escribe cada grupo de filas.
+    """
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+        self.closed = False
+
+    def write(self, datos) -> int:
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self) -> int:
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def vaciar(self) -> bytes:
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+
+def cargar_pyarrow():
+    """
+    Importa pyarrow la primera vez que se pide Parquet, no al arrancar (tarda
+    unos 40 ms). Devuelve None si no está instalado (dependencia opcional).
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def _tipo_arrow(pyarrow, tipo: str):
+    if tipo == "timestamp":
+        return pyarrow.timestamp("us", tz="UTC")
+    return getattr(pyarrow, tipo)()
+
+
+def _parquet(lotes, columnas):
+    """
+    Un grupo de filas de Parquet por lote; el pie del archivo va al final.
+    """
+    pyarrow = cargar_pyarrow()
+    esquema = pyarrow.schema([(nombre, _tipo_arrow(pyarrow, tipo)) for nombre, _, tipo in columnas])
+    salida = _SalidaPorBloques()
+    with pyarrow.parquet.ParquetWriter(salida, esquema, compression="zstd") as escritor:
+        for filas in lotes:
+            escritor.write_table(pyarrow.Table.from_pylist([fila._asdict() for fila in filas], schema=esquema))
+            yield salida.vaciar()
+    yield salida.vaciar()
+
+
+FORMATOS = {"csv": _csv, "ndjson": _ndjson, "parquet": _parquet}
+
+
+def _exportar(consulta, modelo, archivo, columnas, nombre: str, formato: str, updated_since: Optional[datetime]):
+    if formato == "parquet" and cargar_pyarrow() is None:
+        raise HTTPException(status_code=501, detail="La exportación en Parquet requiere pyarrow instalado.")
+
+    marca = datetime.now(timezone.utc) - MARGEN_MARCA
+    lotes = _lotes(consulta, modelo)
+    if updated_since is not None:
+        # Una fecha sin zona se toma como UTC, igual que las guardadas
+        if updated_since.tzinfo is None:
+            updated_since = updated_since.replace(tzinfo=timezone.utc)
+        cambios = consulta.where(modelo.actualizado_en > updated_since)
+        bajas = select(*_columnas_bajas(columnas, archivo)).where(archivo.archivado_en > updated_since)
+        lotes = itertools.chain(_lotes(cambios, modelo), _lotes(bajas, archivo))
+
+    return StreamingResponse(
+        FORMATOS[formato](lotes, columnas),
+        media_type=TIPOS_CONTENIDO[formato],
+        headers={
+            "Content-Disposition": f'attachment; filename="{nombre}.{formato}"',
+            "X-Export-Watermark": marca.isoformat(),
+        },
+    )
+
+
+# ENDPOINTS
+
+
+@router.get("/exportar/productos", response_class=StreamingResponse)
+def exportar_productos(
+    formato: str = Query("ndjson", pattern="^(csv|ndjson|parquet)$", description="csv, ndjson o parquet"),
+    updated_since: Optional[datetime] = Query(None, description="Solo los productos cambiados después de esta fecha"),
+):
+    """
+    Transmite todos los productos, activos e inactivos, con el nombre de su categoría.
+    Con updated_since agrega los archivados desde esa fecha (archivado = true).
+    """
+    columnas = [columna.label(nombre) for nombre, columna, _ in COLUMNAS_PRODUCTO]
+    consulta = select(*columnas).join(Categoria, Producto.categoria_id == Categoria.id)
+    return _exportar(consulta, Producto, ProductoArchivado, COLUMNAS_PRODUCTO, "productos", formato, updated_since)
+
+
+@router.get("/exportar/categorias", response_class=StreamingResponse)
+def exportar_categorias(
+    formato: str = Query("ndjson", pattern="^(csv|ndjson|parquet)$", description="csv, ndjson o parquet"),
+    updated_since: Optional[datetime] = Query(None, description="Solo las categorías cambiadas después de esta fecha"),
+):
+    """
+    Transmite todas las categorías, activas e inactivas.
+    Con updated_since agrega las archivadas desde esa fecha (archivado = true).
+    """
+    columnas = [columna.label(nombre) for nombre, columna, _ in COLUMNAS_CATEGORIA]
+    consulta = select(*columnas)
+    return _exportar(consulta, Categoria, CategoriaArchivada, COLUMNAS_CATEGORIA, "categorias", formato, updated_since)
@@ -0,0 +1,262 @@
+import codecs
+import csv
+import json
+from typing import List
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+import database
+from database import get_session
+from Esquemas import BulkImportError, BulkImportResult, ProductCreate, ProductRead, PurchaseItem
+from inventario import descontar_stock
+from cache import invalidar_producto
+from modelos import Categoria, Producto
+from resumen import EstadoProducto, actualizar_resumen
+from cambios import feed
+from reservas import reservas
+from tareas import COMPRA, Evento, trabajador
+
+router = APIRouter()
+
+# Filas que se validan e insertan en cada transacción
+TAMANO_LOTE_IMPORTACION = 1000
+# Máximo de errores detallados que se devuelven (el resto solo se cuenta)
+MAXIMO_ERRORES_REPORTADOS = 1000
+
+
+# LECTURA DEL CUERPO
+
+
+async def _texto(request: Request):
+    """
+    Decodifica el cuerpo como UTF-8 a medida que llega. Un carácter de varios
+    bytes puede quedar partido entre dos bloques: el decodificador incremental
+    guarda los bytes sueltos hasta recibir el resto.
+    """
+    decodificador = codecs.getincrementaldecoder("utf-8")()
+    async for bloque in request.stream():
+        texto = decodificador.decode(bloque)
+        if texto:
+            yield texto
+    # final=True falla si el cuerpo termina en medio de un carácter
+    texto = decodificador.decode(b"", final=True)
+    if texto:
+        yield texto
+
+
+async def _lineas(request: Request):
+    """
+    Devuelve el cuerpo línea por línea, a medida que llega, con su fin de línea.
+    """
+    pendiente = ""
+    async for texto in _texto(request):
+        pendiente += texto
+        *lineas, pendiente = pendiente.split("\n")
+        for linea in lineas:
+            yield linea + "\n"
+    if pendiente:
+        yield pendiente
+
+
+async def _registros_csv(request: Request):
+    """
+    Agrupa las líneas en registros CSV completos: un campo entre comillas puede
+    contener saltos de línea, así que el registro sigue mientras haya una
+    comilla abierta (las comillas escapadas '""' no cambian la paridad).
+    """
+    registro = []
+    comillas = 0
+    async for linea in _lineas(request):
+        registro.append(linea)
+        comillas += linea.count('"')
+        if comillas % 2 == 0:
+            yield registro
+            registro = []
+            comillas = 0
+    if registro:
+        yield registro
+
+
+async def _filas(request: Request):
+    """
+    Convierte el cuerpo en diccionarios según el Content-Type:
+    JSON (arreglo), NDJSON (un objeto por línea) o CSV con cabecera.
+    """
+    tipo = request.headers.get("content-type", "application/json").split(";")[0].strip()
+
+    if tipo in ("application/x-ndjson", "application/jsonl"):
+        async for linea in _lineas(request):
+            if linea.strip():
+                yield json.loads(linea)
+    elif tipo == "text/csv":
+        cabecera = None
+        async for registro in _registros_csv(request):
+            if not "".join(registro).strip():
+                continue
+            # csv.reader recibe las líneas del registro y une los campos con saltos de línea
+            valores = next(csv.reader(registro))
+            if cabecera is None:
+                cabecera = [nombre.strip() for nombre in valores]
+                continue
+            # En CSV un campo vacío equivale a no enviarlo
+            yield {clave: valor for clave, valor in zip(cabecera, valores) if valor != ""}
+    else:
+        datos = json.loads(await request.body())
+        if not isinstance(datos, list):
+            raise HTTPException(status_code=400, detail="Se esperaba un arreglo JSON de productos.")
+        for fila in datos:
+            yield fila
+
+
+# IMPORTACIÓN POR LOTES
+
+
+def _importar_lote(lote: list, resultado: BulkImportResult):
+    """
+    Valida e inserta un lote de filas en una sola transacción.
+    Las categorías y los nombres repetidos se comprueban con una consulta por lote.
+    """
+    validos = []
+    for numero, fila in lote:
+        if not isinstance(fila, dict):
+            _rechazar(resultado, numero, "La fila debe ser un objeto.")
+            continue
+        try:
+            producto = ProductCreate(**fila)
+        except ValidationError as error:
+            _rechazar(resultado, numero, error.errors()[0]["msg"])
+            continue
+        if producto.cantidad < 0:
+            _rechazar(resultado, numero, "La cantidad no puede ser negativa.")
+        elif producto.precio <= 0:
+            _rechazar(resultado, numero, "El precio debe ser mayor que 0.")
+        else:
+            validos.append((numero, producto))
+
+    if not validos:
+        return
+
+    with Session(database.get_motor()) as session:
+        categorias = set(session.exec(
+            select(Categoria.id).where(Categoria.id.in_({p.categoria_id for _, p in validos}))
+        ).all())
+        existentes = set(session.exec(
+            select(Producto.nombre).where(Producto.nombre.in_({p.nombre for _, p in validos}))
+        ).all())
+
+        nuevos = []
+        for numero, producto in validos:
+            if producto.categoria_id not in categorias:
+                _rechazar(resultado, numero, "La categoría no existe.")
+            elif producto.nombre in existentes:
+                _rechazar(resultado, numero, "Ya existe un producto con ese nombre.")
+            else:
+                # También evita nombres repetidos dentro del mismo archivo
+                existentes.add(producto.nombre)
+                datos = producto.dict()
+                if datos["activo"] is None:
+                    datos["activo"] = True
+                nuevos.append(datos)
+
+        if nuevos:
+            # Una sola sentencia INSERT ejecutada con executemany
+            session.execute(insert(Producto), nuevos)
+            actualizar_resumen(session, *(
+                (None, EstadoProducto(datos["categoria_id"], datos["precio"], datos["cantidad"], datos["activo"]))
+                for datos in nuevos
+            ))
+            session.commit()
+            resultado.insertados += len(nuevos)
+
+
+def _rechazar(resultado: BulkImportResult, numero: int, detalle: str):
+    resultado.rechazados += 1
+    if len(resultado.errores) < MAXIMO_ERRORES_REPORTADOS:
+        resultado.errores.append(BulkImportError(fila=numero, detalle=detalle))
+
+
+async def _importar(lote: list, resultado: BulkImportResult):
+    """
+    Importa el lote en el threadpool y, si entró algún producto, invalida los
+    listados en caché desde el event loop.
+    """
+    insertados = resultado.insertados
+    await run_in_threadpool(_importar_lote, lote, resultado)
+    if resultado.insertados > insertados:
+        await invalidar_producto()
+
+
+@router.post("/productos/bulk", response_model=BulkImportResult, status_code=status.HTTP_200_OK)
+async def importar_productos(request: Request):
+    """
+    Importa productos en bloque desde un arreglo JSON, NDJSON o CSV.
+    Las filas válidas se insertan por lotes; las inválidas se informan con su número de fila.
+    """
+    resultado = BulkImportResult(insertados=0, rechazados=0, errores=[])
+    lote = []
+    numero = 0
+    try:
+        async for fila in _filas(request):
+            numero += 1
+            lote.append((numero, fila))
+            if len(lote) >= TAMANO_LOTE_IMPORTACION:
+                await _importar(lote, resultado)
+                lote = []
+    except (json.JSONDecodeError, UnicodeDecodeError, csv.Error) as error:
+        raise HTTPException(status_code=400, detail=f"Formato inválido cerca de la fila {numero + 1}: {error}")
+    if lote:
+        await _importar(lote, resultado)
+    resultado.errores.sort(key=lambda error: error.fila)
+    return resultado
+
+
+# COMPRA POR LOTES
+
+
+@router.post("/compras", response_model=List[ProductRead], status_code=status.HTTP_200_OK)
+def comprar_productos(items: List[PurchaseItem], session: Session = Depends(get_session)):
+    """
+    Descuenta el stock de varios productos en una sola transacción.
+    Si algún producto no existe o no tiene stock suficiente no se descuenta ninguno.
+    """
+    if not items:
+        raise HTTPException(status_code=400, detail="La compra no tiene productos.")
+
+    # Suma las líneas repetidas y recorre los productos en orden de ID,
+    # así dos compras simultáneas bloquean las filas en el mismo orden
+    cantidades = {}
+    for item in items:
+        cantidades[item.producto_id] = cantidades.get(item.producto_id, 0) + item.cantidad
+
+    # Con las reservas en memoria, lo vendido de estos productos se escribe antes
+    # y sus contadores quedan retenidos hasta el commit (ver crear_pedido).
+    # Endpoint síncrono (threadpool): las reservas y la caché se llaman en el event loop
+    if reservas.activo:
+        anyio.from_thread.run(reservas.retener, *cantidades)
+    try:
+        comprados = []
+        for producto_id in sorted(cantidades):
+            producto = descontar_stock(session, producto_id, cantidades[producto_id])
+            if not producto:
+                session.rollback()
+                existente = session.get(Producto, producto_id)
+                if not existente or not existente.activo:
+                    raise HTTPException(status_code=404, detail=f"Producto {producto_id} no encontrado.")
+                raise HTTPException(status_code=400, detail=f"No hay suficiente stock del producto {producto_id}.")
+            comprados.append(producto)
+
+        for producto in comprados:
+            session.expunge(producto)
+        session.commit()
+    finally:
+        if reservas.activo:
+            anyio.from_thread.run_sync(reservas.liberar)
+    anyio.from_thread.run(invalidar_producto, *cantidades)
+    trabajador.publicar(*(Evento(COMPRA, producto.id, producto.cantidad) for producto in comprados))
+    feed.publicar(*comprados)
+    return comprados
@@ -0,0 +1,147 @@
+import hashlib
+import json
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from cache import invalidar_producto
+from database import get_async_session
+from Esquemas import OrderCreate, OrderLineRead, OrderRead, PurchaseItem
+from inventario import descontar_stock_lote_async
+from modelos import LineaPedido, Pedido, Producto
+from cambios import feed
+from reservas import reservas
+from tareas import COMPRA, Evento, trabajador
+
+router = APIRouter()
+
+
+# PEDIDOS
+#
+# POST /pedidos compra varios productos en una sola transacción y registra el
+# pedido con sus líneas. Con la cabecera Idempotency-Key un reintento (por un
+# timeout o una conexión cortada) devuelve el pedido ya registrado sin volver
+# a descontar el stock.
+
+
+def _sumar_lineas(lineas: List[PurchaseItem]) -> Dict[int, int]:
+    cantidades = {}
+    for linea in lineas:
+        cantidades[linea.producto_id] = cantidades.get(linea.producto_id, 0) + linea.cantidad
+    return cantidades
+
+
+def _huella(cantidades: Dict[int, int]) -> str:
+    """
+    Huella del contenido del pedido, independiente del orden de las líneas.
+    """
+    return hashlib.sha256(json.dumps(sorted(cantidades.items())).encode()).hexdigest()
+
+
+def _leer_pedido(pedido: Pedido, lineas: List[LineaPedido]) -> OrderRead:
+    return OrderRead(
+        id=pedido.id,
+        total=pedido.total,
+        creado_en=pedido.creado_en,
+        lineas=[OrderLineRead.from_orm(linea) for linea in lineas],
+    )
+
+
+async def _pedido_por_clave(session: AsyncSession, clave: str) -> Optional[Pedido]:
+    consulta = select(Pedido).where(Pedido.clave_idempotencia == clave).options(selectinload(Pedido.lineas))
+    return (await session.exec(consulta)).first()
+
+
+def _repeticion(pedido: Pedido, huella: str, response: Response) -> OrderRead:
+    """
+    Respuesta a un reintento: el pedido guardado, si el contenido es el mismo.
+    """
+    if pedido.huella != huella:
+        raise HTTPException(status_code=422, detail="La clave de idempotencia ya se usó con otro pedido.")
+    response.headers["Idempotent-Replayed"] = "true"
+    return _leer_pedido(pedido, pedido.lineas)
+
+
+@router.post("/pedidos", response_model=OrderRead, status_code=status.HTTP_201_CREATED)
+async def crear_pedido(
+    datos: OrderCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255, description="Clave única del pedido para reintentos"),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Registra un pedido y descuenta el stock de todos sus productos, o de ninguno
+    si alguno no existe o no tiene stock suficiente.
+    """
+    cantidades = _sumar_lineas(datos.lineas)
+    huella = _huella(cantidades)
+
+    if idempotency_key:
+        anterior = await _pedido_por_clave(session, idempotency_key)
+        if anterior:
+            return _repeticion(anterior, huella, response)
+
+    # Con las reservas en memoria, lo vendido de estos productos se escribe antes
+    # y sus contadores quedan retenidos hasta el commit: el UPDATE condicional ve
+    # el stock real. Se retienen antes del INSERT, que en SQLite toma el bloqueo de escritura
+    if reservas.activo:
+        await reservas.retener(*cantidades)
+    try:
+        # El pedido se inserta primero: reserva la clave (índice único) antes de
+        # tocar el stock, y en SQLite toma el bloqueo de escritura desde el inicio
+        pedido = Pedido(clave_idempotencia=idempotency_key, huella=huella)
+        session.add(pedido)
+        try:
+            await session.flush()
+        except IntegrityError:
+            # Otra solicitud con la misma clave se registró entre la búsqueda y el INSERT
+            await session.rollback()
+            anterior = await _pedido_por_clave(session, idempotency_key)
+            if not anterior:
+                raise HTTPException(status_code=409, detail="El pedido con esa clave se está procesando.")
+            return _repeticion(anterior, huella, response)
+
+        productos, faltante = await descontar_stock_lote_async(session, cantidades)
+        if faltante is not None:
+            # Deshace el descuento y libera la clave: el pedido se puede reintentar
+            await session.rollback()
+            existente = await session.get(Producto, faltante)
+            if not existente or not existente.activo:
+                raise HTTPException(status_code=404, detail=f"Producto {faltante} no encontrado.")
+            raise HTTPException(status_code=400, detail=f"No hay suficiente stock del producto {faltante}.")
+
+        lineas = [
+            LineaPedido(
+                pedido_id=pedido.id,
+                producto_id=producto.id,
+                cantidad=cantidades[producto.id],
+                precio_unitario=producto.precio,
+                subtotal=round(producto.precio * cantidades[producto.id], 2),
+            )
+            for producto in productos
+        ]
+        pedido.total = round(sum(linea.subtotal for linea in lineas), 2)
+        session.add_all(lineas)
+        await session.commit()
+    finally:
+        if reservas.activo:
+            reservas.liberar()
+    await invalidar_producto(*cantidades)
+    trabajador.publicar(*(Evento(COMPRA, producto.id, producto.cantidad) for producto in productos))
+    feed.publicar(*productos)
+    return _leer_pedido(pedido, lineas)
+
+
+@router.get("/pedidos/{id_pedido}", response_model=OrderRead)
+async def obtener_pedido(id_pedido: int, session: AsyncSession = Depends(get_async_session)):
+    """
+    Devuelve un pedido con sus líneas.
+    """
+    pedido = await session.get(Pedido, id_pedido, options=[selectinload(Pedido.lineas)])
+    if not pedido:
+        raise HTTPException(status_code=404, detail="Pedido no encontrado")
+    return _leer_pedido(pedido, pedido.lineas)
@@ -0,0 +1,86 @@
+import json
+from typing import Any, List, Optional
+
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+
+try:
+    import orjson
+except ImportError:  # Dependencia opcional: sin ella se usa el codificador de FastAPI
+    orjson = None
+
+
+# SERIALIZACIÓN RÁPIDA DE RESPUESTAS
+#
+# Los listados leen solo las columnas del esquema de lectura (filas, no objetos
+# del ORM) y las codifican directamente con orjson, sin volver a validar cada
+# fila contra el response_model: los datos vienen de la propia base de datos.
+
+
+def a_json(contenido: Any) -> bytes:
+    """
+    Codifica dicts, listas, fechas y números en JSON (UTF-8).
+    Las fechas con zona UTC se escriben con 'Z', igual que Pydantic.
+    """
+    if orjson is not None:
+        return orjson.dumps(contenido, option=orjson.OPT_UTC_Z)
+    return json.dumps(jsonable_encoder(contenido), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class RespuestaJSONRapida(JSONResponse):
+    """
+    JSONResponse codificada con orjson cuando está instalado.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return a_json(content)
+
+
+def respuesta_json(contenido: Any, response: Optional[Response] = None, status_code: int = 200) -> RespuestaJSONRapida:
+    """
+    Devuelve el contenido ya serializable sin pasar por la validación del response_model.
+    Copia las cabeceras puestas en el parámetro 'response' del endpoint (ETag,
+    X-Next-Cursor...), que FastAPI no agrega cuando se devuelve una respuesta propia.
+    """
+    cabeceras = dict(response.headers) if response is not None else None
+    return RespuestaJSONRapida(contenido, status_code=status_code, headers=cabeceras)
+
+
+def consulta_columnas(modelo, esquema, campos: Optional[List[str]] = None):
+    """
+    SELECT de las columnas del modelo que forman el esquema de lectura, en su orden.
+    Con 'campos' (ver campos_pedidos) solo lee esas columnas.
+    Devuelve filas que se convierten en dict con fila._asdict(), sin pasar por el ORM.
+    """
+    tabla = modelo.__table__.c
+    nombres = campos if campos is not None else esquema.model_fields
+    return select(*(tabla[campo] for campo in nombres if campo in tabla))
+
+
+# PROYECCIÓN DE CAMPOS (?fields=)
+
+
+def campos_pedidos(fields: Optional[str], esquema) -> Optional[List[str]]:
+    """
+    Convierte 'fields=nombre,precio' en la lista de campos del esquema, en su orden.
+    Sin el parámetro devuelve None (todos los campos). El 'id' se incluye siempre:
+    identifica la fila y es el cursor de la paginación.
+    """
+    if not fields:
+        return None
+    pedidos = {campo.strip() for campo in fields.split(",") if campo.strip()}
+    desconocidos = pedidos - set(esquema.model_fields)
+    if desconocidos:
+        raise HTTPException(status_code=400, detail=f"Campos desconocidos: {', '.join(sorted(desconocidos))}.")
+    return [campo for campo in esquema.model_fields if campo in pedidos or campo == "id"]
+
+
+def proyectar(datos: dict, campos: Optional[List[str]]) -> dict:
+    """
+    Deja en 'datos' solo los campos pedidos.
+    """
+    if campos is None:
+        return datos
+    return {campo: datos[campo] for campo in campos}
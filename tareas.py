@@ -0,0 +1,273 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from archivo import archivar_async
+import resumen
+
+
+# TAREAS EN SEGUNDO PLANO
+#
+# Los endpoints publican eventos (compra, cambio de stock, desactivación) en una
+# cola acotada sin esperar: si la cola está llena el evento se descarta y se
+# cuenta, la solicitud nunca se frena. Un trabajador asyncio, iniciado en el
+# lifespan, los procesa por lotes (alertas de stock bajo) y ejecuta cada
+# MANTENIMIENTO_INTERVALO_S el mantenimiento de la base, archivando antes las
+# filas inactivas hace más de ARCHIVO_DIAS días si está configurado.
+
+log = logging.getLogger("tienda.tareas")
+log_alertas = logging.getLogger("tienda.alertas")
+
+COMPRA = "compra"
+STOCK = "stock"
+DESACTIVACION = "desactivacion"
+
+
+class Evento(NamedTuple):
+    tipo: str
+    producto_id: int
+    # Stock del producto después del cambio
+    cantidad: Optional[int] = None
+
+
+class AlertaStockBajo(NamedTuple):
+    producto_id: int
+    cantidad: int
+    umbral: int
+
+
+# DESTINOS DE LAS ALERTAS
+
+
+class DestinoLog:
+    """
+    Escribe cada alerta en el log 'tienda.alertas'. Es el destino por defecto.
+    """
+
+    async def enviar(self, alertas: List[AlertaStockBajo]):
+        for alerta in alertas:
+            log_alertas.warning(
+                "Stock bajo: producto %s con %s unidades (umbral %s)", alerta.producto_id, alerta.cantidad, alerta.umbral
+            )
+
+
+class DestinoWebhook:
+    """
+    Envía las alertas de cada lote en un solo POST JSON a una URL.
+    """
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+
+    async def enviar(self, alertas: List[AlertaStockBajo]):
+        import httpx
+
+        async with httpx.AsyncClient(timeout=self.timeout) as cliente:
+            respuesta = await cliente.post(self.url, json={"alertas": [alerta._asdict() for alerta in alertas]})
+            respuesta.raise_for_status()
+
+
+# TRABAJADOR
+
+
+class TrabajadorSegundoPlano:
+    """
+    Cola de eventos de dominio y tareas asyncio que la consumen.
+    Cualquier objeto con 'async enviar(alertas)' sirve como destino de alertas.
+    """
+
+    def __init__(self):
+        self.cola_maxima = 10000
+        self.tamano_lote = 500
+        self.intervalo_mantenimiento = 3600.0
+        self.dias_archivo = 0.0
+        self.lote_archivo = 1000
+        self.destinos = [DestinoLog()]
+        self._cola: Optional[asyncio.Queue] = None
+        self._bucle: Optional[asyncio.AbstractEventLoop] = None
+        self._hilo: Optional[int] = None
+        self._tareas: List[asyncio.Task] = []
+        self._motor = None
+        # Productos ya avisados: no se repite la alerta hasta que se reponga el stock
+        self._avisados = set()
+        self.recibidos = 0
+        self.descartados = 0
+        self.procesados = 0
+        self.lotes = 0
+        self.alertas = 0
+        self.mantenimientos = 0
+        self.archivados = 0
+
+    def configurar(self, settings):
+        self.cola_maxima = settings.tareas_cola_maxima
+        self.tamano_lote = settings.tareas_lote
+        self.intervalo_mantenimiento = settings.mantenimiento_intervalo_s
+        self.dias_archivo = settings.archivo_dias
+        self.lote_archivo = settings.archivo_lote
+        self.destinos = [DestinoLog()]
+        if settings.alertas_webhook_url:
+            self.destinos.append(DestinoWebhook(settings.alertas_webhook_url))
+
+    def agregar_destino(self, destino):
+        self.destinos.append(destino)
+
+    async def iniciar(self, motor):
+        """
+        Crea la cola y arranca el consumidor y el mantenimiento periódico.
+        'motor' es el motor síncrono: el mantenimiento corre en un hilo aparte.
+        """
+        self._motor = motor
+        self._avisados = set()
+        self._cola = asyncio.Queue(maxsize=self.cola_maxima)
+        self._bucle = asyncio.get_running_loop()
+        self._hilo = threading.get_ident()
+        self._tareas = [asyncio.create_task(self._consumir(self._cola))]
+        if self.intervalo_mantenimiento > 0:
+            self._tareas.append(asyncio.create_task(self._mantener_periodicamente()))
+
+    async def detener(self):
+        """
+        Deja de aceptar eventos, procesa los que quedan en la cola y detiene las
+        tareas (al apagar la app).
+        """
+        if self._cola is None:
+            return
+        cola, self._cola = self._cola, None
+        consumidor, *otras = self._tareas
+        for tarea in otras:
+            tarea.cancel()
+        # None marca el final de la cola: el consumidor termina el lote en curso y sale
+        await cola.put(None)
+        await asyncio.gather(consumidor, *otras, return_exceptions=True)
+        self._tareas = []
+
+    # PUBLICACIÓN
+
+    def publicar(self, *eventos: Evento):
+        """
+        Encola eventos sin esperar. Se puede llamar desde endpoints síncronos
+        (hilos del threadpool). Sin trabajador iniciado no hace nada.
+        """
+        if self._cola is None:
+            return
+        if threading.get_ident() == self._hilo:
+            self._encolar(eventos)
+        else:
+            self._bucle.call_soon_threadsafe(self._encolar, eventos)
+
+    def _encolar(self, eventos):
+        if self._cola is None:
+            return
+        for evento in eventos:
+            self.recibidos += 1
+            try:
+                self._cola.put_nowait(evento)
+            except asyncio.QueueFull:
+                self.descartados += 1
+
+    # PROCESAMIENTO
+
+    async def _consumir(self, cola: asyncio.Queue):
+        fin = False
+        while not fin:
+            lote = [await cola.get()]
+            while len(lote) < self.tamano_lote and not cola.empty():
+                lote.append(cola.get_nowait())
+            if None in lote:
+                fin = True
+                lote = [evento for evento in lote if evento is not None]
+            if not lote:
+                continue
+            try:
+                await self._procesar(lote)
+            except Exception:
+                log.exception("Error al procesar un lote de %s eventos", len(lote))
+
+    async def _procesar(self, lote: List[Evento]):
+        """
+        Se queda con el último estado de cada producto del lote y avisa de los
+        que quedaron con stock bajo por primera vez.
+        """
+        ultimo = {}
+        for evento in lote:
+            ultimo[evento.producto_id] = evento
+        alertas = []
+        for producto_id, evento in ultimo.items():
+            if evento.tipo == DESACTIVACION or evento.cantidad is None:
+                self._avisados.discard(producto_id)
+            elif evento.cantidad > resumen.UMBRAL_STOCK_BAJO:
+                self._avisados.discard(producto_id)
+            elif producto_id not in self._avisados:
+                self._avisados.add(producto_id)
+                alertas.append(AlertaStockBajo(producto_id, evento.cantidad, resumen.UMBRAL_STOCK_BAJO))
+
+        if alertas:
+            for destino in self.destinos:
+                try:
+                    await destino.enviar(alertas)
+                except Exception:
+                    log.exception("No se pudieron enviar %s alertas a %s", len(alertas), type(destino).__name__)
+        self.procesados += len(lote)
+        self.lotes += 1
+        self.alertas += len(alertas)
+
+    # MANTENIMIENTO
+
+    async def _mantener_periodicamente(self):
+        while True:
+            await asyncio.sleep(self.intervalo_mantenimiento)
+            try:
+                # Primero el archivo: así el VACUUM ya ve las páginas que liberó
+                if self.dias_archivo > 0:
+                    resultado = await archivar_async(self._motor, self.dias_archivo, self.lote_archivo)
+                    self.archivados += resultado.productos + resultado.categorias
+                await run_in_threadpool(mantener_base, self._motor)
+                self.mantenimientos += 1
+            except Exception:
+                log.exception("Error en el mantenimiento de la base")
+
+    def estadisticas(self) -> dict:
+        return {
+            "activo": self._cola is not None,
+            "en_cola": self._cola.qsize() if self._cola is not None else 0,
+            "recibidos": self.recibidos,
+            "descartados": self.descartados,
+            "procesados": self.procesados,
+            "lotes": self.lotes,
+            "alertas": self.alertas,
+            "mantenimientos": self.mantenimientos,
+            "archivados": self.archivados,
+        }
+
+
+# Proporción de páginas libres a partir de la cual SQLite se compacta con VACUUM
+PROPORCION_VACUUM = 0.2
+
+
+def mantener_base(motor):
+    """
+    Actualiza las estadísticas del planificador. El resumen de inventario no se
+    reconstruye aquí: su DELETE + INSERT podía pisar los UPDATE incrementales de
+    las compras concurrentes. Solo se reconstruye en init_db (arranque o migración).
+    En SQLite ejecuta VACUUM solo si hay muchas páginas libres (bloquea la base
+    mientras dura). PostgreSQL ya limpia con autovacuum: solo ANALYZE.
+    """
+    inicio = time.perf_counter()
+    with motor.connect().execution_options(isolation_level="AUTOCOMMIT") as conexion:
+        conexion.execute(text("ANALYZE"))
+        if motor.dialect.name == "sqlite":
+            paginas = conexion.execute(text("PRAGMA page_count")).scalar()
+            libres = conexion.execute(text("PRAGMA freelist_count")).scalar()
+            if paginas and libres / paginas >= PROPORCION_VACUUM:
+                conexion.execute(text("VACUUM"))
+    log.info("Mantenimiento de la base en %.0f ms", (time.perf_counter() - inicio) * 1000)
+
+
+# Instancia del proceso, configurada por create_app
+trabajador = TrabajadorSegundoPlano()